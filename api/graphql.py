@@ -1,4 +1,5 @@
 from http.server import BaseHTTPRequestHandler
+import asyncio
 import json
 import sys
 import os
@@ -11,6 +12,14 @@ sys.path.append(backend_dir)
 
 try:
     from app.graphql.schema import schema
+    from app.config import settings
+    from app.utils.rate_limit import rate_limiter, client_ip_from
+    from app.graphql.batch import run_batch, batch_error
+    from app.graphql.loaders import Loaders
+    from app.utils.invalidation import start_invalidation_listener
+    from app.utils.jobs import enqueued_count, drain_after_response
+    # Catch up on other instances' invalidations through the version poll
+    start_invalidation_listener(listen=False)
 except ImportError:
     # Fallback for import errors
     schema = None
@@ -20,7 +29,7 @@ class handler(BaseHTTPRequestHandler):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization, Idempotency-Key')
         self.end_headers()
 
     def do_GET(self):
@@ -39,30 +48,46 @@ class handler(BaseHTTPRequestHandler):
             if not schema:
                 raise Exception("Could not import GraphQL Schema")
 
+            enqueued_before = enqueued_count()
             content_length = int(self.headers.get('Content-Length', 0))
             post_data = self.rfile.read(content_length)
+
+            if settings.RATE_LIMIT_ENABLED:
+                client_ip = client_ip_from(self.headers, self.client_address[0] if self.client_address else None)
+                decision = rate_limiter.check(client_ip, self.headers.get('Authorization'), post_data)
+                if not decision.allowed:
+                    self.send_response(decision.status_code)
+                    self.send_header('Content-type', 'application/json')
+                    self.send_header('Access-Control-Allow-Origin', '*')
+                    self.send_header('Retry-After', str(decision.retry_after))
+                    self.end_headers()
+                    self.wfile.write(json.dumps({"errors": [{"message": decision.message}]}).encode('utf-8'))
+                    return
+
             body = json.loads(post_data.decode('utf-8'))
-            
-            query = body.get('query')
-            variables = body.get('variables')
-            
-            if not query:
+
+            if isinstance(body, list):
+                error = batch_error(body)
+                if error:
+                    raise Exception(error)
+            elif not body.get('query'):
                 raise Exception("No query provided")
 
             # Execute GraphQL
-            result = schema.execute_sync(query, variable_values=variables)
-            
-            response_data = {}
-            if result.data:
-                response_data['data'] = result.data
-            if result.errors:
-                response_data['errors'] = [{'message': str(e)} for e in result.errors]
+            # Async execution: some resolvers (products, product) are coroutines
+            response_data = asyncio.run(self._execute(body))
 
+            payload = json.dumps(response_data).encode('utf-8')
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
             self.send_header('Access-Control-Allow-Origin', '*')
             self.end_headers()
-            self.wfile.write(json.dumps(response_data).encode('utf-8'))
+            self.wfile.write(payload)
+            self.wfile.flush()
+
+            # No worker on serverless: run what this request queued (e.g. the verification email)
+            drain_after_response(enqueued_before)
 
         except Exception as e:
             self.send_response(500)
@@ -73,3 +98,28 @@ class handler(BaseHTTPRequestHandler):
                 "errors": [{"message": str(e), "traceback": traceback.format_exc().split('\n')}]
             }
             self.wfile.write(json.dumps(error_resp).encode('utf-8'))
+
+    async def _execute(self, body):
+        """One operation -> one result; a JSON array of operations -> an array of results"""
+        # Shared by every operation of a batch (DataLoaders batch across them)
+        context = {"headers": self.headers, "loaders": Loaders()}
+
+        async def execute(operation):
+            result = await schema.execute(
+                operation.get('query'),
+                variable_values=operation.get('variables'),
+                operation_name=operation.get('operationName'),
+                context_value=context
+            )
+            response_data = {}
+            if result.data:
+                response_data['data'] = result.data
+            if result.errors:
+                response_data['errors'] = [{'message': str(e)} for e in result.errors]
+            return response_data
+
+        if isinstance(body, list):
+            return await run_batch(
+                body, lambda op: (op.get('query'), op.get('operationName')), execute, context
+            )
+        return await execute(body)
@@ -35,19 +35,7 @@ class handler(BaseHTTPRequestHandler):
                 else:
                     print(f"Error adding email_verified: {e}")
 
-            # 2. Add verification_token
-            try:
-                with engine.begin() as connection:
-                    connection.execute(text("ALTER TABLE users ADD COLUMN verification_token VARCHAR(255)"))
-                    print("Added verification_token")
-            except Exception as e:
-                e_str = str(e).lower()
-                if "already exists" in e_str or "duplicate column" in e_str:
-                    print("'verification_token' already exists")
-                else:
-                    print(f"Error adding verification_token: {e}")
-
-            # 3. Update products.image_url to TEXT (Postgres only)
+            # 2. Update products.image_url to TEXT (Postgres only)
             try:
                 with engine.begin() as connection:
                     connection.execute(text("ALTER TABLE products ALTER COLUMN image_url TYPE TEXT"))
@@ -55,7 +43,7 @@ class handler(BaseHTTPRequestHandler):
             except Exception as e:
                 print(f"Skipping products.image_url update: {str(e)}")
 
-            # 4. Add payment_method to orders
+            # 3. Add payment_method to orders
             try:
                 with engine.begin() as connection:
                     connection.execute(text("ALTER TABLE orders ADD COLUMN payment_method VARCHAR(50) DEFAULT 'Cash'"))
@@ -67,6 +55,97 @@ class handler(BaseHTTPRequestHandler):
                 else:
                     print(f"Error adding payment_method: {e}")
 
+            # 4. Product snapshots on order_items + orders.item_count (with backfill)
+            from app.migrations import migrate_order_snapshots
+            logs = []
+            migrate_order_snapshots(logs)
+            for line in logs:
+                print(line)
+
+            # 5. Monthly partitioning of orders/order_items (Postgres only)
+            from app.migrations import partition_order_tables
+            logs = []
+            partition_order_tables(logs)
+            for line in logs:
+                print(line)
+
+            # 6. Product listing indexes (filter/sort on the storefront)
+            from app.migrations import migrate_product_listing_indexes
+            logs = []
+            migrate_product_listing_indexes(logs)
+            for line in logs:
+                print(line)
+
+            # 7. Per-user order aggregates for the admin customer list
+            from app.migrations import migrate_user_order_stats
+            logs = []
+            migrate_user_order_stats(logs)
+            for line in logs:
+                print(line)
+
+            # 8. Responsive image variants for existing product images
+            from app.migrations import migrate_image_variants
+            logs = []
+            migrate_image_variants(logs)
+            for line in logs:
+                print(line)
+
+            # 9. Global cache versions for cross-worker invalidation
+            from app.migrations import migrate_cache_versions
+            logs = []
+            migrate_cache_versions(logs)
+            for line in logs:
+                print(line)
+
+            # 10. Hashed, expiring verification tokens
+            from app.migrations import migrate_email_tokens
+            logs = []
+            migrate_email_tokens(logs)
+            for line in logs:
+                print(line)
+
+            # 11. Order history delta sync
+            from app.migrations import migrate_order_sync
+            logs = []
+            migrate_order_sync(logs)
+            for line in logs:
+                print(line)
+
+            # 12. Catalog change log for incremental client sync
+            from app.migrations import migrate_catalog_changes
+            logs = []
+            migrate_catalog_changes(logs)
+            for line in logs:
+                print(line)
+
+            # 13. "Frequently bought together" recommendations
+            from app.migrations import migrate_recommendations
+            logs = []
+            migrate_recommendations(logs)
+            for line in logs:
+                print(line)
+
+            # 14. Trending & best-seller rankings
+            from app.migrations import migrate_trending
+            logs = []
+            migrate_trending(logs)
+            for line in logs:
+                print(line)
+
+            # 15. Inventory forecasts
+            from app.migrations import migrate_stock_forecasts
+            logs = []
+            migrate_stock_forecasts(logs)
+            for line in logs:
+                print(line)
+
+            # 16. Idempotency key leases
+            from app.migrations import add_idempotency_lease_column
+            logs = []
+            add_idempotency_lease_column(logs)
+            for line in logs:
+                print(line)
+
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
             self.send_header('Access-Control-Allow-Origin', '*')
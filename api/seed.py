@@ -13,18 +13,28 @@ class handler(BaseHTTPRequestHandler):
     def do_GET(self):
         try:
             # Import inside handler to ensure path is set
-            from app.seed import seed_products
-            
-            # Run the seed function
-            seed_products()
+            from app.database import engine, Base
+            from app.models import Job
+            from app.utils.jobs import enqueue, enqueued_count, drain_after_response
+
+            # Queue the seed, answer, then run it in this invocation (no worker on serverless)
+            Base.metadata.create_all(bind=engine, tables=[Job.__table__])
+            enqueued_before = enqueued_count()
+            job_id = enqueue("seed_database", max_attempts=1)
             
-            self.send_response(200)
+            payload = json.dumps({
+                "status": "queued",
+                "job_id": job_id,
+                "message": "Seeding started; check /api/jobs/<job_id> for progress. Admin: admin@cyber.com"
+            }).encode('utf-8')
+            self.send_response(202)
             self.send_header('Content-type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
             self.end_headers()
-            self.wfile.write(json.dumps({
-                "status": "success", 
-                "message": "Database seeded successfully. Admin: admin@cyber.com"
-            }).encode('utf-8'))
+            self.wfile.write(payload)
+            self.wfile.flush()
+            # The seed used to run inline; give it its whole job timeout (bounded by the function's maxDuration)
+            drain_after_response(enqueued_before, max_seconds=600)
             
         except ImportError as e:
             self.send_response(500)
@@ -41,16 +41,71 @@ export default function AdminCustomers() {
     useEffect(() => {
         const fetchData = async () => {
             try {
+                // Order aggregates are computed server-side, no need to download every order
                 const query = `
                     query AdminCustomers {
-                        allUsers {
-                            id
-                            username
-                            fullName
-                            email
-                            isActive
+                        customers(limit: 500) {
+                            items {
+                                id
+                                username
+                                fullName
+                                email
+                                isActive
+                                orderCount
+                                totalSpent
+                                lastOrderAt
+                            }
                         }
-                        allOrders {
+                    }
+                `;
+
+                const url = process.env.NEXT_PUBLIC_GRAPHQL_URL || '/api/graphql';
+                const response = await fetch(url, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ query }),
+                });
+
+                const result = await response.json();
+                if (result.errors) {
+                    console.error("GraphQL Errors:", result.errors);
+                    // Don't throw, try to use partial data
+                }
+
+                const users = result.data?.customers?.items || [];
+
+                // Process customers
+                const processedCustomers = users.map((user: any) => ({
+                    id: String(user.id),
+                    name: user.fullName || user.username,
+                    email: user.email,
+                    status: user.isActive ? 'active' : 'disabled',
+                    orderCount: user.orderCount,
+                    totalSpent: user.totalSpent,
+                    lastOrderDate: user.lastOrderAt ? new Date(user.lastOrderAt).toLocaleDateString() : 'Never',
+                }));
+
+                setCustomers(processedCustomers);
+
+            } catch (err) {
+                console.error("Failed to fetch customers:", err);
+            } finally {
+                setLoading(false);
+            }
+        };
+
+        fetchData();
+    }, []);
+
+    // Load the selected customer's orders on demand
+    useEffect(() => {
+        if (!selectedCustomer) return;
+
+        const fetchCustomerOrders = async () => {
+            try {
+                const query = `
+                    query CustomerOrders($userId: Int!) {
+                        myOrders(userId: $userId) {
                             id
                             userId
                             totalAmount
@@ -60,9 +115,7 @@ export default function AdminCustomers() {
                             items {
                                 quantity
                                 price
-                                product {
-                                    title
-                                }
+                                title
                             }
                         }
                     }
@@ -72,38 +125,16 @@ export default function AdminCustomers() {
                 const response = await fetch(url, {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ query }),
+                    body: JSON.stringify({ query, variables: { userId: parseInt(selectedCustomer.id) } }),
                 });
 
                 const result = await response.json();
                 if (result.errors) {
                     console.error("GraphQL Errors:", result.errors);
-                    // Don't throw, try to use partial data
                 }
 
-                const users = result.data?.allUsers || [];
-                const fetchedOrders = result.data?.allOrders || [];
-
-                // Process customers
-                const processedCustomers = users.map((user: any) => {
-                    const userIdString = String(user.id);
-                    const userOrders = fetchedOrders.filter((o: any) => String(o.userId) === userIdString);
-                    const totalSpent = userOrders.reduce((sum: number, o: any) => sum + o.totalAmount, 0);
-                    const lastOrder = userOrders.sort((a: any, b: any) => new Date(b.createdAt).getTime() - new Date(a.createdAt).getTime())[0];
-
-                    return {
-                        id: userIdString,
-                        name: user.fullName || user.username,
-                        email: user.email,
-                        status: user.isActive ? 'active' : 'disabled',
-                        orderCount: userOrders.length,
-                        totalSpent,
-                        lastOrderDate: lastOrder ? new Date(lastOrder.createdAt).toLocaleDateString() : 'Never',
-                    };
-                });
-
-                // Process orders for details view
-                const processedOrders = fetchedOrders.map((o: any) => ({
+                const fetchedOrders = result.data?.myOrders || [];
+                setOrders(fetchedOrders.map((o: any) => ({
                     id: String(o.id),
                     userId: String(o.userId),
                     totalAmount: o.totalAmount,
@@ -111,24 +142,18 @@ export default function AdminCustomers() {
                     createdAt: o.createdAt,
                     paymentMethod: o.paymentMethod || 'Cash', // Use real payment method
                     items: (o.items || []).map((i: any) => ({
-                        title: i.product?.title || 'Unknown Item',
+                        title: i.title || 'Unknown Item',
                         quantity: i.quantity,
                         price: i.price
                     }))
-                }));
-
-                setCustomers(processedCustomers);
-                setOrders(processedOrders);
-
+                })));
             } catch (err) {
-                console.error("Failed to fetch customers:", err);
-            } finally {
-                setLoading(false);
+                console.error("Failed to fetch customer orders:", err);
             }
         };
 
-        fetchData();
-    }, []);
+        fetchCustomerOrders();
+    }, [selectedCustomer?.id]);
 
     const customerOrders = (customerId: string) => {
         return orders.filter(order => order.userId === customerId);
@@ -57,10 +57,7 @@ export default function OrdersPage() {
                                 id
                                 quantity
                                 price
-                                product {
-                                    title
-                                    price
-                                }
+                                title
                             }
                         }
                         allUsers {
@@ -106,7 +103,7 @@ export default function OrdersPage() {
                         paymentMethod: order.paymentMethod || 'Cash', // Use real payment method
                         items: (order.items || []).map((item: any) => ({
                             ...item,
-                            product: item.product || { title: 'Unknown Product', price: 0 }
+                            product: { title: item.title || 'Unknown Product', price: item.price }
                         }))
                     };
                 });
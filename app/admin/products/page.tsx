@@ -12,6 +12,7 @@ export default function AdminProducts() {
     const [isEditing, setIsEditing] = useState<number | null>(null);
     const [isAdding, setIsAdding] = useState(false);
     const [formData, setFormData] = useState<Partial<Product>>({});
+    const [lowStockIds, setLowStockIds] = useState<Set<number>>(new Set());
     const fileInputRef = useRef<HTMLInputElement>(null);
 
     useEffect(() => {
@@ -28,6 +29,13 @@ export default function AdminProducts() {
                         size
                         stock
                         imageUrl
+                        stockForecast {
+                            velocity
+                            daysUntilStockout
+                        }
+                    }
+                    lowStockProducts {
+                        id
                     }
                 }
             `;
@@ -45,10 +53,15 @@ export default function AdminProducts() {
                     const mappedProducts = result.data.products.map((p: any) => ({
                         ...p,
                         image: p.imageUrl, // Map imageUrl to image
-                        category: capitalizeFirstLetter(p.category) // Ensure category casing matches
+                        category: capitalizeFirstLetter(p.category), // Ensure category casing matches
+                        velocity: p.stockForecast?.velocity,
+                        daysUntilStockout: p.stockForecast?.daysUntilStockout
                     }));
                     setProducts(mappedProducts);
                 }
+                if (result.data?.lowStockProducts) {
+                    setLowStockIds(new Set(result.data.lowStockProducts.map((p: any) => Number(p.id))));
+                }
             } catch (error) {
                 console.error('Failed to fetch products:', error);
             }
@@ -57,6 +70,11 @@ export default function AdminProducts() {
         fetchProducts();
     }, [setProducts]);
 
+    // Forecast to sell out within the server's LOW_STOCK_THRESHOLD_DAYS (or already nearly gone when no forecast exists yet)
+    const isLowStock = (product: Product) =>
+        product.daysUntilStockout != null ? lowStockIds.has(Number(product.id)) : product.stock < 10;
+    const lowStockCount = products.filter(isLowStock).length;
+
     // Helper to fix category casing if needed
     const capitalizeFirstLetter = (string: string) => {
         if (!string) return '';
@@ -248,6 +266,11 @@ export default function AdminProducts() {
                 <div>
                     <h1 className="text-4xl font-bold text-gradient uppercase tracking-tighter">Product Inventory</h1>
                     <p className="text-gray-400 font-bold uppercase tracking-widest text-xs mt-1">Manage your future styles</p>
+                    {lowStockCount > 0 && (
+                        <p className="text-red-500 font-black uppercase tracking-widest text-[10px] mt-2">
+                            {lowStockCount} {lowStockCount === 1 ? 'product' : 'products'} forecast to sell out soon
+                        </p>
+                    )}
                 </div>
                 <motion.button
                     whileHover={{ scale: 1.05 }}
@@ -411,11 +434,16 @@ export default function AdminProducts() {
                                         <div className="flex flex-col">
                                             <span className={cn(
                                                 "text-lg font-black tracking-tight",
-                                                product.stock < 10 ? "text-red-500 animate-pulse" : "text-gray-300"
+                                                isLowStock(product) ? "text-red-500 animate-pulse" : "text-gray-300"
                                             )}>
                                                 {product.stock}
                                             </span>
                                             <span className="text-[8px] font-black uppercase tracking-widest opacity-40">UNITS</span>
+                                            {product.daysUntilStockout != null && (
+                                                <span className="text-[8px] font-black uppercase tracking-widest opacity-60 mt-1">
+                                                    ~{Math.floor(product.daysUntilStockout)} DAYS LEFT · {product.velocity?.toFixed(1)}/DAY
+                                                </span>
+                                            )}
                                         </div>
                                     </td>
                                     <td className="py-6 px-4 text-right">
@@ -8,11 +8,9 @@ import Link from 'next/link';
 
 interface OrderItem {
     id: number;
-    product: {
-        title: string;
-        imageUrl: string;
-        price: number;
-    };
+    // Product snapshot taken when the order was placed
+    title: string | null;
+    imageUrl: string | null;
     quantity: number;
     price: number;
 }
@@ -25,6 +23,13 @@ interface Order {
     items: OrderItem[];
 }
 
+interface OrderSyncState {
+    watermark: string;
+    orders: Order[];
+}
+
+const ORDER_SYNC_KEY = 'order-history';
+
 export default function MyOrdersPage() {
     const { user } = useAuthStore();
     const router = useRouter();
@@ -38,24 +43,38 @@ export default function MyOrdersPage() {
             return;
         }
 
+        // Local copy of the history plus the server watermark; each visit only fetches what changed
+        const storageKey = `${ORDER_SYNC_KEY}:${user.id}`;
+        let cached: OrderSyncState | null = null;
+        try {
+            cached = JSON.parse(localStorage.getItem(storageKey) || 'null');
+        } catch {
+            cached = null;
+        }
+        if (cached) {
+            setOrders(cached.orders);
+            setLoading(false);
+        }
+
         const fetchOrders = async () => {
             try {
                 const query = `
-                    query MyOrders($userId: Int!) {
-                        myOrders(userId: $userId) {
-                            id
-                            totalAmount
-                            status
-                            paymentMethod
-                            createdAt
-                            items {
+                    query MyOrdersDelta($userId: Int!, $updatedSince: String) {
+                        myOrdersDelta(userId: $userId, updatedSince: $updatedSince) {
+                            watermark
+                            cancelledOrderIds
+                            orders {
                                 id
-                                quantity
-                                price
-                                product {
+                                totalAmount
+                                status
+                                paymentMethod
+                                createdAt
+                                items {
+                                    id
+                                    quantity
+                                    price
                                     title
                                     imageUrl
-                                    price
                                 }
                             }
                         }
@@ -70,7 +89,7 @@ export default function MyOrdersPage() {
                     next: { revalidate: 0 },
                     body: JSON.stringify({
                         query,
-                        variables: { userId: parseInt(user.id) }
+                        variables: { userId: parseInt(user.id), updatedSince: cached?.watermark ?? null }
                     }),
                 });
 
@@ -78,17 +97,28 @@ export default function MyOrdersPage() {
 
                 if (result.errors) {
                     console.error("GraphQL Errors:", result.errors);
-                    // Handle partial data if available
                 }
 
-                // Safety check: ensure myOrders exists and is an array
-                const fetchedOrders = Array.isArray(result.data?.myOrders) ? result.data.myOrders.map((order: any) => ({
+                const delta = result.data?.myOrdersDelta;
+                if (!delta) {
+                    // Bad or stale watermark: start over with a full sync next time
+                    localStorage.removeItem(storageKey);
+                    return;
+                }
+
+                const changed: Order[] = delta.orders.map((order: any) => ({
                     ...order,
                     status: (order.status || '').toLowerCase()
-                })) : [];
+                }));
+                const merged = new Map<number, Order>((cached?.orders || []).map((o) => [o.id, o]));
+                for (const id of delta.cancelledOrderIds) merged.delete(id);
+                for (const order of changed) merged.set(order.id, order);
+                const nextOrders = Array.from(merged.values()).sort(
+                    (a, b) => new Date(b.createdAt).getTime() - new Date(a.createdAt).getTime()
+                );
 
-                console.log("Normalized Orders:", fetchedOrders);
-                setOrders(fetchedOrders);
+                setOrders(nextOrders);
+                localStorage.setItem(storageKey, JSON.stringify({ watermark: delta.watermark, orders: nextOrders }));
             } catch (err: any) {
                 console.error("Order fetch error:", err);
                 setError(err.message || 'Failed to fetch orders');
@@ -211,14 +241,14 @@ export default function MyOrdersPage() {
                                     {(order.items || []).map((item) => (
                                         <div key={item.id} className="flex items-center gap-4 py-2">
                                             <div className="w-16 h-16 rounded-lg overflow-hidden bg-gray-800 flex-shrink-0">
-                                                {item.product?.imageUrl ? (
-                                                    <img src={item.product.imageUrl} alt={item.product.title} className="w-full h-full object-cover" />
+                                                {item.imageUrl ? (
+                                                    <img src={item.imageUrl} alt={item.title || ''} className="w-full h-full object-cover" />
                                                 ) : (
                                                     <div className="w-full h-full flex items-center justify-center text-xs text-gray-500">NO IMG</div>
                                                 )}
                                             </div>
                                             <div className="flex-1 min-w-0">
-                                                <h3 className="font-bold truncate pr-4">{item.product?.title || 'Unknown Product'}</h3>
+                                                <h3 className="font-bold truncate pr-4">{item.title || 'Unknown Product'}</h3>
                                                 <p className="text-sm text-gray-400">Qty: {item.quantity} x ${item.price}</p>
                                             </div>
                                         </div>
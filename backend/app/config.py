@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 
 
 class Settings(BaseSettings):
@@ -23,6 +23,16 @@ class Settings(BaseSettings):
         print("CONFIG: Using Default Localhost URL")
         return self.DATABASE_URL
 
+    # Database Driver & Statement Caching
+    # psycopg2 | psycopg (opt-in: `pip install "psycopg[binary]>=3.2"`; enables server-side prepared statements)
+    DB_DRIVER: str = "psycopg2"
+    DB_PREPARE_THRESHOLD: int = 5  # psycopg 3: executions of a statement on a connection before it is prepared server-side
+    # Behind PgBouncer in transaction mode (e.g. pooled Vercel/Neon URLs) prepared statements don't survive
+    # between transactions; this turns them off. PgBouncer >= 1.21 with max_prepared_statements can leave it off.
+    DB_PGBOUNCER: bool = False
+    DB_COMPILED_CACHE_SIZE: int = 1200  # SQLAlchemy compiled-statement cache entries per engine (default 500)
+    DB_INSERTMANYVALUES_PAGE_SIZE: int = 1000  # rows per batched INSERT..VALUES for executemany
+
     SECRET_KEY: str = "your-secret-key-change-this-in-production-min-32-chars"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
@@ -34,6 +44,119 @@ class Settings(BaseSettings):
     SMTP_USERNAME: str = ""
     SMTP_PASSWORD: str = ""
     SMTP_FROM_EMAIL: str = "noreply@modern-store.com"
+
+    # Email Verification Tokens
+    EMAIL_TOKEN_TTL_HOURS: int = 48
+    UNVERIFIED_ACCOUNT_RETENTION_DAYS: int = 0  # if set, never-verified accounts without orders are deleted after this many days
+    EMAIL_TOKEN_PURGE_INTERVAL_SECONDS: int = 3600
+    EMAIL_TOKEN_PURGE_BATCH_SIZE: int = 1000
+
+    # Inventory Reservations
+    RESERVATION_TTL_MINUTES: int = 15
+    RESERVATION_SWEEP_INTERVAL_SECONDS: int = 60
+    RESERVATION_SWEEP_BATCH_SIZE: int = 500
+
+    # Idempotency Keys
+    IDEMPOTENCY_KEY_TTL_HOURS: int = 24
+    IDEMPOTENCY_WAIT_SECONDS: int = 10
+    IDEMPOTENCY_LEASE_SECONDS: int = 30  # an attempt unfinished after this is presumed dead and may be retried
+    IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS: int = 3600
+
+    # Rate Limiting ("<count>/<second|minute|hour|day>")
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # memory | database (shared across workers)
+    RATE_LIMIT_PER_IP: str = "300/minute"
+    RATE_LIMIT_PER_USER: str = "600/minute"
+    # Client IP: a header the edge proxy overwrites (e.g. "x-vercel-forwarded-for", "x-real-ip"), else the
+    # X-Forwarded-For entry added by the last of this many trusted proxies (0 ignores the header)
+    RATE_LIMIT_CLIENT_IP_HEADER: str = ""
+    RATE_LIMIT_TRUSTED_PROXIES: int = 1
+    # Per-operation buckets, keyed by GraphQL operation name or root field name
+    RATE_LIMIT_OPERATIONS: Dict[str, str] = {
+        "login": "10/minute",
+        "register": "5/minute",
+        "allOrders": "30/minute",
+    }
+    # Shed load (503) when the average DB pool wait exceeds this; 0 disables
+    LOAD_SHED_POOL_WAIT_MS: int = 500
+
+    # Recommendations ("frequently bought together")
+    RECOMMENDATION_TOP_K: int = 20
+    RECOMMENDATION_MIN_PAIR_COUNT: int = 1  # raise once there is enough order volume to filter noise
+    RECOMMENDATION_MAX_BASKET: int = 50  # larger orders count toward popularity only
+    RECOMMENDATION_BATCH_ORDERS: int = 5000
+    RECOMMENDATION_ORDER_LAG_SECONDS: int = 60
+    RECOMMENDATION_REFRESH_SECONDS: int = 900
+
+    # Trending & Best Sellers
+    TRENDING_DECAY_HOURS: float = 72.0  # a sale's weight falls by e every this many hours
+    TRENDING_BATCH_ORDERS: int = 5000
+    TRENDING_ORDER_LAG_SECONDS: int = 60
+    TRENDING_REFRESH_SECONDS: int = 120
+
+    # Inventory Forecasting
+    STOCK_FORECAST_WINDOW_DAYS: int = 28
+    STOCK_FORECAST_RECENT_DAYS: int = 7  # short average so a sudden run on a product shows up quickly
+    STOCK_FORECAST_REFRESH_SECONDS: int = 3600
+    LOW_STOCK_THRESHOLD_DAYS: float = 14.0
+
+    # Order History Sync
+    ORDER_SYNC_OVERLAP_SECONDS: int = 30  # watermarks trail the clock so slow commits and clock skew aren't missed
+
+    # Order Partitioning & Archival (Postgres only)
+    ORDER_PARTITION_MONTHS_AHEAD: int = 3
+    ORDER_ARCHIVE_AFTER_MONTHS: int = 0  # 0 disables archival
+    ORDER_ARCHIVE_DIR: str = "archive/orders"
+
+    # Event broker for subscriptions: auto (Postgres LISTEN/NOTIFY when available) | postgres | memory
+    EVENT_BROKER: str = "auto"
+
+    # Catalog Facets
+    FACET_PRICE_BUCKET_WIDTH: float = 100.0
+    FACET_CACHE_TTL_SECONDS: int = 60
+    CATALOG_CHANGE_RETENTION_DAYS: int = 30  # clients last synced before this reload the full catalog
+    CACHE_VERSION_POLL_SECONDS: float = 5.0  # how stale a worker that missed an invalidation can get
+
+    # Static Catalog Snapshots
+    # Defaults to backend/static/catalog. Every server must see the same writable directory (a shared
+    # volume or a synced bucket mount); the read-only, per-instance Vercel bundle can't hold snapshots,
+    # so on Vercel builds are skipped unless this is set
+    CATALOG_SNAPSHOT_DIR: str = ""
+    CATALOG_SNAPSHOT_PAGE_SIZE: int = 48
+    CATALOG_SNAPSHOT_DELAY_SECONDS: int = 5  # edits within this window share one rebuild
+    CATALOG_SNAPSHOT_REFRESH_SECONDS: int = 600  # periodic rebuild so stock counts stay recent
+
+    # Background Jobs
+    JOBS_RUN_IN_PROCESS: bool = True  # start a worker inside the API process (never on Vercel)
+    JOBS_CONCURRENCY: int = 4
+    JOBS_POLL_INTERVAL_SECONDS: float = 1.0
+    JOBS_TIMEOUT_SECONDS: int = 120
+    JOBS_LOCK_TIMEOUT_SECONDS: int = 600  # running jobs older than this are requeued
+    JOBS_RETRY_BASE_SECONDS: int = 5
+    JOBS_RETENTION_DAYS: int = 7  # finished jobs kept this long
+    # /jobs/run requires 'Authorization: Bearer <secret>' and is disabled while empty. Vercel Cron sends
+    # this header itself when the project has a CRON_SECRET environment variable (see vercel.json)
+    CRON_SECRET: str = ""
+    JOBS_INLINE_SECONDS: float = 20  # Vercel: after a response whose request queued jobs, drain them this long (0 disables)
+
+    # Slow-Query Log
+    SLOW_QUERY_THRESHOLD_MS: float = 200
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE: float = 0.1  # share of slow SELECTs re-run under EXPLAIN ANALYZE (Postgres)
+    SLOW_QUERY_EXPLAIN_TIMEOUT_MS: int = 5000
+    SLOW_QUERY_LOG_PATH: str = "logs/slow_queries.jsonl"  # empty disables the file log
+    SLOW_QUERY_LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    SLOW_QUERY_LOG_BACKUPS: int = 5
+    SLOW_QUERY_BUFFER_SIZE: int = 200  # entries kept in memory for the slowQueries field
+
+    # GraphQL
+    GRAPHQL_BATCH_MAX_OPERATIONS: int = 10  # operations per JSON-array request
+
+    # Image Variants
+    IMAGE_BASE_URL: str = "/api"  # prefix for variant URLs (e.g. http://localhost:8000 in local dev)
+    IMAGE_SOURCE_DIR: str = ""  # where /images/*.jpg paths live; defaults to the Next.js public/ dir
+    IMAGE_PROCESS_WORKERS: int = 2
+    IMAGE_MAX_SOURCE_BYTES: int = 15 * 1024 * 1024
+    IMAGE_REMOTE_HOSTS: List[str] = []  # hosts remote image URLs may be fetched from (none by default)
     
     class Config:
         env_file = ".env"
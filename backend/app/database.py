@@ -1,6 +1,10 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from sqlalchemy import create_engine, bindparam, any_, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from app.config import settings
 
 # Handle Vercel Postgres protocol difference (postgres:// vs postgresql://)
@@ -8,7 +12,76 @@ db_url = settings.sync_database_url
 if db_url and db_url.startswith("postgres://"):
     db_url = db_url.replace("postgres://", "postgresql://", 1)
 
-engine = create_engine(db_url)
+
+
+class PoolWaitTracker:
+    """
+    Exponentially weighted average of how long requests wait for a pooled
+    connection. The average also decays while idle, so shedding stops once
+    traffic stops hitting the pool.
+    """
+
+    def __init__(self, alpha: float = 0.2, idle_half_life: float = 1.0):
+        self.alpha = alpha
+        self.idle_half_life = idle_half_life
+        self._average_ms = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, wait_ms: float):
+        with self._lock:
+            self._average_ms = self._decayed(time.monotonic())
+            self._average_ms += self.alpha * (wait_ms - self._average_ms)
+            self._updated = time.monotonic()
+
+    def average_ms(self) -> float:
+        with self._lock:
+            return self._decayed(time.monotonic())
+
+    def _decayed(self, now: float) -> float:
+        return self._average_ms * 0.5 ** ((now - self._updated) / self.idle_half_life)
+
+
+pool_wait = PoolWaitTracker()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records checkout wait time (used for load shedding)"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait.record((time.perf_counter() - start) * 1000)
+
+
+def _engine_options(url: str) -> dict:
+    options = {
+        # Hot statements are compiled once per process, not per request
+        "query_cache_size": settings.DB_COMPILED_CACHE_SIZE,
+        "insertmanyvalues_page_size": settings.DB_INSERTMANYVALUES_PAGE_SIZE,
+    }
+    if url.startswith("postgresql"):
+        options["poolclass"] = TimedQueuePool
+    if url.startswith("postgresql+psycopg:"):
+        # psycopg 3 prepares a statement server-side once it has run DB_PREPARE_THRESHOLD times on a
+        # connection; later executions skip parsing and planning. None disables it (PgBouncer).
+        options["connect_args"] = {
+            "prepare_threshold": None if settings.DB_PGBOUNCER else settings.DB_PREPARE_THRESHOLD
+        }
+    return options
+
+
+# A plain postgresql:// URL gets the configured driver; an explicit postgresql+driver:// is kept
+if db_url and db_url.startswith("postgresql://"):
+    db_url = db_url.replace("postgresql://", f"postgresql+{settings.DB_DRIVER}://", 1)
+
+engine = create_engine(db_url, **_engine_options(db_url))
+
+from app.utils.slow_queries import install_slow_query_log
+install_slow_query_log(engine)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -21,3 +94,15 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def ids_match(column, ids):
+    """Filter `column` against a list of ids.
+
+    On Postgres this binds the whole list as one array parameter
+    (`id = ANY(:ids)`), so the statement text stays the same no matter
+    how many ids are passed. Other dialects fall back to `IN (...)`.
+    """
+    if engine.dialect.name == "postgresql":
+        return column == any_(bindparam("ids", list(ids), type_=ARRAY(Integer)))
+    return column.in_(list(ids))
@@ -2,5 +2,6 @@ from .schema import schema
 from .types import User, Product, Order, AuthPayload
 from .queries import Query
 from .mutations import Mutation
+from .subscriptions import Subscription
 
-__all__ = ["schema", "User", "Product", "Order", "AuthPayload", "Query", "Mutation"]
+__all__ = ["schema", "User", "Product", "Order", "AuthPayload", "Query", "Mutation", "Subscription"]
@@ -0,0 +1,97 @@
+"""
+Batched GraphQL operations: a JSON array of {query, variables, operationName}
+in one HTTP request, answered with an array of results in the same order.
+
+All operations share one context and so one set of DataLoaders. Consecutive
+queries run concurrently; a mutation waits for everything before it and
+everything after it waits for the mutation, so side effects keep request order.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional, Tuple, TypeVar
+from graphql import parse, GraphQLError, OperationDefinitionNode, OperationType
+from strawberry.fastapi import GraphQLRouter
+from app.config import settings
+
+T = TypeVar("T")
+
+
+def is_read_only(query: Optional[str], operation_name: Optional[str] = None) -> bool:
+    """True for query operations; anything unparseable is treated as a write (run alone)"""
+    if not query:
+        return False
+    try:
+        document = parse(query)
+    except GraphQLError:
+        return False
+    operations = [d for d in document.definitions if isinstance(d, OperationDefinitionNode)]
+    if operation_name:
+        operations = [o for o in operations if o.name and o.name.value == operation_name]
+    return len(operations) == 1 and operations[0].operation == OperationType.QUERY
+
+
+def batch_error(operations: Any) -> Optional[str]:
+    """Why a batch can't be run, or None"""
+    if not isinstance(operations, list) or not operations:
+        return "A batch must be a non-empty JSON array of operations"
+    if len(operations) > settings.GRAPHQL_BATCH_MAX_OPERATIONS:
+        return f"Too many operations in batch (max {settings.GRAPHQL_BATCH_MAX_OPERATIONS})"
+    return None
+
+
+async def run_batch(
+    operations: List[Any],
+    describe: Callable[[Any], Tuple[Optional[str], Optional[str]]],
+    execute: Callable[[Any], Awaitable[T]],
+    context: Optional[dict] = None,
+) -> List[T]:
+    """
+    Execute `operations` in order. `describe(op)` returns (query, operation_name),
+    `execute(op)` runs one operation against the shared `context`.
+    """
+    if isinstance(context, dict):
+        context["batch"] = True
+    results: List[Any] = [None] * len(operations)
+    reads: List[int] = []
+
+    async def flush_reads():
+        done = await asyncio.gather(*(execute(operations[i]) for i in reads))
+        for i, result in zip(reads, done):
+            results[i] = result
+        reads.clear()
+
+    for index, operation in enumerate(operations):
+        if is_read_only(*describe(operation)):
+            reads.append(index)
+            continue
+        await flush_reads()
+        results[index] = await execute(operation)
+        # Reads after the mutation must not see what loaders cached before it
+        loaders = context.get("loaders") if isinstance(context, dict) else None
+        if loaders is not None:
+            loaders.clear()
+    await flush_reads()
+    return results
+
+
+class BatchingGraphQLRouter(GraphQLRouter):
+    """GraphQLRouter whose batches keep mutations in order (Strawberry's own batching gathers everything)"""
+
+    async def execute_operation(self, request, request_adapter, request_data, context, root_value, sub_response):
+        if not isinstance(request_data, list):
+            return await super().execute_operation(
+                request, request_adapter, request_data, context, root_value, sub_response
+            )
+
+        return await run_batch(
+            request_data,
+            lambda data: (data.query, data.operation_name),
+            lambda data: self.execute_single(
+                request=request,
+                request_adapter=request_adapter,
+                sub_response=sub_response,
+                context=context,
+                root_value=root_value,
+                request_data=data,
+            ),
+            context,
+        )
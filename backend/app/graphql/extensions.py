@@ -0,0 +1,37 @@
+import inspect
+from strawberry.extensions import SchemaExtension
+from app.utils.slow_queries import current_operation, current_resolver
+
+
+class QueryContextExtension(SchemaExtension):
+    """Tags SQL issued during an operation with its name and top-level resolver (for the slow-query log)"""
+
+    def on_execute(self):
+        context = self.execution_context
+        token = current_operation.set(context.operation_name or "anonymous")
+        try:
+            yield
+        finally:
+            current_operation.reset(token)
+
+    def resolve(self, _next, root, info, *args, **kwargs):
+        if info.path.prev is not None:
+            return _next(root, info, *args, **kwargs)
+
+        name = f"{info.parent_type.name}.{info.field_name}"
+        token = current_resolver.set(name)
+        try:
+            result = _next(root, info, *args, **kwargs)
+        finally:
+            current_resolver.reset(token)
+        if inspect.isawaitable(result):
+            return _awaited_as(name, result)
+        return result
+
+
+async def _awaited_as(name: str, awaitable):
+    token = current_resolver.set(name)
+    try:
+        return await awaitable
+    finally:
+        current_resolver.reset(token)
@@ -0,0 +1,60 @@
+"""
+Per-request DataLoaders. Every operation in one HTTP request (including all
+operations of a batch) shares them, so e.g. `product(id)` for each cart line
+becomes one `IN (...)` query.
+"""
+import asyncio
+from typing import List, Optional
+from strawberry.dataloader import DataLoader
+
+
+async def _load_products(ids: List[int]) -> List[Optional["Product"]]:
+    from app.graphql.queries import _load_products_by_id
+    from app.utils.single_flight import single_flight
+
+    # Concurrent requests for the same ids (e.g. one hot product) still share one fetch
+    key = ("products_by_id", tuple(sorted(set(ids))))
+    found = await single_flight.do(key, lambda: _load_products_by_id(list(key[1])))
+    return [found.get(id) for id in ids]
+
+
+async def _load_orders_by_user(user_ids: List[int]) -> List[List["Order"]]:
+    from app.graphql.queries import _load_orders_by_user_id
+
+    found = await asyncio.to_thread(_load_orders_by_user_id, list(user_ids))
+    return [found.get(user_id, []) for user_id in user_ids]
+
+
+async def _load_stock_forecasts(product_ids: List[int]) -> List[Optional["StockForecast"]]:
+    from app.graphql.queries import _load_stock_forecasts_by_product_id
+
+    found = await asyncio.to_thread(_load_stock_forecasts_by_product_id, list(product_ids))
+    return [found.get(product_id) for product_id in product_ids]
+
+
+class Loaders:
+    def __init__(self):
+        self.product = DataLoader(load_fn=_load_products)
+        self.orders_by_user = DataLoader(load_fn=_load_orders_by_user)
+        self.stock_forecast = DataLoader(load_fn=_load_stock_forecasts)
+
+    def clear(self):
+        """Forget cached results (after a mutation in the same request)"""
+        self.product.clear_all()
+        self.orders_by_user.clear_all()
+        self.stock_forecast.clear_all()
+
+
+def loaders_from(info) -> Loaders:
+    """The request's loaders; a private set when the caller didn't provide a context"""
+    context = getattr(info, "context", None)
+    if isinstance(context, dict):
+        if "loaders" not in context:
+            context["loaders"] = Loaders()
+        return context["loaders"]
+    return Loaders()
+
+
+async def get_context() -> dict:
+    """context_getter for the FastAPI GraphQLRouter (merged into its default context)"""
+    return {"loaders": Loaders()}
@@ -1,75 +1,262 @@
+import asyncio
 import strawberry
-from typing import Optional
+from datetime import datetime, timezone
+from typing import Any, Callable, List, Optional
+from sqlalchemy import update, delete
 from sqlalchemy.orm import Session
 from app.graphql.types import (
-    User, Product, Order, AuthPayload,
-    UserInput, LoginInput, ProductInput, OrderInput
+    User, Product, Order, AuthPayload, ProductCategory,
+    Reservation, ReservationItem,
+    UserInput, LoginInput, ProductInput, OrderInput, OrderItemInput
 )
 from app.models import (
     User as UserModel,
     Product as ProductModel,
     Order as OrderModel,
-    OrderItem as OrderItemModel
+    OrderItem as OrderItemModel,
+    Reservation as ReservationModel
 )
-from app.database import get_db
+from app.models.order import OrderStatus as OrderStatusModel
+from app.models.reservation import ReservationStatus
+from app.database import get_db, ids_match
 from app.utils.auth import get_password_hash, verify_password, create_access_token
+from app.utils.invalidation import invalidate_catalog, invalidate_users
+from app.utils.catalog_changes import record_catalog_changes
+from app.utils.customer_stats import record_order, ensure_stats_row
+from app.utils.email_tokens import consume_verification_token
+from app.utils.events import publish_order_event, publish_order_events
+from app.utils.idempotency import run_idempotent, idempotency_key_from, from_jsonable
+from app.utils.images import enqueue_image_variants
+from app.utils.jobs import enqueue
+from app.utils.reservations import (
+    generate_reservation_token, reservation_expiry, held_quantities, available_stock
+)
+
+
+def _register(input: UserInput, complete: Callable[[Session, Any], None]) -> AuthPayload:
+    """Register a new user; `complete` records the idempotency result in the same transaction"""
+    db: Session = next(get_db())
+    
+    # Check if user exists
+    existing_user = db.query(UserModel).filter(
+        (UserModel.email == input.email) | (UserModel.username == input.username)
+    ).first()
+    
+    if existing_user:
+        raise Exception("User with this email or username already exists")
+    
+    # Create new user
+    hashed_password = get_password_hash(input.password)
+    new_user = UserModel(
+        email=input.email,
+        username=input.username,
+        hashed_password=hashed_password,
+        full_name=input.full_name,
+        email_verified=False
+    )
+    
+    db.add(new_user)
+    db.flush()
+    ensure_stats_row(db, new_user.id)
+    # Queued in the same transaction: the email goes out only if the user row commits.
+    # The job issues the token itself, so the raw token is never stored in `jobs`
+    enqueue("send_verification_email", {"user_id": new_user.id}, db=db)
+    # Only the id is kept with the idempotency key: a replay issues a fresh access token
+    complete(db, {"user_id": new_user.id})
+    db.commit()
+    db.refresh(new_user)
+    
+    return _auth_payload(new_user)
+
+
+def _auth_payload(user: UserModel) -> AuthPayload:
+    """A fresh access token for the user"""
+    access_token = create_access_token(data={"sub": user.email})
+    
+    return AuthPayload(
+        access_token=access_token,
+        token_type="bearer",
+        user=User(
+            id=user.id,
+            email=user.email,
+            username=user.username,
+            full_name=user.full_name,
+            is_active=user.is_active,
+            is_admin=user.is_admin,
+            email_verified=user.email_verified,
+            created_at=user.created_at
+        )
+    )
+
+
+def _replay_register(stored: dict) -> AuthPayload:
+    """Replayed registrations get a new token: only the user id is kept with the idempotency key"""
+    db: Session = next(get_db())
+    # Keys stored before this change hold the whole payload
+    user_id = stored["user_id"] if "user_id" in stored else stored["user"]["id"]
+    user = db.get(UserModel, user_id)
+    if user is None:
+        raise Exception("User not found")
+    
+    return _auth_payload(user)
+
+
+def _create_order(
+    input: OrderInput,
+    user_id: int,
+    reservation_token: Optional[str],
+    complete: Callable[[Session, Any], None]
+) -> Order:
+    """
+    Create a new order, converting the reservation when one is given.
+    `complete` records the idempotency result in the same transaction.
+    """
+    db: Session = next(get_db())
+    
+    product_ids = [item.product_id for item in input.items]
+    query = db.query(ProductModel).filter(ids_match(ProductModel.id, product_ids))
+    if not reservation_token:
+        # Same row locks as reserveItems, so holds can't be placed between the check and the decrement
+        query = query.order_by(ProductModel.id).with_for_update()
+    products = {p.id: p for p in query.all()}
+    
+    reserved = {}
+    if reservation_token:
+        # Stock was already checked and held by reserveItems, so the product rows
+        # are not locked again. Converting first claims the holds: a concurrent
+        # checkout with the same token waits on these rows and then flips none.
+        converted = db.execute(
+            update(ReservationModel)
+            .where(
+                ReservationModel.token == reservation_token,
+                ReservationModel.user_id == user_id,
+                ReservationModel.status == ReservationStatus.ACTIVE,
+                ReservationModel.expires_at > datetime.now(timezone.utc)
+            )
+            .values(status=ReservationStatus.CONVERTED)
+            .returning(ReservationModel.product_id, ReservationModel.quantity),
+            execution_options={"synchronize_session": False}
+        ).all()
+        if not converted:
+            raise Exception("Reservation not found or expired")
+        for product_id, quantity in converted:
+            reserved[product_id] = reserved.get(product_id, 0) + quantity
+    
+    # Stock held by everyone else's carts is not available to this order
+    # (a reservation already accounted for them when it was placed)
+    held = {} if reservation_token else held_quantities(db, product_ids)
+    
+    # Calculate total
+    total_amount = 0.0
+    order_items = []
+    
+    for item_input in input.items:
+        product = products.get(item_input.product_id)
+        if not product:
+            raise Exception(f"Product {item_input.product_id} not found")
+    
+        if reservation_token:
+            if reserved.get(product.id, 0) < item_input.quantity:
+                raise Exception(f"Reservation does not cover {product.title}")
+        elif available_stock(product.stock, held.get(product.id, 0)) < item_input.quantity:
+            raise Exception(f"Insufficient stock for {product.title}")
+    
+        total_amount += product.price * item_input.quantity
+        order_items.append({
+            "product_id": product.id,
+            "quantity": item_input.quantity,
+            "price": product.price,
+            "product_title": product.title,
+            "product_category": product.category.name,
+            "product_size": product.size.name if product.size else None,
+            "product_image_url": product.image_url
+        })
+    
+    # Create order
+    new_order = OrderModel(
+        user_id=user_id,
+        total_amount=total_amount,
+        shipping_address=input.shipping_address,
+        payment_method=input.payment_method,
+        item_count=sum(item["quantity"] for item in order_items)
+    )
+    
+    db.add(new_order)
+    db.flush()
+    
+    # Create order items
+    for item_data in order_items:
+        order_item = OrderItemModel(
+            order_id=new_order.id,
+            **item_data
+        )
+        db.add(order_item)
+    
+        # Update product stock in place, without re-reading the row. The guard matters on the
+        # reservation path, where the rows aren't locked: never take stock below zero
+        decremented = db.execute(
+            update(ProductModel)
+            .where(ProductModel.id == item_data["product_id"], ProductModel.stock >= item_data["quantity"])
+            .values(stock=ProductModel.stock - item_data["quantity"]),
+            execution_options={"synchronize_session": False}
+        ).rowcount
+        if not decremented:
+            raise Exception(f"Insufficient stock for {item_data['product_title']}")
+    
+    record_order(db, user_id, total_amount)
+    
+    complete(db, {"order_id": new_order.id})
+    db.commit()
+    db.refresh(new_order)
+    
+    order = _created_order(new_order)
+    publish_order_event("created", order)
+    
+    return order
+
+
+def _created_order(o: OrderModel) -> Order:
+    """createOrder's response for an order row"""
+    return Order(
+        id=o.id,
+        user_id=o.user_id,
+        total_amount=o.total_amount,
+        status=o.status,
+        shipping_address=o.shipping_address,
+        payment_method=o.payment_method,
+        created_at=o.created_at,
+        updated_at=o.updated_at,
+        items=[],
+        item_count=o.item_count
+    )
+
+
+def _replay_create_order(stored: dict) -> Order:
+    """The order a retried createOrder already placed"""
+    if "order_id" not in stored:
+        # Keys stored before this change hold the whole response
+        return from_jsonable(Order, stored)
+    db: Session = next(get_db())
+    order = db.get(OrderModel, stored["order_id"])
+    if order is None:
+        raise Exception("Order not found")
+    return _created_order(order)
 
 
 @strawberry.type
 class Mutation:
     @strawberry.mutation
-    def register(self, input: UserInput) -> AuthPayload:
-        """Register a new user"""
-        db: Session = next(get_db())
-        
-        # Check if user exists
-        existing_user = db.query(UserModel).filter(
-            (UserModel.email == input.email) | (UserModel.username == input.username)
-        ).first()
-        
-        if existing_user:
-            raise Exception("User with this email or username already exists")
-        
-        # Import email utilities
-        from app.utils.email import generate_verification_token, send_verification_email
-        
-        # Generate verification token
-        verification_token = generate_verification_token()
-        
-        # Create new user
-        hashed_password = get_password_hash(input.password)
-        new_user = UserModel(
-            email=input.email,
-            username=input.username,
-            hashed_password=hashed_password,
-            full_name=input.full_name,
-            email_verified=False,
-            verification_token=verification_token
-        )
-        
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
-        
-        # Send verification email
-        send_verification_email(new_user.email, verification_token, new_user.username)
-        
-        # Create access token
-        access_token = create_access_token(data={"sub": new_user.email})
-        
-        return AuthPayload(
-            access_token=access_token,
-            token_type="bearer",
-            user=User(
-                id=new_user.id,
-                email=new_user.email,
-                username=new_user.username,
-                full_name=new_user.full_name,
-                is_active=new_user.is_active,
-                is_admin=new_user.is_admin,
-                email_verified=new_user.email_verified,
-                created_at=new_user.created_at
-            )
+    async def register(self, info: strawberry.Info, input: UserInput, idempotency_key: Optional[str] = None) -> AuthPayload:
+        """Register a new user (safe to retry with an Idempotency-Key)"""
+        # In a thread: a concurrent duplicate waits for the first attempt without blocking the event loop
+        return await asyncio.to_thread(
+            run_idempotent,
+            idempotency_key_from(info, idempotency_key),
+            "register",
+            input,
+            lambda complete: _register(input, complete),
+            AuthPayload,
+            replay=_replay_register
         )
     
     @strawberry.mutation
@@ -121,7 +308,12 @@ class Mutation:
         )
         
         db.add(new_product)
+        db.flush()
+        if new_product.image_url:
+            enqueue_image_variants(new_product.id, db=db)
+        version = record_catalog_changes(db, [new_product.id])
         db.commit()
+        invalidate_catalog(version)
         db.refresh(new_product)
         
         return Product(
@@ -139,65 +331,110 @@ class Mutation:
         )
     
     @strawberry.mutation
-    def create_order(self, input: OrderInput, user_id: int) -> Order:
-        """Create a new order (requires authentication in production)"""
+    def reserve_items(self, items: List[OrderItemInput], user_id: int, token: Optional[str] = None) -> Reservation:
+        """
+        Hold stock for a cart/checkout for a limited time.
+        Passing an existing token replaces that reservation (cart edited).
+        """
         db: Session = next(get_db())
         
-        # Calculate total
-        total_amount = 0.0
-        order_items = []
+        # Lock the product rows once, here, instead of at order time; in id order
+        # (like createOrder) so overlapping carts can't deadlock each other
+        product_ids = [item.product_id for item in items]
+        products = {
+            p.id: p
+            for p in (
+                db.query(ProductModel)
+                .filter(ids_match(ProductModel.id, product_ids))
+                .order_by(ProductModel.id)
+                .with_for_update()
+                .all()
+            )
+        }
+        
+        if token:
+            # Release the previous holds of this cart before re-reserving
+            db.execute(
+                update(ReservationModel)
+                .where(
+                    ReservationModel.token == token,
+                    ReservationModel.user_id == user_id,
+                    ReservationModel.status == ReservationStatus.ACTIVE
+                )
+                .values(status=ReservationStatus.RELEASED),
+                execution_options={"synchronize_session": False}
+            )
+        else:
+            token = generate_reservation_token()
+        
+        held = held_quantities(db, product_ids)
+        expires_at = reservation_expiry()
         
-        for item_input in input.items:
-            product = db.query(ProductModel).filter(ProductModel.id == item_input.product_id).first()
+        for item in items:
+            product = products.get(item.product_id)
             if not product:
-                raise Exception(f"Product {item_input.product_id} not found")
+                raise Exception(f"Product {item.product_id} not found")
             
-            if product.stock < item_input.quantity:
+            if item.quantity <= 0:
+                raise Exception(f"Invalid quantity for {product.title}")
+            
+            if available_stock(product.stock, held.get(product.id, 0)) < item.quantity:
                 raise Exception(f"Insufficient stock for {product.title}")
             
-            total_amount += product.price * item_input.quantity
-            order_items.append({
-                "product_id": product.id,
-                "quantity": item_input.quantity,
-                "price": product.price
-            })
-        
-        # Create order
-        new_order = OrderModel(
+            held[product.id] = held.get(product.id, 0) + item.quantity
+            db.add(ReservationModel(
+                token=token,
+                user_id=user_id,
+                product_id=product.id,
+                quantity=item.quantity,
+                expires_at=expires_at
+            ))
+        
+        db.commit()
+        
+        return Reservation(
+            token=token,
             user_id=user_id,
-            total_amount=total_amount,
-            shipping_address=input.shipping_address,
-            payment_method=input.payment_method
+            expires_at=expires_at,
+            items=[ReservationItem(product_id=item.product_id, quantity=item.quantity) for item in items]
         )
+    
+    @strawberry.mutation
+    def release_reservation(self, token: str) -> bool:
+        """Release all active holds of a reservation (cart emptied / abandoned)"""
+        db: Session = next(get_db())
         
-        db.add(new_order)
-        db.flush()
-        
-        # Create order items
-        for item_data in order_items:
-            order_item = OrderItemModel(
-                order_id=new_order.id,
-                **item_data
+        result = db.execute(
+            update(ReservationModel)
+            .where(
+                ReservationModel.token == token,
+                ReservationModel.status == ReservationStatus.ACTIVE
             )
-            db.add(order_item)
-            
-            # Update product stock
-            product = db.query(ProductModel).filter(ProductModel.id == item_data["product_id"]).first()
-            product.stock -= item_data["quantity"]
-        
+            .values(status=ReservationStatus.RELEASED),
+            execution_options={"synchronize_session": False}
+        )
         db.commit()
-        db.refresh(new_order)
-        
-        return Order(
-            id=new_order.id,
-            user_id=new_order.user_id,
-            total_amount=new_order.total_amount,
-            status=new_order.status,
-            shipping_address=new_order.shipping_address,
-            payment_method=new_order.payment_method,
-            created_at=new_order.created_at,
-            updated_at=new_order.updated_at,
-            items=[]
+        
+        return result.rowcount > 0
+    
+    @strawberry.mutation
+    async def create_order(
+        self,
+        info: strawberry.Info,
+        input: OrderInput,
+        user_id: int,
+        reservation_token: Optional[str] = None,
+        idempotency_key: Optional[str] = None
+    ) -> Order:
+        """Create a new order (requires authentication in production; safe to retry with an Idempotency-Key)"""
+        return await asyncio.to_thread(
+            run_idempotent,
+            idempotency_key_from(info, idempotency_key),
+            "createOrder",
+            {"input": input, "user_id": user_id, "reservation_token": reservation_token},
+            lambda complete: _create_order(input, user_id, reservation_token, complete),
+            Order,
+            replay=_replay_create_order
         )
     
     @strawberry.mutation
@@ -221,7 +458,7 @@ class Mutation:
         db.commit()
         db.refresh(order)
         
-        return Order(
+        result = Order(
             id=order.id,
             user_id=order.user_id,
             total_amount=order.total_amount,
@@ -230,8 +467,12 @@ class Mutation:
             payment_method=order.payment_method,
             created_at=order.created_at,
             updated_at=order.updated_at,
-            items=[]
+            items=[],
+            item_count=order.item_count
         )
+        publish_order_event("updated", result)
+        
+        return result
     
     @strawberry.mutation
     def update_user(self, user_id: int, full_name: Optional[str] = None, email: Optional[str] = None) -> User:
@@ -255,6 +496,7 @@ class Mutation:
         
         db.commit()
         db.refresh(user)
+        invalidate_users([user.id])
         
         return User(
             id=user.id,
@@ -281,6 +523,7 @@ class Mutation:
         user.is_active = not user.is_active
         db.commit()
         db.refresh(user)
+        invalidate_users([user.id])
         
         return User(
             id=user.id,
@@ -311,10 +554,16 @@ class Mutation:
         product.gradient = input.gradient
         product.size = input.size.value
         product.stock = input.stock
-        if input.image_url:
+        if input.image_url and input.image_url != product.image_url:
             product.image_url = input.image_url
+            # Old variants no longer match; the job points the product at new ones
+            product.image_hash = None
+            product.image_variants = None
+            enqueue_image_variants(product.id, db=db)
         
+        version = record_catalog_changes(db, [product.id])
         db.commit()
+        invalidate_catalog(version)
         db.refresh(product)
         
         return Product(
@@ -343,17 +592,156 @@ class Mutation:
         
         # Delete product
         db.delete(product)
+        version = record_catalog_changes(db, [product_id])
         db.commit()
+        invalidate_catalog(version)
         
         return True
     
+    @strawberry.mutation
+    def update_order_statuses(self, ids: List[int], status: str) -> List[Order]:
+        """Update the status of many orders in one statement (admin only in production)"""
+        db: Session = next(get_db())
+        
+        # Validate status
+        valid_statuses = ['pending', 'processing', 'shipped', 'delivered', 'cancelled']
+        status = status.lower()
+        if status not in valid_statuses:
+            raise Exception(f"Invalid status. Must be one of: {', '.join(valid_statuses)}")
+        
+        if not ids:
+            return []
+        
+        # Single UPDATE ... RETURNING, no per-row SELECT/refresh
+        orders = db.scalars(
+            update(OrderModel)
+            .where(ids_match(OrderModel.id, ids))
+            .values(status=OrderStatusModel(status))
+            .returning(OrderModel),
+            execution_options={"synchronize_session": False}
+        ).all()
+        
+        # Build the response before commit expires the returned rows
+        result = [
+            Order(
+                id=o.id,
+                user_id=o.user_id,
+                total_amount=o.total_amount,
+                status=o.status,
+                shipping_address=o.shipping_address,
+                payment_method=o.payment_method,
+                created_at=o.created_at,
+                updated_at=o.updated_at,
+                items=[],
+                item_count=o.item_count
+            )
+            for o in orders
+        ]
+        db.commit()
+        
+        publish_order_events("updated", result)
+        
+        return result
+    
+    @strawberry.mutation
+    def set_products_active(self, ids: List[int], active: bool) -> List[Product]:
+        """Activate or deactivate many products in one statement (admin only in production)"""
+        db: Session = next(get_db())
+        
+        if not ids:
+            return []
+        
+        products = db.scalars(
+            update(ProductModel)
+            .where(ids_match(ProductModel.id, ids))
+            .values(is_active=1 if active else 0)
+            .returning(ProductModel),
+            execution_options={"synchronize_session": False}
+        ).all()
+        
+        result = [
+            Product(
+                id=p.id,
+                title=p.title,
+                description=p.description,
+                price=p.price,
+                category=ProductCategory[p.category.name],
+                gradient=p.gradient,
+                size=p.size,
+                stock=p.stock,
+                image_url=p.image_url,
+                is_active=bool(p.is_active),
+                created_at=p.created_at
+            )
+            for p in products
+        ]
+        version = record_catalog_changes(db, [p.id for p in result])
+        db.commit()
+        invalidate_catalog(version)
+        
+        return result
+    
+    @strawberry.mutation
+    def delete_products(self, ids: List[int]) -> List[int]:
+        """Delete many products in one statement, returning the deleted ids (admin only in production)"""
+        db: Session = next(get_db())
+        
+        if not ids:
+            return []
+        
+        deleted_ids = db.scalars(
+            delete(ProductModel)
+            .where(ids_match(ProductModel.id, ids))
+            .returning(ProductModel.id),
+            execution_options={"synchronize_session": False}
+        ).all()
+        version = record_catalog_changes(db, deleted_ids)
+        db.commit()
+        invalidate_catalog(version)
+        
+        return list(deleted_ids)
+    
+    @strawberry.mutation
+    def set_users_active(self, ids: List[int], active: bool) -> List[User]:
+        """Activate or deactivate many users in one statement (admin only in production)"""
+        db: Session = next(get_db())
+        
+        if not ids:
+            return []
+        
+        users = db.scalars(
+            update(UserModel)
+            .where(ids_match(UserModel.id, ids))
+            .values(is_active=active)
+            .returning(UserModel),
+            execution_options={"synchronize_session": False}
+        ).all()
+        
+        result = [
+            User(
+                id=u.id,
+                email=u.email,
+                username=u.username,
+                full_name=u.full_name,
+                is_active=u.is_active,
+                is_admin=u.is_admin,
+                email_verified=u.email_verified,
+                created_at=u.created_at
+            )
+            for u in users
+        ]
+        db.commit()
+        invalidate_users([u.id for u in result])
+        
+        return result
+    
     @strawberry.mutation
     def verify_email(self, token: str) -> User:
         """Verify user email with verification token"""
         db: Session = next(get_db())
         
-        # Find user by verification token
-        user = db.query(UserModel).filter(UserModel.verification_token == token).first()
+        # Indexed lookup on the token hash; the user's tokens are deleted with it
+        user = consume_verification_token(db, token)
         if not user:
             raise Exception("Invalid or expired verification token")
         
@@ -361,16 +749,12 @@ class Mutation:
         if user.email_verified:
             raise Exception("Email already verified")
         
-        # Mark as verified and clear token
+        # Mark as verified
         user.email_verified = True
-        user.verification_token = None
+        enqueue("send_welcome_email", {"email": user.email, "username": user.username}, db=db)
         db.commit()
         db.refresh(user)
         
-        # Send welcome email
-        from app.utils.email import send_welcome_email
-        send_welcome_email(user.email, user.username)
-        
         return User(
             id=user.id,
             email=user.email,
@@ -1,67 +1,310 @@
+import json
 import strawberry
-from typing import List, Optional
-from sqlalchemy.orm import Session
-from app.graphql.types import Product, User, Order, ProductCategory
-from app.models import Product as ProductModel, User as UserModel, Order as OrderModel
-from app.database import get_db
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session, selectinload
+from app.graphql.types import (
+    Product, User, Order, OrderItem, ProductCategory, ProductSize,
+    ProductFilter, ProductFacets, CategoryFacet, SizeFacet, PriceBucket,
+    ProductSortField, SortDirection, Customer, CustomerPage, CustomerSortField, SlowQuery,
+    ProductImages, ImageVariant, OrderDelta, CatalogChanges, StockForecast
+)
+from app.models import (
+    Product as ProductModel, User as UserModel, Order as OrderModel, UserOrderStats, ProductRecommendation, TrendingScore,
+    StockForecast as StockForecastModel
+)
+from app.models.product import ProductCategory as ProductCategoryModel
+from app.models.order import OrderStatus as OrderStatusModel
+from app.database import get_db, ids_match
+from app.graphql.loaders import loaders_from
+from app.config import settings
+from app.utils.reservations import held_quantities, available_stock
+from app.utils.images import variant_url
+from app.utils.invalidation import catalog_version
+from app.utils.catalog_changes import catalog_changes_since
+from app.utils.single_flight import single_flight
+from app.utils.slow_queries import slow_query_log
+from app.utils.catalog import (
+    compute_product_facets, facet_cache, filter_cache_key, product_filter_clauses, product_order_by
+)
 
 
+def _order_from_model(o: OrderModel) -> Order:
+    """Build an Order from the orders/order_items rows only (product data comes from the snapshot)"""
+    return Order(
+        id=o.id,
+        user_id=o.user_id,
+        total_amount=o.total_amount,
+        status=o.status,
+        shipping_address=o.shipping_address,
+        payment_method=o.payment_method,
+        created_at=o.created_at,
+        updated_at=o.updated_at,
+        item_count=o.item_count,
+        items=[
+            OrderItem(
+                id=i.id,
+                product_id=i.product_id,
+                quantity=i.quantity,
+                price=i.price,
+                title=i.product_title,
+                category=ProductCategory[i.product_category] if i.product_category else None,
+                size=ProductSize[i.product_size] if i.product_size else None,
+                image_url=i.product_image_url
+            )
+            for i in o.items
+        ]
+    )
+
+
+def _images_from_model(p: ProductModel) -> Optional[ProductImages]:
+    if not p.image_hash or not p.image_variants:
+        return None
+    return ProductImages(variants=[
+        ImageVariant(url=variant_url(p.image_hash, v["name"], v["format"]), **v)
+        for v in json.loads(p.image_variants)
+    ])
+
+
+def _product_from_model(p: ProductModel, held: int) -> Product:
+    return Product(
+        id=p.id,
+        title=p.title,
+        description=p.description,
+        price=p.price,
+        category=ProductCategory[p.category.name],
+        gradient=p.gradient,
+        size=p.size,
+        stock=p.stock,
+        image_url=p.image_url,
+        is_active=bool(p.is_active),
+        created_at=p.created_at,
+        available_stock=available_stock(p.stock, held),
+        images=_images_from_model(p)
+    )
+
+
+def _load_products(filters: ProductFilter, sort_by, sort_direction, limit: int, offset: int) -> List[Product]:
+    """Blocking fetch behind Query.products (runs in a worker thread)"""
+    db: Session = next(get_db())
+    products = (
+        db.query(ProductModel)
+        .filter(*product_filter_clauses(filters))
+        .order_by(*product_order_by(sort_by, sort_direction))
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
+    held = held_quantities(db, [p.id for p in products])
+    
+    return [_product_from_model(p, held.get(p.id, 0)) for p in products]
+
+
+def _load_products_by_id(ids: List[int]) -> Dict[int, Product]:
+    """Blocking fetch behind the product DataLoader (runs in a worker thread)"""
+    db: Session = next(get_db())
+    products = db.query(ProductModel).filter(ids_match(ProductModel.id, ids)).all()
+    held = held_quantities(db, [p.id for p in products])
+    
+    return {p.id: _product_from_model(p, held.get(p.id, 0)) for p in products}
+
+
+def _load_orders_by_user_id(user_ids: List[int]) -> Dict[int, List[Order]]:
+    """Blocking fetch behind the orders-by-user DataLoader (runs in a worker thread)"""
+    db: Session = next(get_db())
+    orders = (
+        db.query(OrderModel)
+        .options(selectinload(OrderModel.items))
+        .filter(ids_match(OrderModel.user_id, user_ids))
+        .order_by(OrderModel.created_at.desc())
+        .all()
+    )
+    
+    by_user: Dict[int, List[Order]] = {}
+    for o in orders:
+        by_user.setdefault(o.user_id, []).append(_order_from_model(o))
+    return by_user
+
+
+def _stock_forecast_from_model(f: StockForecastModel) -> StockForecast:
+    return StockForecast(
+        velocity=f.velocity,
+        daily_average=f.daily_average,
+        recent_average=f.recent_average,
+        available_stock=f.available_stock,
+        days_until_stockout=f.days_until_stockout,
+        computed_at=f.computed_at
+    )
+
+
+def _load_stock_forecasts_by_product_id(product_ids: List[int]) -> Dict[int, StockForecast]:
+    """Blocking fetch behind the stock forecast DataLoader (runs in a worker thread)"""
+    db: Session = next(get_db())
+    forecasts = db.query(StockForecastModel).filter(ids_match(StockForecastModel.product_id, product_ids)).all()
+    
+    return {f.product_id: _stock_forecast_from_model(f) for f in forecasts}
+
+
+def _ranked_products(ranking, category: Optional[ProductCategory], first: int) -> List[Product]:
+    """Active products by a trending_scores column, highest first"""
+    db: Session = next(get_db())
+    query = (
+        db.query(ProductModel)
+        .join(TrendingScore, TrendingScore.product_id == ProductModel.id)
+        .filter(ProductModel.is_active == 1, ranking > 0)
+    )
+    if category:
+        query = query.filter(ProductModel.category == ProductCategoryModel[category.name])
+    products = query.order_by(ranking.desc(), ProductModel.id).limit(min(first, 50)).all()
+    held = held_quantities(db, [p.id for p in products])
+    
+    return [_product_from_model(p, held.get(p.id, 0)) for p in products]
+
 @strawberry.type
 class Query:
     @strawberry.field
-    def products(
+    async def products(
         self,
         category: Optional[ProductCategory] = None,
+        size: Optional[ProductSize] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        in_stock: Optional[bool] = None,
+        sort_by: Optional[ProductSortField] = None,
+        sort_direction: Optional[SortDirection] = None,
         limit: int = 100,
         offset: int = 0
     ) -> List[Product]:
-        """Get all products with optional filtering"""
+        """Get active products, filtered and sorted in SQL (backed by the partial listing indexes)"""
+        filters = ProductFilter(
+            category=category,
+            size=size,
+            min_price=min_price,
+            max_price=max_price,
+            in_stock=in_stock
+        )
+        # Identical concurrent listings share one DB fetch
+        key = (
+            "products",
+            filter_cache_key(filters),
+            sort_by.value if sort_by else None,
+            sort_direction.value if sort_direction else None,
+            limit,
+            offset
+        )
+        return await single_flight.do(key, lambda: _load_products(filters, sort_by, sort_direction, limit, offset))
+    
+    @strawberry.field
+    async def product(self, info: strawberry.Info, id: int) -> Optional[Product]:
+        """Get a single product by ID (batched with other product lookups in the request)"""
+        return await loaders_from(info).product.load(id)
+    
+    @strawberry.field
+    def recommended_products(self, product_id: int, first: int = 8) -> List[Product]:
+        """Products frequently bought together with `product_id`, best first (precomputed by a background job)"""
         db: Session = next(get_db())
-        query = db.query(ProductModel).filter(ProductModel.is_active == 1)
+        products = (
+            db.query(ProductModel)
+            .join(ProductRecommendation, ProductRecommendation.recommended_id == ProductModel.id)
+            .filter(ProductRecommendation.product_id == product_id, ProductModel.is_active == 1)
+            .order_by(ProductRecommendation.rank)
+            .limit(min(first, settings.RECOMMENDATION_TOP_K))
+            .all()
+        )
+        held = held_quantities(db, [p.id for p in products])
+        
+        return [_product_from_model(p, held.get(p.id, 0)) for p in products]
+    
+    @strawberry.field
+    def trending_products(self, category: Optional[ProductCategory] = None, first: int = 8) -> List[Product]:
+        """Best sellers weighted toward recent sales, best first (precomputed by a background job)"""
+        return _ranked_products(TrendingScore.score, category, first)
+    
+    @strawberry.field
+    def best_sellers(self, category: Optional[ProductCategory] = None, first: int = 8) -> List[Product]:
+        """Most units sold of all time, best first (precomputed by a background job)"""
+        return _ranked_products(TrendingScore.units_sold, category, first)
+    
+    @strawberry.field
+    def low_stock_products(self, info: strawberry.Info, threshold_days: Optional[float] = None) -> List[Product]:
+        """Active products forecast to sell out within `threshold_days`, soonest first (Admin only)"""
+        if threshold_days is None:
+            threshold_days = settings.LOW_STOCK_THRESHOLD_DAYS
+        db: Session = next(get_db())
+        rows = (
+            db.query(ProductModel, StockForecastModel)
+            .join(StockForecastModel, StockForecastModel.product_id == ProductModel.id)
+            .filter(ProductModel.is_active == 1, StockForecastModel.days_until_stockout <= threshold_days)
+            .order_by(StockForecastModel.days_until_stockout, ProductModel.id)
+            .all()
+        )
+        held = held_quantities(db, [p.id for p, _ in rows])
         
-        if category:
-            query = query.filter(ProductModel.category == category.value)
+        # Selecting stockForecast on these products costs no extra query
+        loader = loaders_from(info).stock_forecast
+        for p, f in rows:
+            loader.prime(p.id, _stock_forecast_from_model(f))
+        return [_product_from_model(p, held.get(p.id, 0)) for p, _ in rows]
+    
+    @strawberry.field
+    def product_facets(self, filters: Optional[ProductFilter] = None) -> ProductFacets:
+        """Category/size/price-bucket/in-stock counts for the (filtered) active catalog"""
+        key = filter_cache_key(filters)
+        hit, facets = facet_cache.get(key)
+        if hit:
+            return facets
         
-        products = query.offset(offset).limit(limit).all()
+        # Taken before reading so a concurrent invalidation isn't overwritten with stale counts
+        snapshot = facet_cache.snapshot()
+        db: Session = next(get_db())
+        counts = compute_product_facets(db, filters)
+        width = settings.FACET_PRICE_BUCKET_WIDTH
         
-        return [
-            Product(
-                id=p.id,
-                title=p.title,
-                description=p.description,
-                price=p.price,
-                category=ProductCategory[p.category.name],
-                gradient=p.gradient,
-                size=p.size,
-                stock=p.stock,
-                image_url=p.image_url,
-                is_active=bool(p.is_active),
-                created_at=p.created_at
-            )
-            for p in products
-        ]
+        facets = ProductFacets(
+            total=counts["total"],
+            in_stock=counts["in_stock"],
+            categories=[
+                CategoryFacet(category=c, count=counts["categories"].get(c.name, 0))
+                for c in ProductCategory
+            ],
+            sizes=[
+                SizeFacet(size=s, count=counts["sizes"].get(s.name, 0))
+                for s in ProductSize
+            ],
+            price_buckets=[
+                PriceBucket(min_price=b * width, max_price=(b + 1) * width, count=n)
+                for b, n in sorted(counts["buckets"].items())
+            ]
+        )
+        facet_cache.set(key, facets, snapshot)
+        return facets
+    
+    @strawberry.field
+    def catalog_version(self) -> int:
+        """Global catalog version; bumps on every product change (cheap staleness check for clients)"""
+        return catalog_version()
     
     @strawberry.field
-    def product(self, id: int) -> Optional[Product]:
-        """Get a single product by ID"""
+    def catalog_changes(self, since: Optional[int] = None) -> CatalogChanges:
+        """Active products changed after catalog version `since` and ids removed since (full catalog without `since`)"""
         db: Session = next(get_db())
-        product = db.query(ProductModel).filter(ProductModel.id == id).first()
+        version, changed_ids = catalog_changes_since(db, since)
         
-        if not product:
-            return None
+        query = db.query(ProductModel).filter(ProductModel.is_active == 1)
+        if changed_ids is not None:
+            if not changed_ids:
+                return CatalogChanges(version=version, full_resync=False, products=[], deleted_ids=[])
+            query = query.filter(ids_match(ProductModel.id, changed_ids))
+        products = query.order_by(ProductModel.id).all()
+        held = held_quantities(db, [p.id for p in products])
         
-        return Product(
-            id=product.id,
-            title=product.title,
-            description=product.description,
-            price=product.price,
-            category=ProductCategory[product.category.name],
-            gradient=product.gradient,
-            size=product.size,
-            stock=product.stock,
-            image_url=product.image_url,
-            is_active=bool(product.is_active),
-            created_at=product.created_at
+        live = {p.id for p in products}
+        return CatalogChanges(
+            version=version,
+            full_resync=changed_ids is None,
+            products=[_product_from_model(p, held.get(p.id, 0)) for p in products],
+            deleted_ids=[i for i in changed_ids or [] if i not in live]
         )
     
     @strawberry.field
@@ -85,92 +328,53 @@ class Query:
         )
     
     @strawberry.field
-    def my_orders(self, user_id: int) -> List[Order]:
+    async def my_orders(self, info: strawberry.Info, user_id: int) -> List[Order]:
         """Get orders for a user (requires authentication in production)"""
-        db: Session = next(get_db())
-        orders = db.query(OrderModel).filter(OrderModel.user_id == user_id).order_by(OrderModel.created_at.desc()).all()
+        return await loaders_from(info).orders_by_user.load(user_id)
+
+    @strawberry.field
+    def my_orders_delta(self, user_id: int, updated_since: Optional[str] = None) -> OrderDelta:
+        """
+        Orders created or changed since `updated_since` (a watermark from a previous
+        call), with cancelled orders as tombstones. No watermark: the full live history.
+        """
+        # Issued before reading, trailing the clock; the overlap only re-sends a few recent orders
+        watermark = datetime.now(timezone.utc) - timedelta(seconds=settings.ORDER_SYNC_OVERLAP_SECONDS)
         
-        from app.graphql.types import OrderItem, Product
+        db: Session = next(get_db())
+        query = db.query(OrderModel).options(selectinload(OrderModel.items)).filter(OrderModel.user_id == user_id)
+        if updated_since:
+            try:
+                since = datetime.fromisoformat(updated_since)
+            except ValueError:
+                raise Exception("Invalid updatedSince watermark")
+            # Served by ix_orders_user_updated
+            query = query.filter(OrderModel.updated_at > since).order_by(OrderModel.updated_at)
+        else:
+            query = query.filter(OrderModel.status != OrderStatusModel.CANCELLED).order_by(OrderModel.created_at.desc())
         
-        return [
-            Order(
-                id=o.id,
-                user_id=o.user_id,
-                total_amount=o.total_amount,
-                status=o.status,
-                shipping_address=o.shipping_address,
-                payment_method=o.payment_method,
-                created_at=o.created_at,
-                updated_at=o.updated_at,
-                items=[
-                    OrderItem(
-                        id=i.id,
-                        product_id=i.product_id,
-                        quantity=i.quantity,
-                        price=i.price,
-                        product=Product(
-                            id=i.product.id,
-                            title=i.product.title,
-                            description=i.product.description,
-                            price=i.product.price,
-                            category=ProductCategory[i.product.category.name],
-                            gradient=i.product.gradient,
-                            size=i.product.size,
-                            stock=i.product.stock,
-                            image_url=i.product.image_url,
-                            is_active=bool(i.product.is_active),
-                            created_at=i.product.created_at
-                        ) if i.product else None
-                    )
-                    for i in o.items
-                ]
-            )
-            for o in orders
-        ]
+        orders = query.all()
+        return OrderDelta(
+            watermark=watermark.isoformat(),
+            orders=[_order_from_model(o) for o in orders if o.status != OrderStatusModel.CANCELLED],
+            cancelled_order_ids=[o.id for o in orders if o.status == OrderStatusModel.CANCELLED]
+        )
 
     @strawberry.field
-    def all_orders(self) -> List[Order]:
-        """Get all orders (Admin only)"""
+    def all_orders(self, since: Optional[datetime] = None, until: Optional[datetime] = None) -> List[Order]:
+        """Get all orders (Admin only), optionally limited to a created_at range"""
         db: Session = next(get_db())
-        orders = db.query(OrderModel).order_by(OrderModel.created_at.desc()).all()
+        query = db.query(OrderModel).options(selectinload(OrderModel.items))
         
-        from app.graphql.types import OrderItem, Product
+        # Date bounds let Postgres prune to the matching monthly partitions
+        if since:
+            query = query.filter(OrderModel.created_at >= since)
+        if until:
+            query = query.filter(OrderModel.created_at < until)
         
-        return [
-            Order(
-                id=o.id,
-                user_id=o.user_id,
-                total_amount=o.total_amount,
-                status=o.status,
-                shipping_address=o.shipping_address,
-                payment_method=o.payment_method,
-                created_at=o.created_at,
-                updated_at=o.updated_at,
-                items=[
-                    OrderItem(
-                        id=i.id,
-                        product_id=i.product_id,
-                        quantity=i.quantity,
-                        price=i.price,
-                        product=Product(
-                            id=i.product.id,
-                            title=i.product.title,
-                            description=i.product.description,
-                            price=i.product.price,
-                            category=ProductCategory[i.product.category.name],
-                            gradient=i.product.gradient,
-                            size=i.product.size,
-                            stock=i.product.stock,
-                            image_url=i.product.image_url,
-                            is_active=bool(i.product.is_active),
-                            created_at=i.product.created_at
-                        ) if i.product else None
-                    )
-                    for i in o.items
-                ]
-            )
-            for o in orders
-        ]
+        orders = query.order_by(OrderModel.created_at.desc()).all()
+        
+        return [_order_from_model(o) for o in orders]
 
     @strawberry.field
     def all_users(self) -> List[User]:
@@ -191,3 +395,79 @@ class Query:
             )
             for u in users
         ]
+
+    @strawberry.field
+    def customers(
+        self,
+        limit: int = 50,
+        offset: int = 0,
+        sort_by: CustomerSortField = CustomerSortField.LAST_ORDER_AT,
+        sort_direction: SortDirection = SortDirection.DESC
+    ) -> CustomerPage:
+        """Users with order count, lifetime spend and last order date (Admin only)"""
+        db: Session = next(get_db())
+        
+        # Aggregates come from the maintained user_order_stats table (one row per
+        # user), so sorting walks its indexes instead of grouping every order
+        if sort_by.value == "created_at":
+            query = (
+                db.query(UserModel, UserOrderStats)
+                .outerjoin(UserOrderStats, UserOrderStats.user_id == UserModel.id)
+            )
+            column, tie_break = UserModel.created_at, UserModel.id
+        else:
+            query = (
+                db.query(UserModel, UserOrderStats)
+                .select_from(UserOrderStats)
+                .join(UserModel, UserModel.id == UserOrderStats.user_id)
+            )
+            column = {
+                "order_count": UserOrderStats.order_count,
+                "total_spent": UserOrderStats.total_spent,
+                "last_order_at": UserOrderStats.last_order_at,
+            }[sort_by.value]
+            tie_break = UserOrderStats.user_id
+        
+        # Null placement only matters for last_order_at; it matches that column's index
+        if sort_direction == SortDirection.DESC:
+            order_by = [column.desc().nulls_last() if column is UserOrderStats.last_order_at else column.desc(), tie_break.desc()]
+        else:
+            order_by = [column.asc().nulls_first() if column is UserOrderStats.last_order_at else column.asc(), tie_break.asc()]
+        
+        rows = query.order_by(*order_by).offset(offset).limit(limit).all()
+        total = db.query(func.count(UserModel.id)).scalar()
+        
+        return CustomerPage(
+            total=total,
+            items=[
+                Customer(
+                    id=u.id,
+                    email=u.email,
+                    username=u.username,
+                    full_name=u.full_name,
+                    is_active=u.is_active,
+                    is_admin=u.is_admin,
+                    email_verified=u.email_verified,
+                    created_at=u.created_at,
+                    order_count=stats.order_count if stats else 0,
+                    total_spent=stats.total_spent if stats else 0.0,
+                    last_order_at=stats.last_order_at if stats else None
+                )
+                for u, stats in rows
+            ]
+        )
+
+    @strawberry.field
+    def slow_queries(self, limit: int = 50) -> List[SlowQuery]:
+        """Most recent statements over SLOW_QUERY_THRESHOLD_MS in this process (Admin only)"""
+        return [
+            SlowQuery(
+                recorded_at=datetime.fromisoformat(e["recorded_at"]),
+                duration_ms=e["duration_ms"],
+                statement=e["statement"],
+                operation=e["operation"],
+                resolver=e["resolver"],
+                explain=e["explain"]
+            )
+            for e in slow_query_log.recent(limit)
+        ]
@@ -1,5 +1,16 @@
 import strawberry
+from strawberry.schema.config import StrawberryConfig
+from app.config import settings
 from app.graphql.queries import Query
 from app.graphql.mutations import Mutation
+from app.graphql.subscriptions import Subscription
+from app.graphql.extensions import QueryContextExtension
 
-schema = strawberry.Schema(query=Query, mutation=Mutation)
+schema = strawberry.Schema(
+    query=Query,
+    mutation=Mutation,
+    subscription=Subscription,
+    extensions=[QueryContextExtension],
+    # JSON-array request bodies (see app/graphql/batch.py)
+    config=StrawberryConfig(batching_config={"max_operations": settings.GRAPHQL_BATCH_MAX_OPERATIONS})
+)
@@ -0,0 +1,35 @@
+import strawberry
+from datetime import datetime
+from typing import AsyncGenerator, Optional
+from app.graphql.types import OrderEvent, OrderStatus
+from app.utils.events import broker, ORDER_EVENTS
+
+
+def _order_event(payload: dict) -> OrderEvent:
+    return OrderEvent(
+        kind=payload["kind"],
+        order_id=payload["order_id"],
+        user_id=payload["user_id"],
+        status=OrderStatus(payload["status"]),
+        total_amount=payload["total_amount"],
+        item_count=payload.get("item_count"),
+        updated_at=datetime.fromisoformat(payload["updated_at"]) if payload.get("updated_at") else None
+    )
+
+
+@strawberry.type
+class Subscription:
+    @strawberry.subscription
+    async def order_updated(self, user_id: Optional[int] = None) -> AsyncGenerator[OrderEvent, None]:
+        """Order creations and status changes, for one user or (admin) everyone"""
+        async for payload in broker.subscribe(ORDER_EVENTS):
+            if user_id is not None and payload.get("user_id") != user_id:
+                continue
+            yield _order_event(payload)
+
+    @strawberry.subscription
+    async def order_created(self) -> AsyncGenerator[OrderEvent, None]:
+        """New orders as they are placed (admin dashboard)"""
+        async for payload in broker.subscribe(ORDER_EVENTS):
+            if payload.get("kind") == "created":
+                yield _order_event(payload)
@@ -19,6 +19,27 @@ class ProductSize(Enum):
     LARGE = "large"
 
 
+@strawberry.enum
+class ProductSortField(Enum):
+    PRICE = "price"
+    NEWEST = "newest"
+    STOCK = "stock"
+
+
+@strawberry.enum
+class SortDirection(Enum):
+    ASC = "asc"
+    DESC = "desc"
+
+
+@strawberry.enum
+class CustomerSortField(Enum):
+    ORDER_COUNT = "order_count"
+    TOTAL_SPENT = "total_spent"
+    LAST_ORDER_AT = "last_order_at"
+    CREATED_AT = "created_at"
+
+
 @strawberry.enum
 class OrderStatus(Enum):
     PENDING = "pending"
@@ -40,6 +61,63 @@ class User:
     created_at: datetime
 
 
+@strawberry.type
+class Customer:
+    """User with order aggregates (admin customer list)"""
+    id: int
+    email: str
+    username: str
+    full_name: Optional[str]
+    is_active: bool
+    is_admin: bool
+    email_verified: bool
+    created_at: datetime
+    order_count: int
+    total_spent: float
+    last_order_at: Optional[datetime]
+
+
+@strawberry.type
+class CustomerPage:
+    total: int
+    items: list[Customer]
+
+
+@strawberry.type
+class ImageVariant:
+    name: str  # thumb, card, detail
+    format: str  # webp, jpeg
+    width: int
+    height: int
+    url: str
+
+
+@strawberry.type
+class ProductImages:
+    variants: list[ImageVariant]
+
+    @strawberry.field
+    def srcset(self, format: str = "webp") -> str:
+        """`url 480w, ...` for <img srcset> / <source srcset>"""
+        return ", ".join(f"{v.url} {v.width}w" for v in self.variants if v.format == format)
+
+    @strawberry.field
+    def url(self, name: str = "card", format: str = "jpeg") -> Optional[str]:
+        """URL of one variant"""
+        return next((v.url for v in self.variants if v.name == name and v.format == format), None)
+
+
+@strawberry.type
+class StockForecast:
+    """Sales velocity and projected stockout, refreshed by a background job"""
+    velocity: float  # units/day: the higher of the window and recent moving averages
+    daily_average: float
+    recent_average: float
+    available_stock: int  # when computed
+    days_until_stockout: Optional[float]  # null when nothing sold in the window
+    computed_at: datetime
+
+
 @strawberry.type
 class Product:
     id: int
@@ -53,15 +131,63 @@ class Product:
     image_url: Optional[str]
     is_active: bool
     created_at: datetime
+    available_stock: Optional[int] = None  # stock minus active reservations
+    images: Optional[ProductImages] = None  # null until the variant job has run
+
+    @strawberry.field
+    async def stock_forecast(self, info: strawberry.Info) -> Optional[StockForecast]:
+        """Inventory forecast (admin); batched across the products of a request"""
+        from app.graphql.loaders import loaders_from
+        return await loaders_from(info).stock_forecast.load(self.id)
+
+
+@strawberry.type
+class CatalogChanges:
+    """Catalog delta since a client's version; pass `version` back as `since` next time"""
+    version: int
+    full_resync: bool  # `products` is the whole active catalog: replace the local copy
+    products: list[Product]  # changed (or all) active products
+    deleted_ids: list[int]  # deleted or deactivated since `since`
 
 
 @strawberry.type
 class OrderItem:
     id: int
-    product_id: int
+    product_id: Optional[int]
     quantity: int
     price: float
-    product: Optional[Product]
+    # Snapshot of the product at time of purchase
+    title: Optional[str] = None
+    category: Optional[ProductCategory] = None
+    size: Optional[ProductSize] = None
+    image_url: Optional[str] = None
+
+    @strawberry.field(deprecation_reason="Use the snapshot fields (title, category, size, imageUrl)")
+    def product(self) -> Optional[Product]:
+        """Live product row (extra query per item, only runs when requested)"""
+        if self.product_id is None:
+            return None
+
+        from app.database import get_db
+        from app.models import Product as ProductModel
+        db = next(get_db())
+        p = db.query(ProductModel).filter(ProductModel.id == self.product_id).first()
+        if not p:
+            return None
+
+        return Product(
+            id=p.id,
+            title=p.title,
+            description=p.description,
+            price=p.price,
+            category=ProductCategory[p.category.name],
+            gradient=p.gradient,
+            size=p.size,
+            stock=p.stock,
+            image_url=p.image_url,
+            is_active=bool(p.is_active),
+            created_at=p.created_at
+        )
 
 
 @strawberry.type
@@ -75,6 +201,79 @@ class Order:
     created_at: datetime
     updated_at: Optional[datetime]
     items: list[OrderItem]
+    item_count: Optional[int] = None
+
+
+@strawberry.type
+class OrderDelta:
+    """Order history changes since a watermark; pass `watermark` back as `updatedSince` next time"""
+    watermark: str
+    orders: list[Order]  # created or changed (full list when no watermark was given)
+    cancelled_order_ids: list[int]  # tombstones: drop these from the local copy
+
+
+@strawberry.type
+class OrderEvent:
+    """Delta pushed to subscribers when an order is created or changes"""
+    kind: str  # "created" | "updated"
+    order_id: int
+    user_id: int
+    status: OrderStatus
+    total_amount: float
+    item_count: Optional[int]
+    updated_at: Optional[datetime]
+
+
+@strawberry.type
+class ReservationItem:
+    product_id: int
+    quantity: int
+
+
+@strawberry.type
+class Reservation:
+    token: str
+    user_id: int
+    expires_at: datetime
+    items: list[ReservationItem]
+
+
+@strawberry.type
+class CategoryFacet:
+    category: ProductCategory
+    count: int
+
+
+@strawberry.type
+class SizeFacet:
+    size: ProductSize
+    count: int
+
+
+@strawberry.type
+class PriceBucket:
+    min_price: float
+    max_price: float
+    count: int
+
+
+@strawberry.type
+class ProductFacets:
+    total: int
+    in_stock: int
+    categories: list[CategoryFacet]
+    sizes: list[SizeFacet]
+    price_buckets: list[PriceBucket]
+
+
+@strawberry.type
+class SlowQuery:
+    recorded_at: datetime
+    duration_ms: float
+    statement: str  # normalized, literals and parameters redacted
+    operation: Optional[str] = None
+    resolver: Optional[str] = None
+    explain: Optional[str] = None  # EXPLAIN (ANALYZE, BUFFERS) output when sampled
 
 
 @strawberry.type
@@ -121,3 +320,12 @@ class OrderInput:
     items: list[OrderItemInput]
     shipping_address: Optional[str] = None
     payment_method: Optional[str] = "Cash"
+
+
+@strawberry.input
+class ProductFilter:
+    category: Optional[ProductCategory] = None
+    size: Optional[ProductSize] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    in_stock: Optional[bool] = None
@@ -1,11 +1,12 @@
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from strawberry.fastapi import GraphQLRouter
 from app.graphql.schema import schema
+from app.graphql.batch import BatchingGraphQLRouter
+from app.graphql.loaders import get_context
 from app.config import settings
 from app.database import engine, Base
-from app.models import User, Product, Order, OrderItem
+from app.models import User, Product, Order, OrderItem, Reservation, IdempotencyKey, RateLimitBucket, UserOrderStats, Job, ImageVariant, CacheVersion, EmailToken, CatalogChange, ProductPairCount, ProductPopularity, ProductRecommendation, TrendingScore, StockForecast
 
 # Create database tables
 # Create database tables (Safe mode for Vercel)
@@ -57,10 +58,32 @@ async def startup_db_check():
         except Exception as e:
             # Check for common errors that we can ignore (like if table doesn't exist yet)
             print(f"STARTUP UPDATE NOTE: {e}")
+
+        # Columns newer models select; must exist before the first query
+        from app.migrations import add_order_snapshot_columns, add_product_image_columns
+        logs = []
+        add_order_snapshot_columns(logs)
+        add_product_image_columns(logs)
+        for line in logs:
+            print(f"STARTUP: {line}")
             
     except Exception as e:
         print(f"STARTUP ERROR: {e}")
 
+@app.on_event("startup")
+async def start_job_worker():
+    # Serverless invocations don't live long enough for a worker; jobs are drained via /jobs/run there
+    if os.getenv("VERCEL") or not settings.JOBS_RUN_IN_PROCESS:
+        return
+    import asyncio
+    from app.utils.jobs import Worker
+    app.state.job_worker = asyncio.create_task(Worker().run())
+
+@app.on_event("startup")
+async def start_cache_invalidation():
+    from app.utils.invalidation import start_invalidation_listener
+    start_invalidation_listener(listen=not os.getenv("VERCEL"))
+
 @app.middleware("http")
 async def catch_exceptions_middleware(request: Request, call_next):
     try:
@@ -73,6 +96,30 @@ async def catch_exceptions_middleware(request: Request, call_next):
             content={"errors": [{"message": f"Internal Server Error: {str(e)}", "detail": traceback.format_exc()}]}
         )
 
+@app.middleware("http")
+async def rate_limit_middleware(request: Request, call_next):
+    if not settings.RATE_LIMIT_ENABLED or "graphql" not in request.url.path or request.method != "POST":
+        return await call_next(request)
+
+    import asyncio
+    from app.utils.rate_limit import rate_limiter, client_ip_from
+
+    body = await request.body()
+    client_ip = client_ip_from(request.headers, request.client.host if request.client else None)
+    check = rate_limiter.check
+    if settings.RATE_LIMIT_BACKEND == "database":
+        decision = await asyncio.to_thread(check, client_ip, request.headers.get("authorization"), body)
+    else:
+        decision = check(client_ip, request.headers.get("authorization"), body)
+
+    if not decision.allowed:
+        return JSONResponse(
+            status_code=decision.status_code,
+            headers={"Retry-After": str(decision.retry_after)},
+            content={"errors": [{"message": decision.message}]}
+        )
+    return await call_next(request)
+
 # CORS Configuration
 app.add_middleware(
     CORSMiddleware,
@@ -90,7 +137,8 @@ app.add_middleware(
 #     return {}
 
 # GraphQL Router
-graphql_app = GraphQLRouter(schema)
+# Accepts single operations or a JSON array of them; loaders are shared per request
+graphql_app = BatchingGraphQLRouter(schema, context_getter=get_context)
 app.include_router(graphql_app, prefix="/graphql")
 # Also mount at /api/graphql to catch unstripped requests
 app.include_router(graphql_app, prefix="/api/graphql")
@@ -111,16 +159,117 @@ async def health_check():
     return {"status": "healthy", "service": "modern-fashion-api"}
 
 
+@app.get("/metrics")
+async def metrics():
+    import asyncio
+    from app.utils.single_flight import single_flight
+    from app.utils.jobs import job_metrics, queue_depth
+    return {
+        "single_flight": single_flight.stats(),
+        "jobs": {"queue": await asyncio.to_thread(queue_depth), "handlers": job_metrics.stats()},
+    }
+
+
+@app.get("/images/{source_hash}/{filename}")
+async def image_variant(source_hash: str, filename: str, request: Request):
+    """Generated image variant; content never changes for a URL, so it is cached forever"""
+    import asyncio
+    from fastapi.responses import Response
+    from app.database import SessionLocal
+    from app.models import ImageVariant
+    from app.utils.images import FORMATS, IMMUTABLE_CACHE_CONTROL
+
+    name, _, fmt = filename.partition(".")
+    if fmt not in FORMATS:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "Unknown image format"})
+
+    etag = f'"{source_hash[:32]}-{name}-{fmt}"'
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL})
+
+    def load():
+        db = SessionLocal()
+        try:
+            return db.query(ImageVariant.content).filter(
+                ImageVariant.source_hash == source_hash, ImageVariant.name == name, ImageVariant.format == fmt
+            ).scalar()
+        finally:
+            db.close()
+
+    content = await asyncio.to_thread(load)
+    if content is None:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "Image variant not found"})
+    return Response(
+        content=content,
+        media_type=FORMATS[fmt],
+        headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": etag}
+    )
+
+
+@app.get("/catalog/{path:path}")
+async def catalog_snapshot(path: str, request: Request):
+    """Pre-rendered catalog page (see app/utils/snapshots.py); never touches the database"""
+    from fastapi.responses import FileResponse, Response
+    from app.utils.snapshots import snapshot_file, SNAPSHOT_CACHE_CONTROL
+
+    found = snapshot_file(path, request.headers.get("accept-encoding", ""))
+    if found is None:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "Snapshot not found"})
+    file_path, etag, encoding = found
+    headers = {"ETag": etag, "Cache-Control": SNAPSHOT_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return FileResponse(file_path, media_type="application/json", headers=headers)
+
+
+@app.get("/jobs/run")
+async def run_jobs(request: Request):
+    """
+    Drain due background jobs for a few seconds.
+    For deployments without a long-running worker (point Vercel Cron here).
+    """
+    if not settings.CRON_SECRET:
+        return JSONResponse(status_code=403, content={"status": "error", "message": "Set CRON_SECRET to enable /jobs/run"})
+    if request.headers.get("authorization") != f"Bearer {settings.CRON_SECRET}":
+        return JSONResponse(status_code=401, content={"status": "error", "message": "Unauthorized"})
+    from app.utils.jobs import run_pending_jobs
+    await run_pending_jobs(max_seconds=20)
+    return {"status": "success"}
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: int):
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        if not job:
+            return JSONResponse(status_code=404, content={"status": "error", "message": "Job not found"})
+        return {
+            "id": job.id,
+            "name": job.name,
+            "status": job.status.value,
+            "attempts": job.attempts,
+            "last_error": job.last_error,
+            "duration_ms": job.duration_ms,
+        }
+    finally:
+        db.close()
+
+
 @app.get("/seed")
 async def seed_database():
     """
     Endpoint to seed the database with initial data (Products + Admin).
     Use this once after deployment to populate the production database.
+    Seeding runs as a background job; poll /jobs/{job_id} for the result.
     """
     try:
-        from app.seed import seed_products
-        seed_products()
-        return {"status": "success", "message": "Database seeded successfully (Admin: admin@modern.com)"}
+        from app.utils.jobs import enqueue
+        job_id = enqueue("seed_database", max_attempts=1)
+        return {"status": "queued", "job_id": job_id, "message": "Seeding queued (Admin: admin@modern.com)"}
     except Exception as e:
         import traceback
         tb_str = traceback.format_exc()
@@ -159,18 +308,7 @@ async def migrate_database():
             else:
                 print(f"Error adding email_verified: {e}")
 
-        # 2. Add verification_token
-        try:
-            with engine.begin() as connection:
-                connection.execute(text("ALTER TABLE users ADD COLUMN verification_token VARCHAR(255)"))
-                print("Added verification_token")
-        except Exception as e:
-            if "already exists" in str(e).lower() or "duplicate column" in str(e).lower():
-                print("'verification_token' already exists")
-            else:
-                print(f"Error adding verification_token: {e}")
-
-        # 3. Update products.image_url to TEXT (Postgres only)
+        # 2. Update products.image_url to TEXT (Postgres only)
         try:
             with engine.begin() as connection:
                 connection.execute(text("ALTER TABLE products ALTER COLUMN image_url TYPE TEXT"))
@@ -178,7 +316,7 @@ async def migrate_database():
         except Exception as e:
             print(f"Skipping products.image_url update: {str(e)}")
 
-        # 4. Add payment_method to orders
+        # 3. Add payment_method to orders
         try:
             with engine.begin() as connection:
                 connection.execute(text("ALTER TABLE orders ADD COLUMN payment_method VARCHAR(50) DEFAULT 'Cash'"))
@@ -188,6 +326,97 @@ async def migrate_database():
                 print("'payment_method' already exists")
             else:
                 print(f"Error adding payment_method: {e}")
+
+        # 4. Product snapshots on order_items + orders.item_count (with backfill)
+        from app.migrations import migrate_order_snapshots
+        logs = []
+        migrate_order_snapshots(logs)
+        for line in logs:
+            print(line)
+
+        # 5. Monthly partitioning of orders/order_items (Postgres only)
+        from app.migrations import partition_order_tables
+        logs = []
+        partition_order_tables(logs)
+        for line in logs:
+            print(line)
+
+        # 6. Product listing indexes (filter/sort on the storefront)
+        from app.migrations import migrate_product_listing_indexes
+        logs = []
+        migrate_product_listing_indexes(logs)
+        for line in logs:
+            print(line)
+
+        # 7. Per-user order aggregates for the admin customer list
+        from app.migrations import migrate_user_order_stats
+        logs = []
+        migrate_user_order_stats(logs)
+        for line in logs:
+            print(line)
+
+        # 8. Responsive image variants for existing product images
+        from app.migrations import migrate_image_variants
+        logs = []
+        migrate_image_variants(logs)
+        for line in logs:
+            print(line)
+
+        # 9. Global cache versions for cross-worker invalidation
+        from app.migrations import migrate_cache_versions
+        logs = []
+        migrate_cache_versions(logs)
+        for line in logs:
+            print(line)
+
+        # 10. Hashed, expiring verification tokens
+        from app.migrations import migrate_email_tokens
+        logs = []
+        migrate_email_tokens(logs)
+        for line in logs:
+            print(line)
+
+        # 11. Order history delta sync
+        from app.migrations import migrate_order_sync
+        logs = []
+        migrate_order_sync(logs)
+        for line in logs:
+            print(line)
+
+        # 12. Catalog change log for incremental client sync
+        from app.migrations import migrate_catalog_changes
+        logs = []
+        migrate_catalog_changes(logs)
+        for line in logs:
+            print(line)
+
+        # 13. "Frequently bought together" recommendations
+        from app.migrations import migrate_recommendations
+        logs = []
+        migrate_recommendations(logs)
+        for line in logs:
+            print(line)
+
+        # 14. Trending & best-seller rankings
+        from app.migrations import migrate_trending
+        logs = []
+        migrate_trending(logs)
+        for line in logs:
+            print(line)
+
+        # 15. Inventory forecasts
+        from app.migrations import migrate_stock_forecasts
+        logs = []
+        migrate_stock_forecasts(logs)
+        for line in logs:
+            print(line)
+
+        # 16. Idempotency key leases
+        from app.migrations import add_idempotency_lease_column
+        logs = []
+        add_idempotency_lease_column(logs)
+        for line in logs:
+            print(line)
                     
         return {"status": "success", "message": "Database migration checks completed."}
     except Exception as e:
@@ -0,0 +1,366 @@
+"""
+Schema updates for existing databases.
+`Base.metadata.create_all` only creates missing tables, so new columns,
+indexes and backfills on existing tables are applied from here.
+"""
+import json
+from sqlalchemy import text
+from app.database import engine
+
+
+def add_column(table: str, column: str, ddl: str, logs: list):
+    """ALTER TABLE ... ADD COLUMN, ignoring columns that already exist"""
+    try:
+        with engine.begin() as connection:
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+        logs.append(f"Added {table}.{column}")
+    except Exception as e:
+        if "already exists" in str(e).lower() or "duplicate column" in str(e).lower():
+            logs.append(f"'{table}.{column}' already exists")
+        else:
+            logs.append(f"Error adding {table}.{column}: {e}")
+
+
+def create_indexes(table, logs: list):
+    """Create the model's indexes on an existing table (no-op when present)"""
+    for index in table.indexes:
+        try:
+            index.create(bind=engine, checkfirst=True)
+            logs.append(f"Ensured index {index.name}")
+        except Exception as e:
+            logs.append(f"Error creating index {index.name}: {e}")
+
+
+def add_order_snapshot_columns(logs: list):
+    """Columns for the product snapshot on order_items and orders.item_count"""
+    add_column("order_items", "product_title", "VARCHAR(255)", logs)
+    add_column("order_items", "product_category", "VARCHAR(50)", logs)
+    add_column("order_items", "product_size", "VARCHAR(20)", logs)
+    add_column("order_items", "product_image_url", "TEXT", logs)
+    # No default: NULL marks rows the backfill still has to count
+    add_column("orders", "item_count", "INTEGER", logs)
+
+
+def migrate_order_snapshots(logs: list, batch_size: int = 1000):
+    """
+    Add the order snapshot columns, let deleted products leave old order
+    lines intact, and backfill existing rows in batches.
+    """
+    from app.models import Order, OrderItem
+
+    add_order_snapshot_columns(logs)
+    create_indexes(Order.__table__, logs)
+    create_indexes(OrderItem.__table__, logs)
+
+    # Postgres only: deleting a product now nulls order_items.product_id
+    if engine.dialect.name == "postgresql":
+        try:
+            with engine.begin() as connection:
+                connection.execute(text("ALTER TABLE order_items ALTER COLUMN product_id DROP NOT NULL"))
+                connection.execute(text("ALTER TABLE order_items DROP CONSTRAINT IF EXISTS order_items_product_id_fkey"))
+                connection.execute(text(
+                    "ALTER TABLE order_items ADD CONSTRAINT order_items_product_id_fkey "
+                    "FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE SET NULL"
+                ))
+            logs.append("order_items.product_id now ON DELETE SET NULL")
+        except Exception as e:
+            logs.append(f"Error updating order_items.product_id foreign key: {e}")
+
+    # Backfill product snapshots from the live products rows
+    snapshot_total = 0
+    with engine.connect() as connection:
+        while True:
+            with connection.begin():
+                result = connection.execute(text("""
+                    UPDATE order_items SET
+                        product_title = (SELECT p.title FROM products p WHERE p.id = order_items.product_id),
+                        product_category = (SELECT CAST(p.category AS VARCHAR) FROM products p WHERE p.id = order_items.product_id),
+                        product_size = (SELECT CAST(p.size AS VARCHAR) FROM products p WHERE p.id = order_items.product_id),
+                        product_image_url = (SELECT p.image_url FROM products p WHERE p.id = order_items.product_id)
+                    WHERE id IN (
+                        SELECT oi.id FROM order_items oi
+                        WHERE oi.product_title IS NULL
+                          AND EXISTS (SELECT 1 FROM products p WHERE p.id = oi.product_id)
+                        LIMIT :batch_size
+                    )
+                """), {"batch_size": batch_size})
+            snapshot_total += result.rowcount
+            if result.rowcount < batch_size:
+                break
+
+        # Backfill item counts
+        count_total = 0
+        while True:
+            with connection.begin():
+                result = connection.execute(text("""
+                    UPDATE orders SET
+                        item_count = (SELECT COALESCE(SUM(oi.quantity), 0) FROM order_items oi WHERE oi.order_id = orders.id)
+                    WHERE id IN (SELECT o.id FROM orders o WHERE o.item_count IS NULL LIMIT :batch_size)
+                """), {"batch_size": batch_size})
+            count_total += result.rowcount
+            if result.rowcount < batch_size:
+                break
+
+    logs.append(f"Backfilled product snapshots on {snapshot_total} order items")
+    logs.append(f"Backfilled item_count on {count_total} orders")
+
+
+def _convert_to_partitioned(connection, table: str, foreign_keys: list, logs: list):
+    """Rebuild `table` as a monthly range-partitioned table on created_at, keeping its data and id sequence"""
+    from datetime import datetime, timezone
+    from app.utils.partitions import add_months, month_start, create_month_partition
+    from app.config import settings
+
+    staging = f"{table}_partitioned"
+    connection.execute(text(f"CREATE TABLE {staging} (LIKE {table} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"))
+    connection.execute(text(f"UPDATE {table} SET created_at = now() WHERE created_at IS NULL"))
+    # The partition key has to be part of the primary key
+    connection.execute(text(f"ALTER TABLE {staging} ADD PRIMARY KEY (id, created_at)"))
+
+    oldest = connection.execute(text(f"SELECT MIN(created_at) FROM {table}")).scalar()
+    now = datetime.now(timezone.utc)
+    month = month_start(oldest or now)
+    last = add_months(month_start(now), settings.ORDER_PARTITION_MONTHS_AHEAD)
+    while month <= last:
+        create_month_partition(connection, table, month, parent=staging)
+        month = add_months(month, 1)
+    connection.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {staging} DEFAULT"))
+
+    connection.execute(text(f"INSERT INTO {staging} SELECT * FROM {table}"))
+
+    # Keep the id sequence alive when the old table is dropped
+    sequence = connection.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table}).scalar()
+    if sequence:
+        connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {staging}.id"))
+
+    connection.execute(text(f"DROP TABLE {table}"))
+    connection.execute(text(f"ALTER TABLE {staging} RENAME TO {table}"))
+
+    for constraint in foreign_keys:
+        connection.execute(text(f"ALTER TABLE {table} ADD {constraint}"))
+    logs.append(f"Partitioned {table} by month")
+
+
+def partition_order_tables(logs: list):
+    """
+    Convert orders and order_items into monthly range-partitioned tables
+    (Postgres only, skipped when already partitioned).
+
+    Postgres can't point a foreign key at a partitioned table unless the
+    key includes the partition column, so order_items.order_id is no
+    longer enforced by the database; the ORM still maintains it.
+    """
+    from app.models import Order, OrderItem
+    from app.utils.partitions import is_partitioned
+
+    if engine.dialect.name != "postgresql":
+        logs.append("Skipping order partitioning (Postgres only)")
+        return
+
+    try:
+        with engine.begin() as connection:
+            if is_partitioned(connection, "orders") and is_partitioned(connection, "order_items"):
+                logs.append("orders/order_items already partitioned")
+                return
+
+            connection.execute(text("ALTER TABLE order_items DROP CONSTRAINT IF EXISTS order_items_order_id_fkey"))
+            if not is_partitioned(connection, "orders"):
+                _convert_to_partitioned(connection, "orders", [
+                    "CONSTRAINT orders_user_id_fkey FOREIGN KEY (user_id) REFERENCES users(id)",
+                ], logs)
+            if not is_partitioned(connection, "order_items"):
+                _convert_to_partitioned(connection, "order_items", [
+                    "CONSTRAINT order_items_product_id_fkey FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE SET NULL",
+                ], logs)
+    except Exception as e:
+        logs.append(f"Error partitioning order tables: {e}")
+        return
+
+    # Indexes are re-created on the partitioned parents (and cascade to partitions)
+    create_indexes(Order.__table__, logs)
+    create_indexes(OrderItem.__table__, logs)
+
+
+def migrate_product_listing_indexes(logs: list):
+    """Partial indexes backing filtered/sorted product listings"""
+    from app.models import Product
+    create_indexes(Product.__table__, logs)
+
+
+def migrate_user_order_stats(logs: list):
+    """Backfill user_order_stats from existing orders and bring its indexes up to date"""
+    from app.models import UserOrderStats
+    from app.utils.customer_stats import rebuild_user_order_stats
+    try:
+        logs.append(f"Rebuilt order stats for {rebuild_user_order_stats()} users")
+    except Exception as e:
+        logs.append(f"Error rebuilding user_order_stats: {e}")
+
+    if engine.dialect.name == "postgresql":
+        # Replaced by ix_user_order_stats_last_order (DESC NULLS LAST, matching the customers sort)
+        try:
+            with engine.begin() as connection:
+                connection.execute(text("DROP INDEX IF EXISTS ix_user_order_stats_last_order_at"))
+        except Exception as e:
+            logs.append(f"Error dropping ix_user_order_stats_last_order_at: {e}")
+    create_indexes(UserOrderStats.__table__, logs)
+
+
+def add_product_image_columns(logs: list):
+    """Columns pointing products at their generated image variants"""
+    add_column("products", "image_hash", "VARCHAR(64)", logs)
+    add_column("products", "image_variants", "TEXT", logs)
+
+
+def migrate_image_variants(logs: list):
+    """Add the variant columns and queue variant builds for existing product images"""
+    from app.models import Job, ImageVariant
+    from app.utils.images import enqueue_missing_image_variants
+
+    add_product_image_columns(logs)
+    try:
+        Job.__table__.create(bind=engine, checkfirst=True)
+        ImageVariant.__table__.create(bind=engine, checkfirst=True)
+        logs.append(f"Queued image variant builds for {enqueue_missing_image_variants()} products")
+    except Exception as e:
+        logs.append(f"Error queueing image variant builds: {e}")
+
+
+def migrate_cache_versions(logs: list):
+    """Table holding the global per-tag cache versions"""
+    from app.models import CacheVersion
+    try:
+        CacheVersion.__table__.create(bind=engine, checkfirst=True)
+        logs.append("Ensured table cache_versions")
+    except Exception as e:
+        logs.append(f"Error creating cache_versions: {e}")
+
+
+def migrate_email_tokens(logs: list):
+    """
+    Move pending users.verification_token values into email_tokens (hashed,
+    expiring EMAIL_TOKEN_TTL_HOURS from now), clear the old column and strip
+    raw tokens from queued verification email jobs.
+    """
+    from datetime import datetime, timedelta, timezone
+    from app.config import settings
+    from app.models import EmailToken
+    from app.utils.email_tokens import hash_token
+
+    try:
+        EmailToken.__table__.create(bind=engine, checkfirst=True)
+        logs.append("Ensured table email_tokens")
+    except Exception as e:
+        logs.append(f"Error creating email_tokens: {e}")
+        return
+
+    expires_at = datetime.now(timezone.utc) + timedelta(hours=settings.EMAIL_TOKEN_TTL_HOURS)
+    moved = 0
+    try:
+        with engine.begin() as connection:
+            rows = connection.execute(text(
+                "SELECT id, verification_token FROM users WHERE verification_token IS NOT NULL"
+            )).all()
+            if rows:
+                connection.execute(EmailToken.__table__.insert(), [
+                    {"user_id": user_id, "token_hash": hash_token(token), "expires_at": expires_at}
+                    for user_id, token in rows
+                ])
+                connection.execute(text("UPDATE users SET verification_token = NULL WHERE verification_token IS NOT NULL"))
+            moved = len(rows)
+        logs.append(f"Moved {moved} verification tokens to email_tokens")
+    except Exception as e:
+        if "verification_token" in str(e):
+            logs.append("No users.verification_token column to migrate")
+        else:
+            logs.append(f"Error moving verification tokens: {e}")
+
+    # Older releases queued the raw token in the job payload; keep only the user id
+    try:
+        with engine.begin() as connection:
+            rows = connection.execute(text(
+                "SELECT id, payload FROM jobs WHERE name = 'send_verification_email' AND payload LIKE '%\"token\"%'"
+            )).all()
+            for job_id, payload in rows:
+                user_id = connection.execute(
+                    text("SELECT id FROM users WHERE email = :email"), {"email": json.loads(payload).get("email")}
+                ).scalar()
+                connection.execute(
+                    text("UPDATE jobs SET payload = :payload WHERE id = :id"),
+                    {"payload": json.dumps({"user_id": user_id}), "id": job_id}
+                )
+        logs.append(f"Removed verification tokens from {len(rows)} job payloads")
+    except Exception as e:
+        logs.append(f"Error scrubbing verification job payloads: {e}")
+
+
+def migrate_order_sync(logs: list, batch_size: int = 1000):
+    """Index for order-history delta sync and an updated_at on every order"""
+    from app.models import Order
+
+    create_indexes(Order.__table__, logs)
+    if engine.dialect.name == "postgresql":
+        try:
+            with engine.begin() as connection:
+                connection.execute(text("ALTER TABLE orders ALTER COLUMN updated_at SET DEFAULT now()"))
+        except Exception as e:
+            logs.append(f"Error setting orders.updated_at default: {e}")
+
+    total = 0
+    with engine.connect() as connection:
+        while True:
+            with connection.begin():
+                result = connection.execute(text("""
+                    UPDATE orders SET updated_at = created_at
+                    WHERE id IN (SELECT o.id FROM orders o WHERE o.updated_at IS NULL LIMIT :batch_size)
+                """), {"batch_size": batch_size})
+            total += result.rowcount
+            if result.rowcount < batch_size:
+                break
+    logs.append(f"Backfilled updated_at on {total} orders")
+
+
+def migrate_catalog_changes(logs: list):
+    """Change log behind the catalogChanges feed"""
+    from app.models import CatalogChange
+    try:
+        CatalogChange.__table__.create(bind=engine, checkfirst=True)
+        logs.append("Ensured table catalog_changes")
+    except Exception as e:
+        logs.append(f"Error creating catalog_changes: {e}")
+
+
+def migrate_recommendations(logs: list):
+    """Tables behind recommendedProducts (filled by the refresh_recommendations job)"""
+    from app.models import ProductPairCount, ProductPopularity, ProductRecommendation
+    for model in (ProductPairCount, ProductPopularity, ProductRecommendation):
+        try:
+            model.__table__.create(bind=engine, checkfirst=True)
+            logs.append(f"Ensured table {model.__tablename__}")
+        except Exception as e:
+            logs.append(f"Error creating {model.__tablename__}: {e}")
+
+
+def migrate_trending(logs: list):
+    """Table behind trendingProducts / bestSellers (filled by the refresh_trending job)"""
+    from app.models import TrendingScore
+    try:
+        TrendingScore.__table__.create(bind=engine, checkfirst=True)
+        logs.append(f"Ensured table {TrendingScore.__tablename__}")
+    except Exception as e:
+        logs.append(f"Error creating {TrendingScore.__tablename__}: {e}")
+
+
+def migrate_stock_forecasts(logs: list):
+    """Table behind lowStockProducts / Product.stockForecast (filled by the refresh_stock_forecasts job)"""
+    from app.models import StockForecast
+    try:
+        StockForecast.__table__.create(bind=engine, checkfirst=True)
+        logs.append(f"Ensured table {StockForecast.__tablename__}")
+    except Exception as e:
+        logs.append(f"Error creating {StockForecast.__tablename__}: {e}")
+
+
+def add_idempotency_lease_column(logs: list):
+    """Lease on in-progress idempotency keys, so a crashed attempt doesn't block retries"""
+    add_column("idempotency_keys", "locked_until", "TIMESTAMP WITH TIME ZONE", logs)
@@ -1,5 +1,17 @@
 from .user import User
 from .product import Product
 from .order import Order, OrderItem
+from .reservation import Reservation
+from .idempotency import IdempotencyKey
+from .rate_limit import RateLimitBucket
+from .customer_stats import UserOrderStats
+from .job import Job
+from .image_variant import ImageVariant
+from .cache_version import CacheVersion
+from .email_token import EmailToken
+from .catalog_change import CatalogChange
+from .recommendation import ProductPairCount, ProductPopularity, ProductRecommendation
+from .trending import TrendingScore
+from .stock_forecast import StockForecast
 
-__all__ = ["User", "Product", "Order", "OrderItem"]
+__all__ = ["User", "Product", "Order", "OrderItem", "Reservation", "IdempotencyKey", "RateLimitBucket", "UserOrderStats", "Job", "ImageVariant", "CacheVersion", "EmailToken", "CatalogChange", "ProductPairCount", "ProductPopularity", "ProductRecommendation", "TrendingScore", "StockForecast"]
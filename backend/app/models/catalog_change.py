@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, BigInteger, DateTime, Index
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class CatalogChange(Base):
+    """
+    One row per product touched by a catalog mutation, stamped with the
+    catalog version that mutation committed. Backs the `catalogChanges` feed;
+    product_id has no foreign key so deletions stay in the log.
+    """
+    __tablename__ = "catalog_changes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    version = Column(BigInteger, nullable=False)
+    product_id = Column(Integer, nullable=False)
+    changed_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    __table_args__ = (
+        Index("ix_catalog_changes_version", "version", "product_id"),
+    )
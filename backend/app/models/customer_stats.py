@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, Index
+from app.database import Base
+
+
+class UserOrderStats(Base):
+    """
+    Per-user order aggregates, maintained by createOrder so the admin
+    customer list can sort on them through plain indexes.
+    Counts every order placed, including ones later cancelled.
+    """
+    __tablename__ = "user_order_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    total_spent = Column(Float, nullable=False, default=0.0)
+    last_order_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index("ix_user_order_stats_order_count", "order_count", "user_id"),
+        Index("ix_user_order_stats_total_spent", "total_spent", "user_id"),
+        # Same null placement as the customers sort (DESC NULLS LAST; scanned backward for ASC NULLS FIRST),
+        # so Postgres reads pages off the index instead of sorting every row
+        Index(
+            "ix_user_order_stats_last_order",
+            last_order_at.desc().nulls_last(), user_id.desc()
+        ).ddl_if(dialect="postgresql"),
+        # SQLite has no NULLS LAST in indexes; its NULLs already sort first ascending
+        Index("ix_user_order_stats_last_order_at", "last_order_at", "user_id").ddl_if(
+            callable_=lambda ddl, target, bind, **kw: bind.dialect.name != "postgresql"
+        ),
+    )
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Enum as SQLEnum
+from sqlalchemy.sql import func
+from app.database import Base
+import enum
+
+
+class IdempotencyStatus(str, enum.Enum):
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
+
+
+class IdempotencyKey(Base):
+    """Stored result of a mutation executed under a client-supplied Idempotency-Key"""
+    __tablename__ = "idempotency_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String(255), unique=True, index=True, nullable=False)
+    operation = Column(String(100), nullable=False)
+    request_hash = Column(String(64), nullable=False)
+    status = Column(SQLEnum(IdempotencyStatus), default=IdempotencyStatus.IN_PROGRESS, nullable=False)
+    response = Column(Text)  # JSON-encoded GraphQL result
+    locked_until = Column(DateTime(timezone=True))  # lease of an IN_PROGRESS attempt; a retry takes over after it
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
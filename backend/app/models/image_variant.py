@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, LargeBinary, DateTime, UniqueConstraint
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class ImageVariant(Base):
+    """Resized/re-encoded copy of a source image, keyed by the source's content hash"""
+    __tablename__ = "image_variants"
+
+    id = Column(Integer, primary_key=True, index=True)
+    source_hash = Column(String(64), nullable=False)  # sha256 of the original bytes
+    name = Column(String(20), nullable=False)  # thumb, card, detail
+    format = Column(String(10), nullable=False)  # webp, jpeg
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    content = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("source_hash", "name", "format", name="uq_image_variants_source_name_format"),
+    )
@@ -0,0 +1,40 @@
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime, Index, Enum as SQLEnum
+from sqlalchemy.sql import func
+from app.database import Base
+import enum
+
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class Job(Base):
+    """Deferred work picked up by the background worker (see app/utils/jobs.py)"""
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False)
+    payload = Column(Text)  # JSON arguments
+    status = Column(SQLEnum(JobStatus), default=JobStatus.QUEUED, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=5, nullable=False)
+    run_at = Column(DateTime(timezone=True), nullable=False)
+    dedupe_key = Column(String(255), unique=True)  # e.g. one row per schedule slot
+    locked_by = Column(String(100))
+    locked_at = Column(DateTime(timezone=True))
+    last_error = Column(Text)
+    duration_ms = Column(Float)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        # Claim query: due, queued jobs in run_at order
+        Index("ix_jobs_queued_run_at", "run_at",
+              postgresql_where=(status == JobStatus.QUEUED), sqlite_where=(status == JobStatus.QUEUED)),
+        # Reaper: running jobs whose worker died
+        Index("ix_jobs_running_locked_at", "locked_at",
+              postgresql_where=(status == JobStatus.RUNNING), sqlite_where=(status == JobStatus.RUNNING)),
+    )
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, ForeignKey, Index, Enum as SQLEnum, event
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, Session
 from app.database import Base
 import enum
 
@@ -22,24 +22,50 @@ class Order(Base):
     status = Column(SQLEnum(OrderStatus), default=OrderStatus.PENDING)
     shipping_address = Column(String(500))
     payment_method = Column(String(50), default="Cash")  # Cash, Card, Quantum Credit, etc.
+    item_count = Column(Integer, default=0)  # Total units, kept so order lists don't need the items
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Set on insert too: it is the delta-sync cursor for order history
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     # Relationships
     user = relationship("User", back_populates="orders")
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Order history per user, newest first
+        Index("ix_orders_user_created", "user_id", "created_at"),
+        # Delta sync: a user's orders changed since a watermark
+        Index("ix_orders_user_updated", "user_id", "updated_at"),
+    )
+
 
 class OrderItem(Base):
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
-    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="SET NULL"), nullable=True)
     quantity = Column(Integer, nullable=False)
     price = Column(Float, nullable=False)  # Price at time of purchase
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # Product snapshot at time of purchase (survives product edits/deletion)
+    product_title = Column(String(255))
+    product_category = Column(String(50))  # ProductCategory name
+    product_size = Column(String(20))  # ProductSize name
+    product_image_url = Column(Text)
+
     # Relationships
     order = relationship("Order", back_populates="items")
     product = relationship("Product", back_populates="order_items")
+
+
+@event.listens_for(Session, "before_flush")
+def _touch_orders_with_changed_items(session, flush_context, instances):
+    """Adding, changing or removing an order line bumps its order's updated_at"""
+    for item in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(item, OrderItem) or (item in session.dirty and not session.is_modified(item)):
+            continue
+        order = item.order
+        if order is not None and order not in session.new:
+            order.updated_at = func.now()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, Index, Enum as SQLEnum
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -30,9 +30,29 @@ class Product(Base):
     size = Column(SQLEnum(ProductSize), default=ProductSize.MEDIUM)
     stock = Column(Integer, default=0)
     image_url = Column(Text)
+    # Set by the image variant job (app/utils/images.py); JSON list of {name, format, width, height}
+    image_hash = Column(String(64))
+    image_variants = Column(Text)
     is_active = Column(Integer, default=1)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relationships
-    order_items = relationship("OrderItem", back_populates="product")
+    order_items = relationship("OrderItem", back_populates="product", passive_deletes=True)
+
+    # Storefront listing indexes: only active products are ever listed,
+    # id is the tie-breaker that keeps paging stable
+    __table_args__ = (
+        Index("ix_products_active_category_price", "category", "price", "id",
+              postgresql_where=(is_active == 1), sqlite_where=(is_active == 1)),
+        Index("ix_products_active_category_created", "category", "created_at", "id",
+              postgresql_where=(is_active == 1), sqlite_where=(is_active == 1)),
+        Index("ix_products_active_category_stock", "category", "stock", "id",
+              postgresql_where=(is_active == 1), sqlite_where=(is_active == 1)),
+        Index("ix_products_active_price", "price", "id",
+              postgresql_where=(is_active == 1), sqlite_where=(is_active == 1)),
+        Index("ix_products_active_created", "created_at", "id",
+              postgresql_where=(is_active == 1), sqlite_where=(is_active == 1)),
+        Index("ix_products_active_stock", "stock", "id",
+              postgresql_where=(is_active == 1), sqlite_where=(is_active == 1)),
+    )
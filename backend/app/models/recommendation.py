@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Integer, Float
+from app.database import Base
+
+
+class ProductPairCount(Base):
+    """
+    Sparse co-occurrence matrix: orders containing both products. Stored in
+    both directions so one product's row is a primary-key range scan.
+    """
+    __tablename__ = "product_pair_counts"
+
+    product_id = Column(Integer, primary_key=True)
+    other_id = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class ProductPopularity(Base):
+    """Orders containing the product; normalizes the co-occurrence counts"""
+    __tablename__ = "product_popularity"
+
+    product_id = Column(Integer, primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+
+
+class ProductRecommendation(Base):
+    """Top-K "frequently bought together" neighbours per product, best first"""
+    __tablename__ = "product_recommendations"
+
+    product_id = Column(Integer, primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    recommended_id = Column(Integer, nullable=False)
+    score = Column(Float, nullable=False)
@@ -0,0 +1,50 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, Enum as SQLEnum
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+from app.database import Base
+import enum
+
+
+class ReservationStatus(str, enum.Enum):
+    ACTIVE = "active"
+    CONVERTED = "converted"
+    RELEASED = "released"
+    EXPIRED = "expired"
+
+
+class Reservation(Base):
+    """A time-limited hold on stock for one product.
+
+    Holds placed together (one cart / checkout) share the same `token`.
+    """
+    __tablename__ = "reservations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    token = Column(String(64), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    status = Column(SQLEnum(ReservationStatus), default=ReservationStatus.ACTIVE, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relationships
+    product = relationship("Product")
+
+    __table_args__ = (
+        # Partial index backing the "active holds per product" aggregate
+        Index(
+            "ix_reservations_active_product",
+            "product_id", "expires_at",
+            postgresql_where=(status == ReservationStatus.ACTIVE),
+            postgresql_include=["quantity"],
+            sqlite_where=(status == ReservationStatus.ACTIVE),
+        ),
+        # Partial index for the expiry sweeper
+        Index(
+            "ix_reservations_active_expiry",
+            "expires_at",
+            postgresql_where=(status == ReservationStatus.ACTIVE),
+            sqlite_where=(status == ReservationStatus.ACTIVE),
+        ),
+    )
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, Float, DateTime, Index
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class StockForecast(Base):
+    """Sales velocity and projected stockout per active product, rewritten by the refresh_stock_forecasts job"""
+    __tablename__ = "stock_forecasts"
+
+    product_id = Column(Integer, primary_key=True)
+    velocity = Column(Float, nullable=False, default=0.0)  # units/day, the higher of the two moving averages
+    daily_average = Column(Float, nullable=False, default=0.0)  # over STOCK_FORECAST_WINDOW_DAYS
+    recent_average = Column(Float, nullable=False, default=0.0)  # over STOCK_FORECAST_RECENT_DAYS
+    available_stock = Column(Integer, nullable=False, default=0)  # stock minus held reservations at compute time
+    days_until_stockout = Column(Float, nullable=True)  # NULL when nothing sold in the window
+    computed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # lowStockProducts: soonest stockouts first
+        Index("ix_stock_forecasts_days", "days_until_stockout"),
+    )
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, Float, DateTime, Index
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class TrendingScore(Base):
+    """
+    Per-product sales ranking, maintained by the refresh_trending job.
+    `score` is forward-decayed: units weighted by exp((sold_at - landmark) / tau),
+    so adding a sale never rescales other rows and ordering by it equals
+    ordering by the decayed score at any moment (see app/utils/trending.py).
+    """
+    __tablename__ = "trending_scores"
+
+    product_id = Column(Integer, primary_key=True)
+    score = Column(Float, nullable=False, default=0.0)
+    units_sold = Column(Integer, nullable=False, default=0)  # all-time best-seller ranking
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_trending_scores_score", "score", "product_id"),
+        Index("ix_trending_scores_units_sold", "units_sold", "product_id"),
+    )
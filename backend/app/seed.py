@@ -85,6 +85,7 @@ def seed_products():
     # Check if admin user exists
     from app.models import User
     from app.utils.auth import get_password_hash
+    from app.utils.customer_stats import ensure_stats_row
     
     admin_email = "admin@modern.com"
     existing_admin = db.query(User).filter(User.email == admin_email).first()
@@ -99,6 +100,8 @@ def seed_products():
             full_name="System Administrator"
         )
         db.add(admin_user)
+        db.flush()
+        ensure_stats_row(db, admin_user.id)
         db.commit()
         print("✅ Admin user created successfully!")
     else:
@@ -0,0 +1,134 @@
+"""
+Background job handlers. Imported by the worker so the decorators register them;
+request handlers only ever call `enqueue(...)` with one of these names.
+"""
+from typing import Optional
+from app.config import settings
+from app.utils.jobs import job, periodic, purge_finished_jobs
+
+
+@job("send_verification_email")
+def send_verification_email(user_id: Optional[int] = None, email: Optional[str] = None, **_):
+    """Issue a fresh token and email the link (`email` only for jobs queued by older releases)"""
+    from app.database import SessionLocal
+    from app.models import User
+    from app.utils.email import send_verification_email as send
+    from app.utils.email_tokens import issue_verification_token
+
+    db = SessionLocal()
+    try:
+        user = db.get(User, user_id) if user_id is not None else db.query(User).filter(User.email == email).first()
+        if user is None or user.email_verified:
+            return
+        token = issue_verification_token(db, user.id)
+        db.commit()
+        address, username = user.email, user.username
+    finally:
+        db.close()
+    send(address, token, username, raise_errors=True)
+
+
+@job("send_welcome_email")
+def send_welcome_email(email: str, username: str):
+    from app.utils.email import send_welcome_email as send
+    send(email, username)
+
+
+@job("seed_database", max_attempts=1, timeout_seconds=600)
+def seed_database():
+    from app.seed import seed_products
+    from app.utils.images import enqueue_missing_image_variants
+    from app.utils.snapshots import build_catalog_snapshots as build_snapshots
+    seed_products()
+    enqueue_missing_image_variants()
+    build_snapshots()
+
+
+@job("build_image_variants", max_attempts=3, timeout_seconds=300)
+def build_image_variants(product_id: int):
+    from app.utils.images import build_product_image_variants
+    build_product_image_variants(product_id)
+
+
+@job("build_catalog_snapshots", max_attempts=3, timeout_seconds=300)
+def build_catalog_snapshots():
+    from app.utils.snapshots import build_catalog_snapshots as build
+    build()
+
+
+@periodic("refresh_catalog_snapshots", every_seconds=settings.CATALOG_SNAPSHOT_REFRESH_SECONDS, timeout_seconds=300)
+def refresh_catalog_snapshots():
+    from app.utils.snapshots import build_catalog_snapshots as build
+    build(force=True)
+
+
+@periodic("refresh_recommendations", every_seconds=settings.RECOMMENDATION_REFRESH_SECONDS, timeout_seconds=1800)
+def refresh_recommendations():
+    from app.utils.recommendations import refresh_recommendations as refresh
+    refresh()
+
+
+@periodic("rebuild_recommendations", every_seconds=24 * 3600, timeout_seconds=3600)
+def rebuild_recommendations():
+    from app.utils.recommendations import refresh_recommendations as refresh
+    print(f"RECOMMENDATIONS: Rebuilt lists for {refresh(full=True)} products")
+
+
+@periodic("refresh_trending", every_seconds=settings.TRENDING_REFRESH_SECONDS, timeout_seconds=900)
+def refresh_trending():
+    from app.utils.trending import refresh_trending as refresh
+    refresh()
+
+
+@periodic("refresh_stock_forecasts", every_seconds=settings.STOCK_FORECAST_REFRESH_SECONDS, timeout_seconds=900)
+def refresh_stock_forecasts():
+    from app.utils.stock_forecast import refresh_stock_forecasts as refresh
+    refresh()
+
+
+@periodic("expire_reservations", every_seconds=settings.RESERVATION_SWEEP_INTERVAL_SECONDS)
+def expire_reservations():
+    # Availability already ignores expired holds; this is housekeeping only
+    from app.utils.reservations import expire_stale_reservations
+    expired = expire_stale_reservations()
+    if expired:
+        print(f"RESERVATIONS: Expired {expired} stale holds")
+
+
+@periodic("purge_idempotency_keys", every_seconds=settings.IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS)
+def purge_idempotency_keys():
+    from app.utils.idempotency import purge_expired_idempotency_keys
+    purged = purge_expired_idempotency_keys()
+    if purged:
+        print(f"IDEMPOTENCY: Purged {purged} expired keys")
+
+
+@periodic("purge_email_tokens", every_seconds=settings.EMAIL_TOKEN_PURGE_INTERVAL_SECONDS, timeout_seconds=600)
+def purge_email_tokens():
+    from app.utils.email_tokens import purge_expired_email_tokens, purge_unverified_users
+    tokens = purge_expired_email_tokens()
+    users = purge_unverified_users()
+    if tokens or users:
+        print(f"EMAIL TOKENS: Purged {tokens} expired tokens and {users} unverified accounts")
+
+
+@periodic("purge_catalog_changes", every_seconds=24 * 3600, timeout_seconds=600)
+def purge_catalog_changes():
+    from app.utils.catalog_changes import purge_catalog_changes as purge
+    purged = purge()
+    if purged:
+        print(f"CATALOG: Purged {purged} catalog change log rows")
+
+
+@periodic("partition_maintenance", every_seconds=24 * 3600, timeout_seconds=3600)
+def partition_maintenance():
+    from app.utils.partitions import ensure_future_partitions, archive_cold_partitions
+    ensure_future_partitions()
+    archive_cold_partitions()
+
+
+@periodic("purge_finished_jobs", every_seconds=3600)
+def purge_jobs():
+    purged = purge_finished_jobs()
+    if purged:
+        print(f"JOBS: Purged {purged} finished jobs")
@@ -0,0 +1,100 @@
+"""
+Small in-process TTL caches for read-mostly GraphQL results.
+
+Caches are registered under a tag (e.g. "catalog") so mutations can drop
+everything derived from the data they changed. Each tag also has a version
+(kept in sync across workers by app/utils/invalidation.py); an entry filled
+under an older version is treated as a miss.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+_registry: Dict[str, List["TTLCache"]] = {}
+_registry_lock = threading.Lock()
+_tag_versions: Dict[str, int] = {}
+# Called before every read; lets the invalidation bus catch up on versions it missed
+_freshness_check: Optional[Callable[[], None]] = None
+
+
+def tag_version(tag: str) -> int:
+    return _tag_versions.get(tag, 0)
+
+
+def set_tag_version(tag: str, version: int) -> bool:
+    """Record a newer version for `tag` and drop its entries; False if `version` isn't newer"""
+    with _registry_lock:
+        if version <= _tag_versions.get(tag, 0):
+            return False
+        _tag_versions[tag] = version
+    invalidate_tag(tag)
+    return True
+
+
+def set_freshness_check(check: Optional[Callable[[], None]]):
+    global _freshness_check
+    _freshness_check = check
+
+
+class TTLCache:
+    def __init__(self, name: str, ttl_seconds: float, max_entries: int = 1024, tags: Tuple[str, ...] = ()):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.tags = tags
+        self._entries: "OrderedDict[Hashable, Tuple[float, Tuple[int, ...], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        with _registry_lock:
+            for tag in tags:
+                _registry.setdefault(tag, []).append(self)
+
+    def snapshot(self) -> Tuple[int, ...]:
+        """Versions of this cache's tags; take before computing a value, pass to set()"""
+        return tuple(tag_version(tag) for tag in self.tags)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Returns (hit, value)"""
+        if _freshness_check is not None:
+            _freshness_check()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires, versions, value = entry
+            if expires < time.monotonic() or versions != self.snapshot():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key: Hashable, value: Any, snapshot: Optional[Tuple[int, ...]] = None):
+        """Store `value`; skipped if the tags were invalidated since `snapshot` was taken"""
+        current = self.snapshot()
+        if snapshot is not None and snapshot != current:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, current, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def invalidate_tag(tag: str, keys: Optional[List[Hashable]] = None):
+    """Clear every cache registered under `tag` (only `keys`, when given)"""
+    with _registry_lock:
+        caches = list(_registry.get(tag, ()))
+    for cache in caches:
+        if keys is None:
+            cache.clear()
+        else:
+            for key in keys:
+                cache.delete(key)
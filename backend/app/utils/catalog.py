@@ -0,0 +1,143 @@
+"""
+Catalog read helpers shared by the product queries: filter clauses and
+faceted counts.
+"""
+import json
+from typing import Dict
+from sqlalchemy import select, func, case, cast, literal, tuple_, union_all, Integer, String
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import engine
+from app.models import Product as ProductModel
+from app.models.product import ProductCategory as ProductCategoryModel, ProductSize as ProductSizeModel
+from app.utils.cache import TTLCache
+
+facet_cache = TTLCache("product_facets", settings.FACET_CACHE_TTL_SECONDS, tags=("catalog",))
+
+
+def product_filter_clauses(filters) -> list:
+    """WHERE clauses for the active catalog narrowed by a ProductFilter (or None)"""
+    clauses = [ProductModel.is_active == 1]
+    if filters is None:
+        return clauses
+
+    if filters.category:
+        clauses.append(ProductModel.category == ProductCategoryModel[filters.category.name])
+    if filters.size:
+        clauses.append(ProductModel.size == ProductSizeModel[filters.size.name])
+    if filters.min_price is not None:
+        clauses.append(ProductModel.price >= filters.min_price)
+    if filters.max_price is not None:
+        clauses.append(ProductModel.price <= filters.max_price)
+    if filters.in_stock is True:
+        clauses.append(ProductModel.stock > 0)
+    elif filters.in_stock is False:
+        clauses.append(ProductModel.stock <= 0)
+    return clauses
+
+
+# Natural direction when the client doesn't pass one
+DEFAULT_SORT_DIRECTIONS = {"price": "asc", "newest": "desc", "stock": "desc"}
+
+
+def product_order_by(sort_by=None, direction=None) -> list:
+    """ORDER BY for product listings; always ends with id so paging is deterministic"""
+    if sort_by is None:
+        return [ProductModel.id.asc()]
+
+    column = {
+        "price": ProductModel.price,
+        "newest": ProductModel.created_at,
+        "stock": ProductModel.stock,
+    }[sort_by.value]
+    descending = (direction.value if direction else DEFAULT_SORT_DIRECTIONS[sort_by.value]) == "desc"
+    if descending:
+        return [column.desc(), ProductModel.id.desc()]
+    return [column.asc(), ProductModel.id.asc()]
+
+
+def filter_cache_key(filters) -> str:
+    """Normalized key for a filter combination"""
+    if filters is None:
+        return "{}"
+    values = {
+        "category": filters.category.name if filters.category else None,
+        "size": filters.size.name if filters.size else None,
+        "min_price": filters.min_price,
+        "max_price": filters.max_price,
+        "in_stock": filters.in_stock,
+    }
+    return json.dumps({k: v for k, v in values.items() if v is not None}, sort_keys=True)
+
+
+def compute_product_facets(db: Session, filters) -> Dict:
+    """
+    Counts per category, per size, per price bucket, plus total and
+    in-stock counts, in one statement. Postgres uses GROUPING SETS;
+    other databases get an equivalent UNION ALL over one filtered CTE.
+
+    Returns plain dicts keyed by enum name / bucket index.
+    """
+    width = settings.FACET_PRICE_BUCKET_WIDTH
+    is_postgres = engine.dialect.name == "postgresql"
+    # Postgres rounds on CAST, SQLite truncates (prices are never negative)
+    bucket = func.floor(ProductModel.price / width) if is_postgres else ProductModel.price / width
+    filtered = (
+        select(
+            ProductModel.category.label("category"),
+            ProductModel.size.label("size"),
+            cast(bucket, Integer).label("bucket"),
+            case((ProductModel.stock > 0, 1), else_=0).label("in_stock"),
+        )
+        .where(*product_filter_clauses(filters))
+        .cte("filtered")
+    )
+    count = func.count().label("count")
+    in_stock = func.coalesce(func.sum(filtered.c.in_stock), 0).label("in_stock")
+
+    if is_postgres:
+        statement = select(
+            func.grouping(filtered.c.category).label("g_category"),
+            func.grouping(filtered.c.size).label("g_size"),
+            func.grouping(filtered.c.bucket).label("g_bucket"),
+            cast(filtered.c.category, String).label("category"),
+            cast(filtered.c.size, String).label("size"),
+            filtered.c.bucket,
+            count,
+            in_stock,
+        ).group_by(func.grouping_sets(
+            filtered.c.category, filtered.c.size, filtered.c.bucket, tuple_()
+        ))
+        rows = [
+            (
+                "category" if r.g_category == 0 else "size" if r.g_size == 0 else "bucket" if r.g_bucket == 0 else "total",
+                r.category if r.g_category == 0 else r.size if r.g_size == 0 else r.bucket,
+                r.count,
+                r.in_stock,
+            )
+            for r in db.execute(statement)
+        ]
+    else:
+        def grouped(facet: str, column):
+            return select(literal(facet).label("facet"), cast(column, String).label("value"), count, in_stock).group_by(column)
+
+        statement = union_all(
+            grouped("category", filtered.c.category),
+            grouped("size", filtered.c.size),
+            grouped("bucket", filtered.c.bucket),
+            select(literal("total").label("facet"), literal(None, String).label("value"), count, in_stock),
+        )
+        rows = [(r.facet, r.value, r.count, r.in_stock) for r in db.execute(statement)]
+
+    result = {"total": 0, "in_stock": 0, "categories": {}, "sizes": {}, "buckets": {}}
+    for facet, value, row_count, row_in_stock in rows:
+        if facet == "total":
+            result["total"] = int(row_count)
+            result["in_stock"] = int(row_in_stock or 0)
+        elif facet == "category" and value is not None:
+            result["categories"][value] = int(row_count)
+        elif facet == "size" and value is not None:
+            result["sizes"][value] = int(row_count)
+        elif facet == "bucket" and value is not None:
+            result["buckets"][int(value)] = int(row_count)
+    return result
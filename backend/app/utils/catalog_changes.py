@@ -0,0 +1,95 @@
+"""
+Incremental catalog sync.
+
+Every product mutation bumps the global catalog version (app/utils/invalidation.py)
+inside its own transaction and logs the touched product ids under that version.
+The version row stays locked until commit, so versions become visible in order
+and a client holding version N can ask for exactly the products logged after it.
+Old log rows are pruned; clients older than the pruned range get a full resync.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import select, delete, func
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models import CacheVersion, CatalogChange
+from app.utils.invalidation import CATALOG, bump_version_in
+from app.utils.snapshots import enqueue_catalog_snapshots
+
+# cache_versions row holding the newest version whose log rows were pruned
+PRUNED = "catalog_changes_pruned"
+
+
+def record_catalog_changes(db: Session, product_ids: Iterable[int]) -> int:
+    """
+    Log `product_ids` as changed under a new catalog version, in the caller's
+    transaction (call it right before commit: it holds the version row lock).
+    Returns the version to pass to invalidate_catalog() after commit.
+    """
+    # Product rows first, then the version row: every writer takes locks in the same order
+    db.flush()
+    version = bump_version_in(db, CATALOG)
+    rows = [{"version": version, "product_id": product_id} for product_id in set(product_ids)]
+    if rows:
+        db.execute(CatalogChange.__table__.insert(), rows)
+    enqueue_catalog_snapshots(version, db=db)
+    return version
+
+
+def _versions(db: Session) -> Tuple[int, int]:
+    rows = dict(db.execute(
+        select(CacheVersion.name, CacheVersion.version).where(CacheVersion.name.in_([CATALOG, PRUNED]))
+    ).all())
+    return rows.get(CATALOG, 0), rows.get(PRUNED, 0)
+
+
+def catalog_changes_since(db: Session, since: Optional[int]) -> Tuple[int, Optional[List[int]]]:
+    """
+    (current version, ids of products changed after `since`). The ids are None
+    when the client must resync fully: no version yet, one from before the
+    pruned range, or one this database never issued.
+    """
+    current, pruned = _versions(db)
+    if since is None or since < pruned or since > current:
+        return current, None
+    if since == current:
+        return current, []
+    ids = db.execute(
+        select(CatalogChange.product_id)
+        .where(CatalogChange.version > since, CatalogChange.version <= current)
+        .distinct()
+    ).scalars().all()
+    return current, list(ids)
+
+
+def purge_catalog_changes(batch_size: int = 1000) -> int:
+    """Delete log rows older than CATALOG_CHANGE_RETENTION_DAYS, remembering the newest pruned version"""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.CATALOG_CHANGE_RETENTION_DAYS)
+    total = 0
+    db = SessionLocal()
+    try:
+        while True:
+            newest = db.execute(
+                select(func.max(CatalogChange.version)).where(
+                    CatalogChange.id.in_(
+                        select(CatalogChange.id).where(CatalogChange.changed_at < cutoff).limit(batch_size)
+                    )
+                )
+            ).scalar()
+            if newest is None:
+                break
+            # Raise the resync floor before the rows it covers disappear
+            db.merge(CacheVersion(name=PRUNED, version=max(newest, _versions(db)[1])))
+            result = db.execute(
+                delete(CatalogChange).where(CatalogChange.version <= newest),
+                execution_options={"synchronize_session": False}
+            )
+            db.commit()
+            total += result.rowcount
+            if result.rowcount < batch_size:
+                break
+    finally:
+        db.close()
+
+    return total
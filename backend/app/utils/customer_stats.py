@@ -0,0 +1,58 @@
+from datetime import datetime, timezone
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.database import engine
+from app.models.customer_stats import UserOrderStats
+
+
+def _upsert():
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def record_order(db: Session, user_id: int, amount: float, placed_at: datetime = None):
+    """Add one order to the user's stats inside the caller's transaction"""
+    placed_at = placed_at or datetime.now(timezone.utc)
+    insert = _upsert()
+    statement = insert(UserOrderStats).values(
+        user_id=user_id,
+        order_count=1,
+        total_spent=amount,
+        last_order_at=placed_at
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[UserOrderStats.user_id],
+        set_={
+            "order_count": UserOrderStats.order_count + 1,
+            "total_spent": UserOrderStats.total_spent + statement.excluded.total_spent,
+            "last_order_at": statement.excluded.last_order_at,
+        }
+    )
+    db.execute(statement)
+
+
+def ensure_stats_row(db: Session, user_id: int):
+    """Zero stats for a new user so every user sorts through the stats indexes"""
+    insert = _upsert()
+    db.execute(
+        insert(UserOrderStats)
+        .values(user_id=user_id, order_count=0, total_spent=0.0)
+        .on_conflict_do_nothing(index_elements=[UserOrderStats.user_id])
+    )
+
+
+def rebuild_user_order_stats() -> int:
+    """Recompute every user's stats with one grouped LEFT JOIN (backfill / repair)"""
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM user_order_stats"))
+        result = connection.execute(text("""
+            INSERT INTO user_order_stats (user_id, order_count, total_spent, last_order_at)
+            SELECT u.id, COUNT(o.id), COALESCE(SUM(o.total_amount), 0), MAX(o.created_at)
+            FROM users u
+            LEFT JOIN orders o ON o.user_id = u.id
+            GROUP BY u.id
+        """))
+    return result.rowcount
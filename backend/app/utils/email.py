@@ -6,11 +6,12 @@ def generate_verification_token() -> str:
     """Generate a secure random verification token"""
     return secrets.token_urlsafe(32)
 
-def send_verification_email(email: str, token: str, username: str) -> bool:
+def send_verification_email(email: str, token: str, username: str, raise_errors: bool = False) -> bool:
     """
     Send verification email to user.
     In development, just logs to console.
     In production, would use SendGrid, AWS SES, or similar service.
+    With raise_errors, SMTP failures propagate (so the job runner can retry).
     """
     verification_url = f"{os.getenv('FRONTEND_URL', 'http://localhost:3000')}/verify-email?token={token}"
     
@@ -63,6 +64,8 @@ def send_verification_email(email: str, token: str, username: str) -> bool:
             return True
         except Exception as e:
             print(f"❌ Failed to send email: {e}")
+            if raise_errors:
+                raise
             # Don't crash, just return True so user can at least see the console log if in dev
             return True
             
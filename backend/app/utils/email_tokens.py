@@ -0,0 +1,116 @@
+"""
+Email verification tokens.
+
+Tokens live in `email_tokens`, keyed by the sha256 of the token (unique
+index), so verifying is an index lookup rather than a scan of `users`, and a
+database leak doesn't hand out working links. Tokens expire after
+EMAIL_TOKEN_TTL_HOURS; a periodic job deletes expired tokens and accounts
+that were never verified within UNVERIFIED_ACCOUNT_RETENTION_DAYS.
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import select, delete, exists
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models import User, Order, Reservation, UserOrderStats, EmailToken
+from app.utils.email import generate_verification_token
+
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_verification_token(db: Session, user_id: int) -> str:
+    """Store a new token for the user in the caller's transaction; returns the raw token to email"""
+    token = generate_verification_token()
+    db.add(EmailToken(
+        token_hash=hash_token(token),
+        user_id=user_id,
+        expires_at=datetime.now(timezone.utc) + timedelta(hours=settings.EMAIL_TOKEN_TTL_HOURS)
+    ))
+    return token
+
+
+def consume_verification_token(db: Session, token: str) -> Optional[User]:
+    """
+    User for a valid, unexpired token, or None. The user's tokens are deleted
+    in the caller's transaction, so a link works once.
+    """
+    user = db.execute(
+        select(User)
+        .join(EmailToken, EmailToken.user_id == User.id)
+        .where(
+            EmailToken.token_hash == hash_token(token),
+            EmailToken.expires_at > datetime.now(timezone.utc)
+        )
+    ).scalar()
+    if user is not None:
+        db.execute(
+            delete(EmailToken).where(EmailToken.user_id == user.id),
+            execution_options={"synchronize_session": False}
+        )
+    return user
+
+
+def _delete_in_batches(db: Session, ids_query, delete_batch, batch_size: int) -> int:
+    total = 0
+    while True:
+        ids = db.execute(ids_query.limit(batch_size)).scalars().all()
+        if ids:
+            delete_batch(ids)
+        db.commit()
+        total += len(ids)
+        if len(ids) < batch_size:
+            return total
+
+
+def purge_expired_email_tokens(batch_size: Optional[int] = None) -> int:
+    """Delete expired tokens in batches"""
+    batch_size = batch_size or settings.EMAIL_TOKEN_PURGE_BATCH_SIZE
+    db = SessionLocal()
+    try:
+        return _delete_in_batches(
+            db,
+            select(EmailToken.id).where(EmailToken.expires_at <= datetime.now(timezone.utc)),
+            lambda ids: db.execute(
+                delete(EmailToken).where(EmailToken.id.in_(ids)),
+                execution_options={"synchronize_session": False}
+            ),
+            batch_size
+        )
+    finally:
+        db.close()
+
+
+def purge_unverified_users(batch_size: Optional[int] = None) -> int:
+    """
+    Delete accounts never verified within UNVERIFIED_ACCOUNT_RETENTION_DAYS,
+    in batches. Admins and users with orders or reservations are kept.
+    """
+    if settings.UNVERIFIED_ACCOUNT_RETENTION_DAYS <= 0:
+        return 0
+    batch_size = batch_size or settings.EMAIL_TOKEN_PURGE_BATCH_SIZE
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.UNVERIFIED_ACCOUNT_RETENTION_DAYS)
+
+    def delete_users(ids):
+        for model, column in ((EmailToken, EmailToken.user_id), (UserOrderStats, UserOrderStats.user_id), (User, User.id)):
+            db.execute(delete(model).where(column.in_(ids)), execution_options={"synchronize_session": False})
+
+    db = SessionLocal()
+    try:
+        return _delete_in_batches(
+            db,
+            select(User.id).where(
+                User.email_verified.is_not(True),
+                User.is_admin.is_not(True),
+                User.created_at < cutoff,
+                ~exists().where(Order.user_id == User.id),
+                ~exists().where(Reservation.user_id == User.id)
+            ),
+            delete_users,
+            batch_size
+        )
+    finally:
+        db.close()
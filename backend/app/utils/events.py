@@ -0,0 +1,190 @@
+"""
+Publish/subscribe for server events (order changes, cache invalidation, ...).
+
+On Postgres, events go through `NOTIFY` so every worker sees them; each
+worker runs one listener thread that fans notifications out locally.
+On SQLite (and in tests) the in-memory broker only reaches the current process.
+"""
+import asyncio
+import json
+import select
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set
+from sqlalchemy import text
+from app.config import settings
+from app.database import engine
+
+ORDER_EVENTS = "order_events"
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_NOTIFY_PAYLOAD = 7900
+
+
+class InMemoryBroker:
+    """Fans events out to subscribers in this process"""
+
+    def __init__(self):
+        self._queues: Dict[str, Set[tuple]] = {}
+        self._callbacks: Dict[str, List[Callable[[dict], Any]]] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel: str, payload: dict):
+        self.publish_many(channel, [payload])
+
+    def publish_many(self, channel: str, payloads: List[dict]):
+        """Publish several events at once (one round trip on brokers that need one)"""
+        for payload in payloads:
+            self.dispatch(channel, payload)
+
+    def dispatch(self, channel: str, payload: dict):
+        """Deliver to local subscribers; safe to call from any thread"""
+        with self._lock:
+            queues = list(self._queues.get(channel, ()))
+            callbacks = list(self._callbacks.get(channel, ()))
+
+        for loop, queue in queues:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(queue.put_nowait, payload)
+        for callback in callbacks:
+            try:
+                callback(payload)
+            except Exception as e:
+                print(f"EVENTS: Listener on {channel} failed: {e}")
+
+    def add_listener(self, channel: str, callback: Callable[[dict], Any]):
+        """Run `callback(payload)` synchronously for every event on `channel`"""
+        with self._lock:
+            self._callbacks.setdefault(channel, []).append(callback)
+        self._watch(channel)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[dict]:
+        """Async iterator over events published on `channel` from now on"""
+        entry = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._queues.setdefault(channel, set()).add(entry)
+        self._watch(channel)
+        try:
+            while True:
+                yield await entry[1].get()
+        finally:
+            with self._lock:
+                self._queues.get(channel, set()).discard(entry)
+
+    def _watch(self, channel: str):
+        """Hook for brokers that need to start listening on a channel"""
+
+
+class PostgresBroker(InMemoryBroker):
+    """Cross-worker broker using LISTEN/NOTIFY"""
+
+    def __init__(self):
+        super().__init__()
+        self._channels: Set[str] = set()
+        self._listener: Optional[threading.Thread] = None
+
+    def publish_many(self, channel: str, payloads: List[dict]):
+        messages = [json.dumps(payload, default=str) for payload in payloads]
+        for message in messages:
+            if len(message) > MAX_NOTIFY_PAYLOAD:
+                raise ValueError(f"Event payload too large for NOTIFY ({len(message)} bytes)")
+        if not messages:
+            return
+        # One statement for the batch; delivered to every listening worker, including this one
+        with engine.begin() as connection:
+            connection.execute(
+                text("SELECT pg_notify(:channel, message) FROM unnest(CAST(:messages AS text[])) AS message"),
+                {"channel": channel, "messages": messages}
+            )
+
+    def _watch(self, channel: str):
+        with self._lock:
+            self._channels.add(channel)
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name="pg-listener", daemon=True)
+                self._listener.start()
+
+    @staticmethod
+    def _wait_for_notifies(connection, timeout: float) -> List:
+        """Notifications received within `timeout` seconds (psycopg 3 or psycopg2 connection)"""
+        if engine.dialect.driver == "psycopg":
+            return list(connection.notifies(timeout=timeout))
+        if select.select([connection], [], [], timeout) == ([], [], []):
+            return []
+        connection.poll()
+        received = list(connection.notifies)
+        connection.notifies.clear()
+        return received
+
+    def _listen(self):
+        while True:
+            raw = None
+            try:
+                raw = engine.raw_connection()
+                raw.detach()  # dedicated connection, never returned to the pool
+                connection = raw.driver_connection
+                connection.autocommit = True
+                cursor = connection.cursor()
+                listening: Set[str] = set()
+
+                while True:
+                    with self._lock:
+                        pending = self._channels - listening
+                    for channel in pending:
+                        cursor.execute(f'LISTEN "{channel}"')
+                        listening.add(channel)
+
+                    for notify in self._wait_for_notifies(connection, 1.0):
+                        try:
+                            payload = json.loads(notify.payload)
+                        except ValueError:
+                            continue
+                        self.dispatch(notify.channel, payload)
+            except Exception as e:
+                print(f"EVENTS: Listener connection lost: {e}")
+                time.sleep(2)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+
+
+def _create_broker() -> InMemoryBroker:
+    backend = settings.EVENT_BROKER
+    if backend == "postgres" or (backend == "auto" and engine.dialect.name == "postgresql"):
+        return PostgresBroker()
+    return InMemoryBroker()
+
+
+broker = _create_broker()
+
+
+def _order_event(kind: str, order) -> dict:
+    return {
+        "kind": kind,
+        "order_id": order.id,
+        "user_id": order.user_id,
+        "status": order.status.value if hasattr(order.status, "value") else order.status,
+        "total_amount": order.total_amount,
+        "item_count": order.item_count,
+        "updated_at": (order.updated_at or order.created_at).isoformat() if (order.updated_at or order.created_at) else None,
+    }
+
+
+def publish_order_events(kind: str, orders) -> None:
+    """
+    Publish a small delta per changed order, all in one broker call.
+    Never raises: a lost notification must not fail the mutation.
+    """
+    orders = list(orders)
+    try:
+        broker.publish_many(ORDER_EVENTS, [_order_event(kind, order) for order in orders])
+    except Exception as e:
+        print(f"EVENTS: Failed to publish {kind} for orders {[order.id for order in orders]}: {e}")
+
+
+def publish_order_event(kind: str, order) -> None:
+    """Publish a small delta describing an order change (never raises)"""
+    publish_order_events(kind, [order])
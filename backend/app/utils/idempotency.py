@@ -0,0 +1,279 @@
+import dataclasses
+import hashlib
+import hmac
+import json
+import time
+import typing
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Any, Callable, Optional, Tuple, Type, TypeVar
+from sqlalchemy import select, delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models.idempotency import IdempotencyKey, IdempotencyStatus
+
+T = TypeVar("T")
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+
+def idempotency_key_from(info, explicit_key: Optional[str] = None) -> Optional[str]:
+    """
+    Resolve the idempotency key for a mutation: an explicit argument wins,
+    otherwise the Idempotency-Key request header is used. In a batch the
+    header would be shared by every mutation, so only the argument counts.
+    """
+    if explicit_key:
+        return explicit_key
+
+    context = getattr(info, "context", None)
+    if not isinstance(context, dict) or context.get("batch"):
+        return None
+
+    # FastAPI router passes the Starlette request; api/graphql.py passes raw headers
+    request = context.get("request")
+    headers = getattr(request, "headers", None) or context.get("headers")
+    if headers is None:
+        return None
+    return headers.get(IDEMPOTENCY_HEADER) or None
+
+
+def request_fingerprint(operation: str, payload: Any) -> str:
+    """
+    Stable hash of the mutation arguments, used to reject key reuse with different input.
+    Keyed with SECRET_KEY: arguments can include a password, and a plain hash of it would be crackable.
+    """
+    encoded = json.dumps({"operation": operation, "payload": _to_jsonable(payload)}, sort_keys=True)
+    return hmac.new(settings.SECRET_KEY.encode("utf-8"), encoded.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def _to_jsonable(value: Any) -> Any:
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return {f.name: _to_jsonable(getattr(value, f.name)) for f in dataclasses.fields(value)}
+    if isinstance(value, (list, tuple)):
+        return [_to_jsonable(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def from_jsonable(tp: Any, value: Any) -> Any:
+    """Rebuild a (nested) strawberry type from its stored JSON form"""
+    if value is None:
+        return None
+
+    origin = typing.get_origin(tp)
+    if origin is typing.Union:
+        args = [a for a in typing.get_args(tp) if a is not type(None)]
+        return from_jsonable(args[0], value) if args else value
+    if origin in (list, typing.List):
+        (item_type,) = typing.get_args(tp) or (Any,)
+        return [from_jsonable(item_type, v) for v in value]
+    if isinstance(tp, type):
+        if dataclasses.is_dataclass(tp):
+            hints = typing.get_type_hints(tp)
+            return tp(**{
+                f.name: from_jsonable(hints.get(f.name, Any), value.get(f.name))
+                for f in dataclasses.fields(tp)
+                if f.name in value
+            })
+        if issubclass(tp, Enum):
+            return tp(value)
+        if issubclass(tp, datetime):
+            return datetime.fromisoformat(value)
+    return value
+
+
+def _claim(key: str, operation: str, fingerprint: str) -> Tuple[Optional[int], Optional[IdempotencyKey]]:
+    """
+    Try to insert an IN_PROGRESS row for `key`.
+    Returns (row id, None) when we own the key, otherwise (None, existing row).
+    """
+    db = SessionLocal()
+    try:
+        for _ in range(3):
+            now = datetime.now(timezone.utc)
+            row = IdempotencyKey(
+                key=key,
+                operation=operation,
+                request_hash=fingerprint,
+                status=IdempotencyStatus.IN_PROGRESS,
+                locked_until=now + timedelta(seconds=settings.IDEMPOTENCY_LEASE_SECONDS),
+                expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+            )
+            db.add(row)
+            try:
+                db.commit()
+                return row.id, None
+            except IntegrityError:
+                db.rollback()
+
+            existing = db.execute(select(IdempotencyKey).where(IdempotencyKey.key == key)).scalar_one_or_none()
+            if existing is None:
+                continue
+            if _is_expired(existing.expires_at, now) or _is_abandoned(existing, now):
+                # An expired key may be reused, and an abandoned attempt never committed (its result
+                # is written in the mutation's own transaction): drop it and claim again
+                db.execute(delete(IdempotencyKey).where(
+                    IdempotencyKey.id == existing.id, IdempotencyKey.status == existing.status
+                ))
+                db.commit()
+                continue
+            db.expunge(existing)
+            return None, existing
+        raise Exception("Could not acquire idempotency key, please retry")
+    finally:
+        db.close()
+
+
+def _is_expired(moment: Optional[datetime], now: datetime) -> bool:
+    if moment is None:
+        return False
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment <= now
+
+
+def _is_abandoned(row: IdempotencyKey, now: datetime) -> bool:
+    """IN_PROGRESS past its lease: the process running it died or gave up"""
+    return row.status == IdempotencyStatus.IN_PROGRESS and _is_expired(row.locked_until, now)
+
+
+def _wait_for_completion(key: str) -> Optional[IdempotencyKey]:
+    """
+    Poll until the in-flight execution for `key` stores its result (or gives up).
+    None when the key was released or its lease ran out, so the caller may claim it.
+    """
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    delay = 0.05
+    while time.monotonic() < deadline:
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+        db = SessionLocal()
+        try:
+            row = db.execute(select(IdempotencyKey).where(IdempotencyKey.key == key)).scalar_one_or_none()
+            if row is None or _is_abandoned(row, datetime.now(timezone.utc)):
+                return None
+            if row.status == IdempotencyStatus.COMPLETED:
+                db.expunge(row)
+                return row
+        finally:
+            db.close()
+    raise Exception("A request with this idempotency key is still in progress")
+
+
+def _completer(row_id: int) -> Callable[[Session, Any], None]:
+    """`complete(db, response)`: mark our claim COMPLETED in the mutation's transaction"""
+    def complete(db: Session, response: Any):
+        result = db.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.id == row_id, IdempotencyKey.status == IdempotencyStatus.IN_PROGRESS)
+            .values(status=IdempotencyStatus.COMPLETED, response=json.dumps(response), locked_until=None),
+            execution_options={"synchronize_session": False}
+        )
+        if result.rowcount != 1:
+            # Our lease ran out and another request took the key over: don't commit a second result
+            raise Exception("Idempotency key was taken over by a retry, please retry")
+    return complete
+
+
+def _not_idempotent(db: Session, response: Any):
+    """`complete` for calls without a key"""
+
+
+def _release(row_id: int):
+    """Forget a failed execution so the client can retry it"""
+    db = SessionLocal()
+    try:
+        db.execute(delete(IdempotencyKey).where(
+            IdempotencyKey.id == row_id,
+            IdempotencyKey.status == IdempotencyStatus.IN_PROGRESS
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_idempotent(
+    key: Optional[str],
+    operation: str,
+    payload: Any,
+    execute: Callable[[Callable[[Session, Any], None]], T],
+    result_type: Type[T],
+    replay: Optional[Callable[[Any], T]] = None
+) -> T:
+    """
+    Execute `execute(complete)` at most once per idempotency key.
+
+    `execute` must call `complete(db, response)` with a JSON-able response
+    just before committing its own transaction, so the stored result commits
+    (or rolls back) together with the mutation's writes. `replay(response)`
+    rebuilds the result from it (default: `response` is the JSON form of a `result_type`).
+
+    - No key: runs normally.
+    - First request: claims the key (with a lease of IDEMPOTENCY_LEASE_SECONDS) and runs.
+    - Replay: returns the stored result without re-executing.
+    - Concurrent duplicate: waits (blocking, so call from a worker thread) for the in-flight execution.
+    - Abandoned attempt (lease ran out, nothing committed): taken over and run again.
+    - Same key, different arguments: rejected.
+    """
+    if not key:
+        return execute(_not_idempotent)
+
+    fingerprint = request_fingerprint(operation, payload)
+
+    while True:
+        row_id, existing = _claim(key, operation, fingerprint)
+        if row_id is not None:
+            break
+
+        if existing.operation != operation or existing.request_hash != fingerprint:
+            raise Exception("Idempotency key was already used with a different request")
+
+        if existing.status == IdempotencyStatus.IN_PROGRESS:
+            existing = _wait_for_completion(key)
+            if existing is None:
+                # The in-flight attempt failed or was abandoned: try to run it ourselves
+                continue
+
+        stored = json.loads(existing.response)
+        return replay(stored) if replay else from_jsonable(result_type, stored)
+
+    try:
+        return execute(_completer(row_id))
+    except Exception:
+        _release(row_id)
+        raise
+
+
+def purge_expired_idempotency_keys(batch_size: int = 1000) -> int:
+    """Delete expired idempotency keys in batches"""
+    total = 0
+    db = SessionLocal()
+    try:
+        while True:
+            expired_ids = (
+                select(IdempotencyKey.id)
+                .where(IdempotencyKey.expires_at <= datetime.now(timezone.utc))
+                .limit(batch_size)
+            )
+            result = db.execute(
+                delete(IdempotencyKey).where(IdempotencyKey.id.in_(expired_ids)),
+                execution_options={"synchronize_session": False}
+            )
+            db.commit()
+
+            total += result.rowcount
+            if result.rowcount < batch_size:
+                break
+    finally:
+        db.close()
+
+    return total
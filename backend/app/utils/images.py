@@ -0,0 +1,240 @@
+"""
+Responsive image variants.
+
+When a product image is created or changed, a background job decodes the
+source (a `/images/...` path under public/, a Base64 `data:` URL or a remote
+URL on an IMAGE_REMOTE_HOSTS host), renders thumb/card/detail sizes as WebP and JPEG in a process pool and
+stores them in `image_variants` keyed by the sha256 of the source bytes.
+Identical uploads therefore share variants, and a variant URL never changes
+content, so it is served with an immutable Cache-Control.
+"""
+import base64
+import hashlib
+import http.client
+import io
+import ipaddress
+import json
+import multiprocessing
+import os
+import socket
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from app.config import settings
+
+# Variant name -> max width in px (never upscaled)
+VARIANT_WIDTHS = {"thumb": 160, "card": 480, "detail": 1200}
+FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg"}
+QUALITY = {"webp": 80, "jpeg": 82}
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_DEFAULT_SOURCE_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..", "public")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _process_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a process that already runs DB and worker threads is unsafe
+        _pool = ProcessPoolExecutor(settings.IMAGE_PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _reset_process_pool():
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def load_source(image_url: str) -> bytes:
+    """Original bytes for a product image_url"""
+    if image_url.startswith("data:"):
+        header, _, data = image_url.partition(",")
+        if ";base64" not in header:
+            raise ValueError("Only Base64 data URLs are supported")
+        return base64.b64decode(data)
+
+    if image_url.startswith(("http://", "https://")):
+        return _fetch_remote(image_url)
+
+    root = os.path.realpath(settings.IMAGE_SOURCE_DIR or _DEFAULT_SOURCE_DIR)
+    path = os.path.realpath(os.path.join(root, image_url.split("?")[0].lstrip("/")))
+    if not path.startswith(root + os.sep):
+        raise ValueError(f"Image path outside {root}: {image_url}")
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _public_address(host: str, port: int) -> str:
+    """An address of `host`, refusing hosts that resolve to anything but public addresses"""
+    addresses = sorted({info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)})
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%")[0])
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f"Remote image host {host} resolves to non-public address {ip}")
+    if not addresses:
+        raise ValueError(f"Remote image host {host} does not resolve")
+    return addresses[0]
+
+
+def _fetch_remote(image_url: str) -> bytes:
+    """GET an allowlisted remote image; redirects are not followed"""
+    parsed = urllib.parse.urlsplit(image_url)
+    host = (parsed.hostname or "").lower()
+    if host not in {h.lower() for h in settings.IMAGE_REMOTE_HOSTS}:
+        raise ValueError(f"Remote image host not allowed: {host or image_url}")
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    address = _public_address(host, port)
+
+    connection_class = http.client.HTTPSConnection if parsed.scheme == "https" else http.client.HTTPConnection
+    connection = connection_class(host, port, timeout=15)
+    # Connect to the address that was checked (a second lookup could be rebound); TLS still verifies `host`
+    connection._create_connection = lambda _, *args, **kwargs: socket.create_connection((address, port), *args, **kwargs)
+    try:
+        path = (parsed.path or "/") + (f"?{parsed.query}" if parsed.query else "")
+        connection.request("GET", path, headers={"Accept": "image/*"})
+        response = connection.getresponse()
+        if response.status != 200:
+            raise ValueError(f"Remote image returned HTTP {response.status}")
+        data = response.read(settings.IMAGE_MAX_SOURCE_BYTES + 1)
+    finally:
+        connection.close()
+    if len(data) > settings.IMAGE_MAX_SOURCE_BYTES:
+        raise ValueError("Source image too large")
+    return data
+
+
+def render_variants(source: bytes) -> List[Dict]:
+    """
+    Decode `source` and encode every size/format (runs in a worker process).
+    Returns dicts with name, format, width, height and content.
+    """
+    from PIL import Image, ImageOps
+
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(source)))
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if has_alpha else "RGB")
+
+    variants = []
+    for name, max_width in VARIANT_WIDTHS.items():
+        resized = image.copy()
+        if resized.width > max_width:
+            height = max(1, round(resized.height * max_width / resized.width))
+            resized = resized.resize((max_width, height), Image.LANCZOS)
+
+        for fmt in FORMATS:
+            out = io.BytesIO()
+            if fmt == "jpeg":
+                flat = resized
+                if has_alpha:
+                    # JPEG has no alpha: flatten onto the storefront's dark background
+                    flat = Image.new("RGB", resized.size, (0, 0, 0))
+                    flat.paste(resized, mask=resized.getchannel("A"))
+                flat.save(out, "JPEG", quality=QUALITY[fmt], optimize=True, progressive=True)
+            else:
+                resized.save(out, "WEBP", quality=QUALITY[fmt], method=4)
+            variants.append({
+                "name": name,
+                "format": fmt,
+                "width": resized.width,
+                "height": resized.height,
+                "content": out.getvalue(),
+            })
+    return variants
+
+
+def build_product_image_variants(product_id: int) -> Optional[str]:
+    """Make sure variants exist for the product's current image and point the product at them"""
+    from app.database import SessionLocal
+    from app.models import Product, ImageVariant
+    from app.utils.catalog_changes import record_catalog_changes
+    from app.utils.invalidation import invalidate_catalog
+
+    db = SessionLocal()
+    try:
+        product = db.get(Product, product_id)
+        if product is None or not product.image_url:
+            return None
+        image_url = product.image_url
+        source = load_source(image_url)
+        source_hash = hashlib.sha256(source).hexdigest()
+        existing = db.execute(
+            select(ImageVariant.name, ImageVariant.format, ImageVariant.width, ImageVariant.height)
+            .where(ImageVariant.source_hash == source_hash)
+        ).all()
+    finally:
+        # Don't hold a connection while rendering
+        db.close()
+
+    rendered = []
+    if len(existing) < len(VARIANT_WIDTHS) * len(FORMATS):
+        try:
+            rendered = _process_pool().submit(render_variants, source).result()
+        except BrokenProcessPool:
+            # A crashed child (e.g. OOM on a huge upload) poisons the pool; start fresh on retry
+            _reset_process_pool()
+            raise
+        existing = [(v["name"], v["format"], v["width"], v["height"]) for v in rendered]
+
+    db = SessionLocal()
+    try:
+        for variant in rendered:
+            try:
+                with db.begin_nested():
+                    db.add(ImageVariant(source_hash=source_hash, **variant))
+            except IntegrityError:
+                pass  # same source rendered concurrently for another product
+
+        # Only if the image wasn't replaced meanwhile; that change queued its own job
+        result = db.execute(
+            update(Product)
+            .where(Product.id == product_id, Product.image_url == image_url)
+            .values(image_hash=source_hash, image_variants=json.dumps([
+                {"name": name, "format": fmt, "width": width, "height": height}
+                for name, fmt, width, height in existing
+            ])),
+            execution_options={"synchronize_session": False}
+        )
+        version = record_catalog_changes(db, [product_id]) if result.rowcount else None
+        db.commit()
+        if version:
+            invalidate_catalog(version)
+        return source_hash
+    finally:
+        db.close()
+
+
+def variant_url(source_hash: str, name: str, fmt: str) -> str:
+    return f"{settings.IMAGE_BASE_URL}/images/{source_hash}/{name}.{fmt}"
+
+
+def enqueue_image_variants(product_id: int, db=None):
+    """Queue the variant build for a product (in the caller's transaction when `db` is given)"""
+    from app.utils.jobs import enqueue
+    enqueue("build_image_variants", {"product_id": product_id}, db=db)
+
+
+def enqueue_missing_image_variants() -> int:
+    """Queue variant builds for every product with an image but no variants (backfill)"""
+    from app.database import SessionLocal
+    from app.models import Product
+
+    db = SessionLocal()
+    try:
+        ids = db.execute(
+            select(Product.id).where(Product.image_url.isnot(None), Product.image_hash.is_(None))
+        ).scalars().all()
+        for product_id in ids:
+            enqueue_image_variants(product_id, db=db)
+        db.commit()
+        return len(ids)
+    finally:
+        db.close()
@@ -0,0 +1,177 @@
+"""
+Cross-worker cache invalidation.
+
+Product mutations call `invalidate_catalog()` after committing: the tag's version in
+`cache_versions` is bumped, local caches are dropped, and a versioned message
+goes out on the event broker (NOTIFY on Postgres, in-memory otherwise) so
+every other worker drops its copies too. Workers that missed a message (a
+listener reconnect, a serverless instance that never listened) catch up on
+the next cache read: versions are re-read from the table at most every
+CACHE_VERSION_POLL_SECONDS, and entries filled under an older version are misses.
+
+User mutations call `invalidate_users(ids)` the same way, evicting only those
+users' entries from caches tagged USERS (keyed by `str(user_id)`). No cache is
+registered under USERS yet; the messages make one safe to add later.
+"""
+import threading
+import time
+import uuid
+from typing import List, Optional
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from app.config import settings
+from app.database import SessionLocal
+from app.models.cache_version import CacheVersion
+from app.utils.cache import invalidate_tag, set_tag_version, tag_version, set_freshness_check
+from app.utils.events import broker
+
+CACHE_INVALIDATIONS = "cache_invalidation"
+MESSAGE_VERSION = 1
+
+CATALOG = "catalog"
+USERS = "users"
+
+_origin = uuid.uuid4().hex  # identifies this worker's own messages
+_poll_lock = threading.Lock()
+_next_poll = 0.0
+_listening = False
+
+
+def bump_version_in(db, tag: str) -> int:
+    """
+    Increment the tag's version in the caller's transaction. The row stays
+    locked until commit, so versions commit in the order they were issued.
+    """
+    for _ in range(2):
+        version = db.execute(
+            update(CacheVersion)
+            .where(CacheVersion.name == tag)
+            .values(version=CacheVersion.version + 1)
+            .returning(CacheVersion.version)
+        ).scalar()
+        if version is not None:
+            return version
+        try:
+            with db.begin_nested():
+                db.add(CacheVersion(name=tag, version=1))
+            return 1
+        except IntegrityError:
+            pass  # created concurrently; bump that row instead
+    raise Exception(f"Could not bump cache version for {tag}")
+
+
+def bump_version(tag: str) -> int:
+    """Increment and return the tag's global version"""
+    db = SessionLocal()
+    try:
+        version = bump_version_in(db, tag)
+        db.commit()
+        return version
+    finally:
+        db.close()
+
+
+def lock_version(db, name: str) -> CacheVersion:
+    """
+    The `name` row (created at 0 if missing), locked until the caller commits.
+    Background jobs keep their watermarks in cache_versions this way.
+    """
+    row = db.get(CacheVersion, name, with_for_update=True)
+    if row is None:
+        try:
+            with db.begin_nested():
+                db.add(CacheVersion(name=name, version=0))
+        except IntegrityError:
+            pass  # created concurrently
+        row = db.get(CacheVersion, name, with_for_update=True, populate_existing=True)
+    return row
+
+
+def invalidate(tag: str, keys: Optional[List[str]] = None, version: Optional[int] = None):
+    """
+    Evict `tag` on every worker, bumping its version (or announcing `version`
+    when the caller already bumped it in its own transaction). With `keys`,
+    only those (string) cache keys are evicted and the version stays as it is.
+    Never raises: a failed broadcast must not fail the mutation that triggered it.
+    """
+    try:
+        if keys is None:
+            version = version or bump_version(tag)
+            set_tag_version(tag, version)
+        else:
+            version = tag_version(tag)
+            invalidate_tag(tag, keys)
+        broker.publish(CACHE_INVALIDATIONS, {
+            "v": MESSAGE_VERSION,
+            "tag": tag,
+            "version": version,
+            "keys": keys,
+            "origin": _origin,
+        })
+    except Exception as e:
+        # Local copies are still dropped; other workers catch up through the version poll
+        invalidate_tag(tag, keys)
+        print(f"CACHE: Failed to broadcast invalidation of {tag}: {e}")
+
+
+def invalidate_catalog(version: Optional[int] = None):
+    """Called by product mutations after commit: drop cached catalog reads everywhere"""
+    invalidate(CATALOG, version=version)
+
+
+def invalidate_users(user_ids: List[int]):
+    """Called by user mutations after commit: drop those users' cached entries everywhere"""
+    if user_ids:
+        invalidate(USERS, keys=[str(user_id) for user_id in user_ids])
+
+
+def catalog_version() -> int:
+    """Cheap staleness check: the catalog version as this worker knows it"""
+    refresh_versions()
+    return tag_version(CATALOG)
+
+
+def _on_message(message: dict):
+    if message.get("v") != MESSAGE_VERSION or message.get("origin") == _origin:
+        return
+    tag = message.get("tag")
+    if not tag:
+        return
+    if message.get("keys") is not None:
+        invalidate_tag(tag, message["keys"])
+    else:
+        set_tag_version(tag, int(message.get("version") or 0))
+
+
+def refresh_versions(force: bool = False):
+    """Re-read all tag versions from the database (rate limited)"""
+    global _next_poll
+    now = time.monotonic()
+    with _poll_lock:
+        if not force and now < _next_poll:
+            return
+        _next_poll = now + settings.CACHE_VERSION_POLL_SECONDS
+    try:
+        db = SessionLocal()
+        try:
+            rows = db.execute(select(CacheVersion.name, CacheVersion.version)).all()
+        finally:
+            db.close()
+    except Exception as e:
+        print(f"CACHE: Could not read cache versions: {e}")
+        return
+    for name, version in rows:
+        set_tag_version(name, version)
+
+
+def start_invalidation_listener(listen: bool = True):
+    """
+    Enable the version poll and, with `listen`, subscribe this worker to
+    invalidation messages (idempotent). Short-lived serverless instances
+    skip the subscription and rely on the poll alone.
+    """
+    global _listening
+    set_freshness_check(refresh_versions)
+    if listen and not _listening:
+        _listening = True
+        broker.add_listener(CACHE_INVALIDATIONS, _on_message)
@@ -0,0 +1,433 @@
+"""
+Persistent background jobs.
+
+Work is stored in the `jobs` table and claimed with
+`UPDATE ... WHERE id IN (SELECT ... FOR UPDATE SKIP LOCKED)`, so any number
+of worker processes can share the queue without handing out a job twice.
+SQLite has no row locks; the same single UPDATE is serialized by its write
+lock there and workers simply poll.
+
+Handlers are registered in app/tasks.py with @job(...) (one-off work) or
+@periodic(...) (recurring work, enqueued once per interval slot).
+"""
+import asyncio
+import json
+import os
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Set
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models.job import Job, JobStatus
+
+# Retry delays double per attempt up to this cap
+MAX_RETRY_DELAY_SECONDS = 3600
+
+
+@dataclass
+class JobSpec:
+    name: str
+    fn: Callable[..., Any]
+    max_attempts: int = 5
+    timeout_seconds: Optional[float] = None
+
+
+@dataclass
+class Schedule:
+    name: str
+    every_seconds: int
+    payload: Dict[str, Any] = field(default_factory=dict)
+
+
+_handlers: Dict[str, JobSpec] = {}
+_schedules: Dict[str, Schedule] = {}
+# Jobs queued by this process; serverless handlers compare it to see whether a request queued any
+_enqueued = 0
+_enqueued_lock = threading.Lock()
+
+
+def job(name: str, max_attempts: int = 5, timeout_seconds: Optional[float] = None):
+    """Register `fn(**payload)` as the handler for jobs called `name`"""
+    def decorator(fn):
+        _handlers[name] = JobSpec(name, fn, max_attempts, timeout_seconds)
+        return fn
+    return decorator
+
+
+def periodic(name: str, every_seconds: int, max_attempts: int = 1, timeout_seconds: Optional[float] = None):
+    """Register a handler and run it once every `every_seconds` across all workers"""
+    def decorator(fn):
+        job(name, max_attempts, timeout_seconds)(fn)
+        _schedules[name] = Schedule(name, every_seconds)
+        return fn
+    return decorator
+
+
+def enqueue(
+    name: str,
+    payload: Optional[Dict[str, Any]] = None,
+    *,
+    delay_seconds: float = 0,
+    run_at: Optional[datetime] = None,
+    max_attempts: Optional[int] = None,
+    dedupe_key: Optional[str] = None,
+    db: Optional[Session] = None,
+) -> Optional[int]:
+    """
+    Queue a job and return its id (None if `dedupe_key` was already taken).
+
+    With `db`, the job is added to the caller's transaction and only becomes
+    visible to workers when the caller commits.
+    """
+    global _enqueued
+    with _enqueued_lock:
+        _enqueued += 1
+
+    spec = _handlers.get(name)
+    row = Job(
+        name=name,
+        payload=json.dumps(payload or {}, default=str),
+        max_attempts=max_attempts or (spec.max_attempts if spec else 5),
+        run_at=run_at or datetime.now(timezone.utc) + timedelta(seconds=delay_seconds),
+        dedupe_key=dedupe_key,
+    )
+
+    if db is not None:
+        try:
+            with db.begin_nested():
+                db.add(row)
+        except IntegrityError:
+            return None
+        return row.id
+
+    db = SessionLocal()
+    try:
+        db.add(row)
+        db.commit()
+        return row.id
+    except IntegrityError:
+        db.rollback()
+        return None
+    finally:
+        db.close()
+
+
+@dataclass
+class ClaimedJob:
+    id: int
+    name: str
+    payload: Dict[str, Any]
+    attempts: int
+    max_attempts: int
+
+
+def claim_jobs(worker_id: str, limit: int) -> List[ClaimedJob]:
+    """Mark up to `limit` due jobs as running for this worker"""
+    now = datetime.now(timezone.utc)
+    due = (
+        select(Job.id)
+        .where(Job.status == JobStatus.QUEUED, Job.run_at <= now)
+        .order_by(Job.run_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            update(Job)
+            .where(Job.id.in_(due))
+            .values(status=JobStatus.RUNNING, locked_by=worker_id, locked_at=now, attempts=Job.attempts + 1)
+            .returning(Job.id, Job.name, Job.payload, Job.attempts, Job.max_attempts),
+            execution_options={"synchronize_session": False}
+        ).all()
+        db.commit()
+    finally:
+        db.close()
+
+    return [
+        ClaimedJob(r.id, r.name, json.loads(r.payload or "{}"), r.attempts, r.max_attempts)
+        for r in rows
+    ]
+
+
+def heartbeat_job(claimed: ClaimedJob):
+    """Refresh the lock of a job that is still running so the reaper leaves it alone"""
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(Job)
+            .where(Job.id == claimed.id, Job.status == JobStatus.RUNNING, Job.attempts == claimed.attempts)
+            .values(locked_at=datetime.now(timezone.utc)),
+            execution_options={"synchronize_session": False}
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def requeue_stale_jobs() -> int:
+    """Give jobs held by a worker that died another chance (or fail them if out of attempts)"""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT_SECONDS)
+    stale = (Job.status == JobStatus.RUNNING) & (Job.locked_at <= cutoff)
+    db = SessionLocal()
+    try:
+        failed = db.execute(
+            update(Job)
+            .where(stale, Job.attempts >= Job.max_attempts)
+            .values(status=JobStatus.FAILED, finished_at=func.now(), last_error="Worker lost while running job"),
+            execution_options={"synchronize_session": False}
+        ).rowcount
+        requeued = db.execute(
+            update(Job)
+            .where(stale)
+            .values(status=JobStatus.QUEUED, locked_by=None, locked_at=None, run_at=func.now()),
+            execution_options={"synchronize_session": False}
+        ).rowcount
+        db.commit()
+        return failed + requeued
+    finally:
+        db.close()
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter for the retry after attempt number `attempts`"""
+    base = settings.JOBS_RETRY_BASE_SECONDS
+    return min(base * 2 ** (attempts - 1), MAX_RETRY_DELAY_SECONDS) + random.uniform(0, base)
+
+
+def _finish(claimed: ClaimedJob, duration_ms: float, error: Optional[str] = None) -> JobStatus:
+    now = datetime.now(timezone.utc)
+    if error is None:
+        values = {"status": JobStatus.SUCCEEDED, "finished_at": now, "last_error": None}
+    elif claimed.attempts >= claimed.max_attempts:
+        values = {"status": JobStatus.FAILED, "finished_at": now, "last_error": error}
+    else:
+        values = {
+            "status": JobStatus.QUEUED,
+            "run_at": now + timedelta(seconds=retry_delay(claimed.attempts)),
+            "locked_by": None,
+            "locked_at": None,
+            "last_error": error,
+        }
+
+    db = SessionLocal()
+    try:
+        # Only this attempt: a job the reaper requeued (and maybe someone re-claimed) isn't ours anymore
+        db.execute(
+            update(Job)
+            .where(Job.id == claimed.id, Job.status == JobStatus.RUNNING, Job.attempts == claimed.attempts)
+            .values(duration_ms=duration_ms, **values),
+            execution_options={"synchronize_session": False}
+        )
+        db.commit()
+    finally:
+        db.close()
+    return values["status"]
+
+
+def purge_finished_jobs(older_than_days: Optional[int] = None, batch_size: int = 1000) -> int:
+    """Delete succeeded/failed jobs past the retention window"""
+    older_than_days = settings.JOBS_RETENTION_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    total = 0
+    db = SessionLocal()
+    try:
+        while True:
+            finished_ids = (
+                select(Job.id)
+                .where(Job.status.in_([JobStatus.SUCCEEDED, JobStatus.FAILED]), Job.finished_at <= cutoff)
+                .limit(batch_size)
+            )
+            result = db.execute(
+                delete(Job).where(Job.id.in_(finished_ids)),
+                execution_options={"synchronize_session": False}
+            )
+            db.commit()
+
+            total += result.rowcount
+            if result.rowcount < batch_size:
+                break
+    finally:
+        db.close()
+    return total
+
+
+class JobMetrics:
+    """Per-job-name counters and timings for this process"""
+
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, duration_ms: float, status: JobStatus):
+        with self._lock:
+            s = self._stats.setdefault(name, {
+                "runs": 0, "succeeded": 0, "retried": 0, "failed": 0, "total_ms": 0.0, "max_ms": 0.0,
+            })
+            s["runs"] += 1
+            s["total_ms"] += duration_ms
+            s["max_ms"] = max(s["max_ms"], duration_ms)
+            key = {JobStatus.SUCCEEDED: "succeeded", JobStatus.FAILED: "failed"}.get(status, "retried")
+            s[key] += 1
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                name: {**s, "avg_ms": round(s["total_ms"] / s["runs"], 2) if s["runs"] else 0.0}
+                for name, s in self._stats.items()
+            }
+
+
+job_metrics = JobMetrics()
+
+
+def queue_depth() -> Dict[str, int]:
+    """Job counts per status"""
+    db = SessionLocal()
+    try:
+        rows = db.execute(select(Job.status, func.count()).group_by(Job.status)).all()
+        return {status.value: count for status, count in rows}
+    finally:
+        db.close()
+
+
+class Worker:
+    """Claims due jobs and runs them on a dedicated thread pool"""
+
+    def __init__(self, concurrency: Optional[int] = None, poll_interval: Optional[float] = None):
+        self.concurrency = concurrency or settings.JOBS_CONCURRENCY
+        self.poll_interval = poll_interval or settings.JOBS_POLL_INTERVAL_SECONDS
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix="job")
+        self._running: Set[asyncio.Task] = set()
+        self._next_slot: Dict[str, int] = {}
+        self._next_reap = 0.0
+
+    async def run(self, until: Optional[float] = None):
+        """Process jobs forever, or until the monotonic deadline `until` once the queue is idle"""
+        import app.tasks  # noqa: F401  registers handlers and schedules
+
+        while until is None or time.monotonic() < until:
+            try:
+                await asyncio.to_thread(self._housekeeping)
+                free = self.concurrency - len(self._running)
+                claimed = await asyncio.to_thread(claim_jobs, self.worker_id, free) if free else []
+            except Exception as e:
+                print(f"JOBS: Poll failed: {e}")
+                claimed = []
+
+            for claimed_job in claimed:
+                task = asyncio.create_task(self._execute(claimed_job))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+            if claimed and len(self._running) < self.concurrency:
+                continue  # more may be due right now
+            if self._running:
+                await asyncio.wait(self._running, timeout=self.poll_interval, return_when=asyncio.FIRST_COMPLETED)
+            elif until is not None and not claimed:
+                break  # draining and nothing left
+            else:
+                await asyncio.sleep(self.poll_interval)
+
+        if self._running:
+            remaining = None if until is None else max(0.0, until - time.monotonic())
+            await asyncio.wait(self._running, timeout=remaining)
+        if self._running:
+            # Handler threads can't be stopped; they finish (and record their result) in the background.
+            # If the process is frozen first, their heartbeat stops and the reaper requeues them.
+            print(f"JOBS: {len(self._running)} jobs still running at the deadline")
+
+    def _housekeeping(self):
+        """Enqueue due schedule slots and requeue jobs abandoned by dead workers"""
+        now = time.time()
+        for schedule in _schedules.values():
+            slot = int(now // schedule.every_seconds)
+            if self._next_slot.get(schedule.name, 0) > slot:
+                continue
+            # Unique dedupe key: exactly one worker wins each slot
+            enqueue(schedule.name, schedule.payload, dedupe_key=f"{schedule.name}@{slot}")
+            self._next_slot[schedule.name] = slot + 1
+
+        if time.monotonic() >= self._next_reap:
+            self._next_reap = time.monotonic() + 60
+            requeued = requeue_stale_jobs()
+            if requeued:
+                print(f"JOBS: Requeued {requeued} stale jobs")
+
+    async def _execute(self, claimed: ClaimedJob):
+        spec = _handlers.get(claimed.name)
+        started = time.perf_counter()
+        error = None
+        try:
+            if spec is None:
+                raise Exception(f"No handler registered for job '{claimed.name}'")
+            timeout = spec.timeout_seconds or settings.JOBS_TIMEOUT_SECONDS
+            call = asyncio.get_running_loop().run_in_executor(self._executor, lambda: spec.fn(**claimed.payload))
+            await self._wait_for_handler(claimed, call, timeout)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+
+        duration_ms = (time.perf_counter() - started) * 1000
+        try:
+            status = await asyncio.to_thread(_finish, claimed, duration_ms, error)
+        except Exception as e:
+            print(f"JOBS: Could not record result of job {claimed.id}: {e}")
+            return
+        job_metrics.record(claimed.name, duration_ms, status)
+        if error:
+            print(f"JOBS: {claimed.name}#{claimed.id} attempt {claimed.attempts} failed: {error}")
+
+    async def _wait_for_handler(self, claimed: ClaimedJob, call: asyncio.Future, timeout: float):
+        """
+        Wait for the handler thread to return, refreshing the job's lock meanwhile.
+        A thread can't be interrupted, so an overrun is only logged: the attempt is
+        recorded (and possibly retried) once the handler really stops, never while it
+        may still be running.
+        """
+        heartbeat = max(settings.JOBS_LOCK_TIMEOUT_SECONDS / 4, 1)
+        deadline = time.monotonic() + timeout
+        overran = False
+        while True:
+            done, _ = await asyncio.wait({call}, timeout=heartbeat)
+            if done:
+                return call.result()
+            if not overran and time.monotonic() >= deadline:
+                overran = True
+                print(f"JOBS: {claimed.name}#{claimed.id} exceeded its {timeout}s timeout; waiting for it to stop")
+            try:
+                await asyncio.to_thread(heartbeat_job, claimed)
+            except Exception as e:
+                print(f"JOBS: Heartbeat for job {claimed.id} failed: {e}")
+
+
+async def run_pending_jobs(max_seconds: float) -> None:
+    """Drain due jobs for at most `max_seconds` (for serverless deployments without a worker)"""
+    await Worker().run(until=time.monotonic() + max_seconds)
+
+
+def enqueued_count() -> int:
+    """How many jobs this process has queued (see drain_after_response)"""
+    return _enqueued
+
+
+def drain_after_response(enqueued_before: int, max_seconds: Optional[float] = None) -> None:
+    """
+    Where no worker runs (Vercel), drain due jobs for up to `max_seconds`
+    (JOBS_INLINE_SECONDS) once a handler has sent a response whose request
+    queued jobs, so emails and seeding don't wait for the next /jobs/run cron call.
+    """
+    if not os.getenv("VERCEL") or settings.JOBS_INLINE_SECONDS <= 0 or enqueued_count() == enqueued_before:
+        return
+    try:
+        asyncio.run(run_pending_jobs(max_seconds=max_seconds or settings.JOBS_INLINE_SECONDS))
+    except Exception as e:
+        print(f"JOBS: Inline drain failed: {e}")
@@ -0,0 +1,168 @@
+"""
+Monthly range partitions for `orders` / `order_items` (Postgres only).
+
+Partitions are named `<table>_pYYYY_MM` and cover [first of month, first of next month)
+on `created_at`. A DEFAULT partition catches anything outside the created ranges.
+"""
+import gzip
+import io
+import os
+import re
+from datetime import date, datetime, timezone
+from typing import List, Optional
+from sqlalchemy import text
+from app.config import settings
+from app.database import engine
+
+PARTITIONED_TABLES = ("orders", "order_items")
+PARTITION_NAME = re.compile(r"^(?P<table>\w+)_p(?P<year>\d{4})_(?P<month>\d{2})$")
+
+
+def is_postgres() -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + (month.month - 1) + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_start(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month.year:04d}_{month.month:02d}"
+
+
+def is_partitioned(connection, table: str) -> bool:
+    return bool(connection.execute(text("""
+        SELECT 1 FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = :table
+    """), {"table": table}).scalar())
+
+
+def create_month_partition(connection, table: str, month: date, parent: Optional[str] = None):
+    """Create the partition of `table` for `month` (under `parent` while a table is being rebuilt)"""
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {parent or table} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+
+
+def ensure_future_partitions(months_ahead: Optional[int] = None) -> List[str]:
+    """Create partitions for the current month and the next `months_ahead` months"""
+    if not is_postgres():
+        return []
+
+    months_ahead = settings.ORDER_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    current = month_start(datetime.now(timezone.utc))
+    created = []
+
+    with engine.begin() as connection:
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(connection, table):
+                continue
+            for offset in range(months_ahead + 1):
+                month = add_months(current, offset)
+                create_month_partition(connection, table, month)
+                created.append(partition_name(table, month))
+    return created
+
+
+def list_month_partitions(connection, table: str) -> List[date]:
+    rows = connection.execute(text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = :table
+    """), {"table": table}).scalars()
+
+    months = []
+    for name in rows:
+        match = PARTITION_NAME.match(name)
+        if match and match.group("table") == table:
+            months.append(date(int(match.group("year")), int(match.group("month")), 1))
+    return sorted(months)
+
+
+def archive_cold_partitions(older_than_months: Optional[int] = None, archive_dir: Optional[str] = None) -> List[str]:
+    """
+    Export month partitions older than the cutoff to gzip-compressed CSV
+    files, then detach and drop them once the file is safely written.
+    Returns the written file paths.
+    """
+    if not is_postgres():
+        return []
+
+    older_than_months = settings.ORDER_ARCHIVE_AFTER_MONTHS if older_than_months is None else older_than_months
+    if older_than_months <= 0:
+        return []
+
+    archive_dir = archive_dir or settings.ORDER_ARCHIVE_DIR
+    os.makedirs(archive_dir, exist_ok=True)
+    cutoff = add_months(month_start(datetime.now(timezone.utc)), -older_than_months)
+    written = []
+
+    with engine.begin() as connection:
+        # Items first so an interrupted run never leaves items without their order archived
+        cold = [
+            (table, month)
+            for table in ("order_items", "orders")
+            if is_partitioned(connection, table)
+            for month in list_month_partitions(connection, table)
+            if add_months(month, 1) <= cutoff
+        ]
+
+    for table, month in cold:
+        name = partition_name(table, month)
+        path = os.path.join(archive_dir, f"{name}.csv.gz")
+
+        # One transaction per partition: the rows stay attached (and queryable) until the
+        # archive file is on disk, and any failure rolls back to the untouched partition
+        with engine.begin() as connection:
+            # Readers carry on; writes to the partition wait, so nothing lands after the export
+            connection.execute(text(f"LOCK TABLE {name} IN SHARE MODE"))
+            _export_table(connection, name, path)
+            connection.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            connection.execute(text(f"DROP TABLE {name}"))
+        written.append(path)
+        print(f"PARTITIONS: Archived {name} to {path}")
+
+    return written
+
+
+def _export_table(connection, table: str, path: str):
+    """
+    COPY a table to a gzip-compressed CSV file with a header row, inside the
+    connection's transaction. The file is fsynced and renamed into place, so
+    `path` only ever holds a complete archive.
+    """
+    sql = f"COPY {table} TO STDOUT WITH (FORMAT csv, HEADER true)"
+    partial = f"{path}.partial"
+    cursor = connection.connection.cursor()
+    try:
+        with open(partial, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                if engine.dialect.driver == "psycopg":
+                    with cursor.copy(sql) as copy:
+                        for chunk in copy:
+                            f.write(chunk)
+                else:
+                    with io.TextIOWrapper(f, encoding="utf-8") as text_file:
+                        cursor.copy_expert(sql, text_file)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(partial, path)
+        directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    finally:
+        cursor.close()
@@ -0,0 +1,245 @@
+"""
+Token-bucket rate limiting and load shedding for the GraphQL endpoints.
+
+Each request is charged one token from:
+- its client IP bucket,
+- its user bucket (when a valid bearer token is sent),
+- one bucket per configured operation it runs (e.g. `login`), scoped to the user or IP.
+"""
+import json
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from app.config import settings
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+@dataclass
+class Rule:
+    capacity: float
+    refill_per_second: float
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    status_code: int = 200
+    retry_after: int = 0
+    message: str = ""
+
+
+def parse_rule(rule: str) -> Rule:
+    """Parse "<count>/<period>", e.g. "10/minute" """
+    count, period = rule.split("/", 1)
+    seconds = PERIODS[period.strip().lower().rstrip("s")]
+    count = float(count)
+    return Rule(capacity=count, refill_per_second=count / seconds)
+
+
+class InMemoryBucketStore:
+    """Per-process token buckets"""
+
+    PRUNE_EVERY = 10000
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def take(self, key: str, rule: Rule, now: float) -> float:
+        """Take one token; returns 0 if allowed, otherwise seconds until a token is available"""
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (rule.capacity, now))
+            tokens = min(rule.capacity, tokens + (now - updated) * rule.refill_per_second)
+            wait = _consume(tokens, rule)
+            self._buckets[key] = (tokens - 1 if wait == 0 else tokens, now)
+
+            self._calls += 1
+            if self._calls % self.PRUNE_EVERY == 0:
+                self._prune(now)
+            return wait
+
+    def _prune(self, now: float):
+        # Buckets idle for an hour are full again and can be dropped
+        stale = [k for k, (_, updated) in self._buckets.items() if now - updated > 3600]
+        for k in stale:
+            del self._buckets[k]
+
+
+class DatabaseBucketStore:
+    """Token buckets in the rate_limit_buckets table, shared by every worker on the same database"""
+
+    def take(self, key: str, rule: Rule, now: float) -> float:
+        from app.database import SessionLocal
+        from app.models.rate_limit import RateLimitBucket
+
+        db = SessionLocal()
+        try:
+            for _ in range(2):
+                bucket = db.execute(
+                    select(RateLimitBucket).where(RateLimitBucket.key == key).with_for_update()
+                ).scalar_one_or_none()
+
+                if bucket is None:
+                    bucket = RateLimitBucket(key=key, tokens=rule.capacity, updated_at=now)
+                    db.add(bucket)
+                    try:
+                        db.flush()
+                    except IntegrityError:
+                        # Another worker created it first
+                        db.rollback()
+                        continue
+
+                tokens = min(rule.capacity, bucket.tokens + (now - bucket.updated_at) * rule.refill_per_second)
+                wait = _consume(tokens, rule)
+                bucket.tokens = tokens - 1 if wait == 0 else tokens
+                bucket.updated_at = now
+                db.commit()
+                return wait
+            return 0.0
+        finally:
+            db.close()
+
+
+def _consume(tokens: float, rule: Rule) -> float:
+    if tokens >= 1:
+        return 0.0
+    if rule.refill_per_second <= 0:
+        return 60.0
+    return (1 - tokens) / rule.refill_per_second
+
+
+class RateLimiter:
+    def __init__(self, store=None):
+        self.store = store or (DatabaseBucketStore() if settings.RATE_LIMIT_BACKEND == "database" else InMemoryBucketStore())
+        self.ip_rule = parse_rule(settings.RATE_LIMIT_PER_IP)
+        self.user_rule = parse_rule(settings.RATE_LIMIT_PER_USER)
+        self.operation_rules = {name: parse_rule(rule) for name, rule in settings.RATE_LIMIT_OPERATIONS.items()}
+
+    def check(self, client_ip: str, authorization: Optional[str], body: bytes) -> Decision:
+        """Decide whether a request may proceed (blocking: call off the event loop for the database store)"""
+        if _should_shed_load():
+            return Decision(False, 503, 1, "Server is busy, please retry shortly")
+
+        now = time.time()
+        user = _user_from_authorization(authorization)
+        subject = f"user:{user}" if user else f"ip:{client_ip}"
+
+        charges = [(f"ip:{client_ip}", self.ip_rule)]
+        if user:
+            charges.append((f"user:{user}", self.user_rule))
+        for operation in graphql_operations(body):
+            rule = self.operation_rules.get(operation)
+            if rule:
+                charges.append((f"op:{operation}:{subject}", rule))
+
+        wait = max(self.store.take(key, rule, now) for key, rule in charges)
+        if wait > 0:
+            return Decision(False, 429, max(1, math.ceil(wait)), "Rate limit exceeded")
+        return Decision(True)
+
+
+def _should_shed_load() -> bool:
+    if settings.LOAD_SHED_POOL_WAIT_MS <= 0:
+        return False
+    from app.database import pool_wait
+    return pool_wait.average_ms() > settings.LOAD_SHED_POOL_WAIT_MS
+
+
+def _user_from_authorization(authorization: Optional[str]) -> Optional[str]:
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    from app.utils.auth import decode_access_token
+    payload = decode_access_token(authorization[7:].strip())
+    return payload.get("sub") if payload else None
+
+
+def graphql_operations(body: bytes) -> List[str]:
+    """
+    Names to charge for a GraphQL POST body (single or batched): every root
+    field selected (aliases count once each), plus the operation name unless
+    it is one of those fields.
+    """
+    if not body:
+        return []
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return []
+
+    names = []
+    for operation in payload if isinstance(payload, list) else [payload]:
+        if not isinstance(operation, dict):
+            continue
+        fields = _root_fields(operation.get("query"))
+        operation_name = operation.get("operationName")
+        if operation_name and operation_name not in fields:
+            names.append(operation_name)
+        names.extend(fields)
+    return names
+
+
+def _root_fields(query: Optional[str]) -> List[str]:
+    if not query:
+        return []
+    from graphql import parse, GraphQLError
+    from graphql.language import OperationDefinitionNode, FragmentDefinitionNode
+    try:
+        document = parse(query)
+    except GraphQLError:
+        return []
+
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if isinstance(definition, FragmentDefinitionNode)
+    }
+    fields = []
+    for definition in document.definitions:
+        if isinstance(definition, OperationDefinitionNode):
+            fields.extend(_selected_fields(definition.selection_set, fragments, set()))
+    return fields
+
+
+def _selected_fields(selection_set, fragments: dict, seen: set) -> List[str]:
+    """Field names of a selection set, looking through inline fragments and fragment spreads"""
+    from graphql.language import FieldNode, InlineFragmentNode, FragmentSpreadNode
+    fields = []
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            fields.append(selection.name.value)
+        elif isinstance(selection, InlineFragmentNode):
+            fields.extend(_selected_fields(selection.selection_set, fragments, seen))
+        elif isinstance(selection, FragmentSpreadNode):
+            name = selection.name.value
+            # A fragment spread into itself is invalid GraphQL, but must not recurse forever here
+            if name in fragments and name not in seen:
+                fields.extend(_selected_fields(fragments[name].selection_set, fragments, seen | {name}))
+    return fields
+
+
+def client_ip_from(headers, fallback: Optional[str]) -> str:
+    """
+    Client IP as seen by our own proxies. Leading X-Forwarded-For entries are
+    whatever the client sent, so only the hop our trusted proxies appended counts.
+    """
+    if settings.RATE_LIMIT_CLIENT_IP_HEADER:
+        value = headers.get(settings.RATE_LIMIT_CLIENT_IP_HEADER)
+        if value:
+            return value.split(",")[0].strip()
+
+    hops = settings.RATE_LIMIT_TRUSTED_PROXIES
+    forwarded = headers.get("x-forwarded-for")
+    if forwarded and hops > 0:
+        entries = [entry.strip() for entry in forwarded.split(",") if entry.strip()]
+        if entries:
+            return entries[-min(hops, len(entries))]
+    return fallback or "unknown"
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,194 @@
+"""
+"Frequently bought together" recommendations.
+
+A periodic job folds orders placed since its last run into a sparse
+co-occurrence matrix (`product_pair_counts`) and per-product order counts
+(`product_popularity`). Pairs are counted with vectorized NumPy over each
+batch of baskets instead of self-joining order_items. Scores are
+popularity-normalized (cosine), so best-sellers don't top every list:
+
+    score(a, b) = together(a, b) / sqrt(orders(a) * orders(b))
+
+The top-K neighbours of every product the new orders touched are rewritten
+in `product_recommendations`, which `recommendedProducts` reads with one
+primary-key lookup. A daily full rebuild also drops cancelled orders and
+corrects the scores of products that weren't touched since.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Set
+from sqlalchemy import select, delete
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Order, OrderItem, ProductPairCount, ProductPopularity, ProductRecommendation
+from app.models.order import OrderStatus
+from app.utils.customer_stats import _upsert
+from app.utils.invalidation import lock_version
+
+# cache_versions row holding the highest order id folded into the counts
+WATERMARK = "recommendations_order_watermark"
+
+_WRITE_CHUNK = 1000  # rows per multi-row INSERT (SQLite caps bound parameters)
+
+
+def basket_pairs(order_idx, product_idx, n_products: int):
+    """
+    Count co-occurring products. `order_idx`/`product_idx` are parallel arrays
+    of distinct (order, product) rows sorted by order, with products mapped to
+    0..n_products-1. Returns arrays (a, b, count) over ordered pairs a != b.
+    """
+    import numpy as np
+
+    starts = np.flatnonzero(np.r_[True, order_idx[1:] != order_idx[:-1]])
+    sizes = np.diff(np.r_[starts, len(order_idx)])
+
+    # Every row pairs with each row of its basket: expand row i into size(i) slots
+    row_sizes = np.repeat(sizes, sizes)
+    row_starts = np.repeat(starts, sizes)
+    left = np.repeat(np.arange(len(order_idx)), row_sizes)
+    slot = np.arange(row_sizes.sum()) - np.repeat(np.cumsum(row_sizes) - row_sizes, row_sizes)
+    right = np.repeat(row_starts, row_sizes) + slot
+
+    keep = left != right
+    keys = product_idx[left[keep]].astype(np.int64) * n_products + product_idx[right[keep]]
+    keys, counts = np.unique(keys, return_counts=True)
+    return keys // n_products, keys % n_products, counts
+
+
+def _chunks(rows: List, size: int = _WRITE_CHUNK) -> Iterable[List]:
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def _fold_orders(db: Session, order_ids: List[int]) -> Set[int]:
+    """Add these orders' baskets to the counts; returns the product ids involved"""
+    import numpy as np
+
+    rows = db.execute(
+        select(OrderItem.order_id, OrderItem.product_id)
+        .where(OrderItem.order_id.in_(order_ids), OrderItem.product_id.isnot(None))
+        .distinct()
+        .order_by(OrderItem.order_id)
+    ).all()
+    if not rows:
+        return set()
+
+    data = np.array(rows, dtype=np.int64)
+    product_ids, product_idx = np.unique(data[:, 1], return_inverse=True)
+    insert = _upsert()
+
+    popularity = np.bincount(product_idx, minlength=len(product_ids))
+    statement = insert(ProductPopularity)
+    statement = statement.on_conflict_do_update(
+        index_elements=[ProductPopularity.product_id],
+        set_={"order_count": ProductPopularity.order_count + statement.excluded.order_count}
+    )
+    for chunk in _chunks([
+        {"product_id": int(product_ids[i]), "order_count": int(n)} for i, n in enumerate(popularity)
+    ]):
+        db.execute(statement, chunk)
+
+    # Very large baskets (bulk/wholesale orders) say little about affinity and cost size^2 pairs
+    _, order_idx, basket_sizes = np.unique(data[:, 0], return_inverse=True, return_counts=True)
+    small = basket_sizes[order_idx] <= settings.RECOMMENDATION_MAX_BASKET
+    a, b, counts = basket_pairs(order_idx[small], product_idx[small], len(product_ids))
+
+    statement = insert(ProductPairCount)
+    statement = statement.on_conflict_do_update(
+        index_elements=[ProductPairCount.product_id, ProductPairCount.other_id],
+        set_={"count": ProductPairCount.count + statement.excluded.count}
+    )
+    for chunk in _chunks([
+        {"product_id": int(product_ids[x]), "other_id": int(product_ids[y]), "count": int(n)}
+        for x, y, n in zip(a, b, counts)
+    ]):
+        db.execute(statement, chunk)
+
+    return {int(p) for p in product_ids}
+
+
+def _rebuild_top_k(db: Session, product_ids: List[int]):
+    """Rewrite the recommendation lists of `product_ids` from the current counts"""
+    import numpy as np
+
+    top_k = settings.RECOMMENDATION_TOP_K
+    for ids in _chunks(sorted(product_ids), 500):
+        pairs = db.execute(
+            select(ProductPairCount.product_id, ProductPairCount.other_id, ProductPairCount.count)
+            .where(
+                ProductPairCount.product_id.in_(ids),
+                ProductPairCount.count >= settings.RECOMMENDATION_MIN_PAIR_COUNT
+            )
+        ).all()
+        db.execute(
+            delete(ProductRecommendation).where(ProductRecommendation.product_id.in_(ids)),
+            execution_options={"synchronize_session": False}
+        )
+        if not pairs:
+            continue
+
+        data = np.array(pairs, dtype=np.int64)
+        involved = np.unique(data[:, :2])
+        popularity = dict(db.execute(
+            select(ProductPopularity.product_id, ProductPopularity.order_count)
+            .where(ProductPopularity.product_id.in_([int(p) for p in involved]))
+        ).all())
+        orders = np.array([popularity.get(int(p), 0) for p in involved], dtype=np.float64)
+        lookup = np.searchsorted(involved, data[:, :2])
+        score = data[:, 2] / np.sqrt(np.maximum(orders[lookup[:, 0]] * orders[lookup[:, 1]], 1.0))
+
+        # Best first within each product; ties go to the more frequent pair
+        order = np.lexsort((-data[:, 2], -score, data[:, 0]))
+        product, other, score = data[order, 0], data[order, 1], score[order]
+        starts = np.flatnonzero(np.r_[True, product[1:] != product[:-1]])
+        rank = np.arange(len(product)) - np.repeat(starts, np.diff(np.r_[starts, len(product)]))
+        keep = rank < top_k
+
+        for chunk in _chunks([
+            {"product_id": int(p), "rank": int(r), "recommended_id": int(o), "score": float(s)}
+            for p, r, o, s in zip(product[keep], rank[keep], other[keep], score[keep])
+        ]):
+            db.execute(ProductRecommendation.__table__.insert(), chunk)
+
+
+def refresh_recommendations(full: bool = False) -> int:
+    """
+    Fold orders placed since the last run into the counts and refresh the
+    affected top-K lists (`full`: recount everything from scratch).
+    Returns the number of products whose lists were rewritten.
+    """
+    batch_size = settings.RECOMMENDATION_BATCH_ORDERS
+    # Leave the newest orders for the next run: a transaction still in flight could commit a lower id
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.RECOMMENDATION_ORDER_LAG_SECONDS)
+
+    db = SessionLocal()
+    try:
+        # Locked until commit: runs never fold the same orders twice
+        watermark = lock_version(db, WATERMARK)
+        if full:
+            for model in (ProductPairCount, ProductPopularity, ProductRecommendation):
+                db.execute(delete(model), execution_options={"synchronize_session": False})
+            watermark.version = 0
+
+        last_id = watermark.version
+        touched: Set[int] = set()
+        while True:
+            order_ids = db.execute(
+                select(Order.id)
+                .where(Order.id > last_id, Order.created_at < cutoff, Order.status != OrderStatus.CANCELLED)
+                .order_by(Order.id)
+                .limit(batch_size)
+            ).scalars().all()
+            if not order_ids:
+                break
+            touched |= _fold_orders(db, order_ids)
+            last_id = order_ids[-1]
+
+        if full:
+            touched = set(db.execute(select(ProductPopularity.product_id)).scalars().all())
+        _rebuild_top_k(db, list(touched))
+        watermark.version = last_id
+        db.commit()
+        return len(touched)
+    finally:
+        db.close()
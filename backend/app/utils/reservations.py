@@ -0,0 +1,86 @@
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional
+from sqlalchemy import select, update, func
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal, ids_match
+from app.models.reservation import Reservation, ReservationStatus
+
+
+def generate_reservation_token() -> str:
+    """Generate a random token identifying one group of holds"""
+    return secrets.token_urlsafe(24)
+
+
+def reservation_expiry() -> datetime:
+    """Expiry timestamp for a hold placed now"""
+    return datetime.now(timezone.utc) + timedelta(minutes=settings.RESERVATION_TTL_MINUTES)
+
+
+def held_quantities(db: Session, product_ids: Optional[Iterable[int]] = None, exclude_token: Optional[str] = None) -> Dict[int, int]:
+    """
+    Sum of active, unexpired holds per product.
+    Served from the partial index on active reservations, so it never
+    touches converted/expired history rows.
+    """
+    query = (
+        select(Reservation.product_id, func.sum(Reservation.quantity))
+        .where(
+            Reservation.status == ReservationStatus.ACTIVE,
+            Reservation.expires_at > datetime.now(timezone.utc)
+        )
+        .group_by(Reservation.product_id)
+    )
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        if not product_ids:
+            return {}
+        query = query.where(ids_match(Reservation.product_id, product_ids))
+    if exclude_token:
+        query = query.where(Reservation.token != exclude_token)
+
+    return {product_id: int(total or 0) for product_id, total in db.execute(query)}
+
+
+def available_stock(stock: int, held: int) -> int:
+    """Stock a new buyer can still take: physical stock minus active holds"""
+    return max((stock or 0) - held, 0)
+
+
+def expire_stale_reservations(batch_size: Optional[int] = None) -> int:
+    """
+    Mark expired holds as EXPIRED in batches.
+    Each batch claims its rows with SKIP LOCKED so several workers can
+    sweep concurrently without blocking each other (ignored on SQLite).
+    """
+    batch_size = batch_size or settings.RESERVATION_SWEEP_BATCH_SIZE
+    total = 0
+
+    db = SessionLocal()
+    try:
+        while True:
+            stale_ids = (
+                select(Reservation.id)
+                .where(
+                    Reservation.status == ReservationStatus.ACTIVE,
+                    Reservation.expires_at <= datetime.now(timezone.utc)
+                )
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            result = db.execute(
+                update(Reservation)
+                .where(Reservation.id.in_(stale_ids))
+                .values(status=ReservationStatus.EXPIRED),
+                execution_options={"synchronize_session": False}
+            )
+            db.commit()
+
+            total += result.rowcount
+            if result.rowcount < batch_size:
+                break
+    finally:
+        db.close()
+
+    return total
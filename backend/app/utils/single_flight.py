@@ -0,0 +1,61 @@
+"""
+Request coalescing for hot read resolvers.
+
+Concurrent calls with the same key share one in-flight database fetch:
+the first caller starts it in a worker thread, and every caller awaits the
+same task. Nothing is cached once the fetch completes.
+"""
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run blocking `fn` once per key among concurrent callers"""
+        loop = asyncio.get_running_loop()
+        # Futures belong to one event loop; scope keys by loop
+        scoped = (id(loop), key)
+
+        with self._lock:
+            self.calls += 1
+            task = self._inflight.get(scoped)
+            if task is not None:
+                self.coalesced += 1
+            else:
+                self.executions += 1
+                # The task, not any one caller, owns the fetch: it completes even if
+                # every caller that awaited it is cancelled (e.g. clients disconnecting)
+                task = loop.create_task(asyncio.to_thread(fn))
+                self._inflight[scoped] = task
+                task.add_done_callback(lambda done: self._finished(scoped, done))
+
+        # shield: a caller being cancelled must not cancel the shared fetch
+        return await asyncio.shield(task)
+
+    def _finished(self, scoped: tuple, task: asyncio.Task):
+        with self._lock:
+            if self._inflight.get(scoped) is task:
+                del self._inflight[scoped]
+        if not task.cancelled():
+            # Mark retrieved so a failure nobody awaited doesn't log "exception never retrieved"
+            task.exception()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._inflight),
+            }
+
+
+single_flight = SingleFlight()
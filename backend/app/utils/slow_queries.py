@@ -0,0 +1,161 @@
+"""
+Slow-query log.
+
+Cursor-execute hooks time every statement; anything over
+SLOW_QUERY_THRESHOLD_MS is recorded with the GraphQL operation and resolver
+that issued it and its SQL normalized (literals and parameters redacted).
+A sample of slow SELECTs is re-run under `EXPLAIN (ANALYZE, BUFFERS)` on a
+background thread (Postgres only); literals in its conditions are redacted
+the same way. Entries go to a rotating JSON-lines file
+and an in-memory ring buffer read by the `slowQueries` admin field.
+"""
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional
+from sqlalchemy import event
+from app.config import settings
+
+current_operation: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_operation", default=None)
+current_resolver: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_resolver", default=None)
+# Set on the EXPLAIN thread so its own statements aren't logged
+_explaining: contextvars.ContextVar[bool] = contextvars.ContextVar("explaining", default=False)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<!:):\w+|\?")
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_WHITESPACE = re.compile(r"\s+")
+# Plan lines that quote the statement's values, e.g. "Index Cond: (email = 'a@b.c'::text)"
+_PLAN_CONDITION = re.compile(r"^(\s*(?:->\s*)?(?:[\w-]+ )*(?:Cond|Filter|Key):)(.*)$", re.MULTILINE)
+
+
+def normalize_sql(statement: str) -> str:
+    """Collapse whitespace and replace literals/parameters with `?` (IN lists become a single `?`)"""
+    sql = _STRING_LITERAL.sub("?", statement)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _PLACEHOLDER_LIST.sub("?", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def redact_plan(plan: str) -> str:
+    """Replace string literals anywhere and numbers inside conditions with `?`, keeping costs and timings"""
+    plan = _STRING_LITERAL.sub("?", plan)
+    return _PLAN_CONDITION.sub(lambda m: m.group(1) + _NUMBER_LITERAL.sub("?", m.group(2)), plan)
+
+
+class SlowQueryLog:
+    def __init__(self):
+        self._recent: deque = deque(maxlen=settings.SLOW_QUERY_BUFFER_SIZE)
+        self._lock = threading.Lock()
+        self._explainer = ThreadPoolExecutor(1, thread_name_prefix="explain")
+        self._logger = self._file_logger()
+
+    def _file_logger(self) -> Optional[logging.Logger]:
+        path = settings.SLOW_QUERY_LOG_PATH
+        if not path:
+            return None
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            handler = RotatingFileHandler(
+                path, maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES, backupCount=settings.SLOW_QUERY_LOG_BACKUPS
+            )
+        except OSError as e:
+            # Read-only filesystems (serverless) still get the in-memory buffer
+            print(f"SLOW QUERIES: File log disabled ({e})")
+            return None
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger = logging.getLogger("app.slow_queries")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(handler)
+        return logger
+
+    def record(self, engine, statement: str, parameters: Any, duration_ms: float):
+        entry = {
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(duration_ms, 2),
+            "operation": current_operation.get(),
+            "resolver": current_resolver.get(),
+            "statement": normalize_sql(statement),
+            "explain": None,
+        }
+        with self._lock:
+            self._recent.append(entry)
+
+        if self._should_explain(engine, statement):
+            self._explainer.submit(self._explain_and_write, engine, statement, parameters, entry)
+        else:
+            self._write(entry)
+
+    def _should_explain(self, engine, statement: str) -> bool:
+        return (
+            engine.dialect.name == "postgresql"
+            # ANALYZE executes the statement: never for writes
+            and statement.lstrip().upper().startswith(("SELECT", "WITH"))
+            and " FOR UPDATE" not in statement.upper()
+            and random.random() < settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE
+        )
+
+    def _explain_and_write(self, engine, statement: str, parameters: Any, entry: Dict):
+        _explaining.set(True)
+        try:
+            with engine.connect() as connection:
+                with connection.begin() as transaction:
+                    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {settings.SLOW_QUERY_EXPLAIN_TIMEOUT_MS}")
+                    rows = connection.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters).all()
+                    transaction.rollback()
+            with self._lock:
+                entry["explain"] = redact_plan("\n".join(row[0] for row in rows))
+        except Exception as e:
+            with self._lock:
+                entry["explain"] = f"EXPLAIN failed: {type(e).__name__}"
+        self._write(entry)
+
+    def _write(self, entry: Dict):
+        if self._logger is None:
+            return
+        try:
+            self._logger.info(json.dumps(entry, default=str))
+        except Exception as e:
+            print(f"SLOW QUERIES: Failed to write log entry: {e}")
+
+    def recent(self, limit: int) -> List[Dict]:
+        """Newest first"""
+        with self._lock:
+            return [dict(e) for e in list(self._recent)[::-1][:limit]]
+
+
+slow_query_log = SlowQueryLog()
+
+
+def install_slow_query_log(engine):
+    """Attach the timing hooks to `engine`"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._slow_query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _stop_timer(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_slow_query_start", None)
+        if started is None:
+            return
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms < settings.SLOW_QUERY_THRESHOLD_MS or _explaining.get():
+            return
+        try:
+            slow_query_log.record(conn.engine, statement, None if executemany else parameters, duration_ms)
+        except Exception as e:
+            print(f"SLOW QUERIES: Failed to record statement: {e}")
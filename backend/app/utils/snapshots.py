@@ -0,0 +1,221 @@
+"""
+Static catalog snapshots.
+
+A background job renders the active catalog as JSON pages (all products and
+one set per category), each stored plain, gzip- and brotli-compressed, under
+CATALOG_SNAPSHOT_DIR/v<catalog version>-<build time>/. A `current` file names
+the live build, so a new build is swapped in atomically and readers never see a
+half-written one. The files can be served by the `/catalog/...` route or
+straight from disk by a CDN / nginx (`gzip_static`, `brotli_static`):
+anonymous browsing then needs neither the database nor the resolvers.
+
+Builds are queued by every catalog change (app/utils/catalog_changes.py) and
+refreshed periodically so stock counts don't drift far. CATALOG_SNAPSHOT_DIR
+must be writable storage shared by every server; on Vercel, whose bundle is
+read-only and per instance, nothing is built until it is configured.
+
+Each encoding of a file has its own strong ETag (the content hash plus the
+encoding), since the bytes sent differ.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+
+ALL = "all"
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+# Short shared caching; ETags make revalidation cheap after that
+SNAPSHOT_CACHE_CONTROL = "public, max-age=60, stale-while-revalidate=300"
+
+_DEFAULT_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "static", "catalog")
+
+
+def snapshot_dir() -> str:
+    return os.path.realpath(settings.CATALOG_SNAPSHOT_DIR or _DEFAULT_DIR)
+
+
+def _brotli():
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+def _product_json(p) -> Dict:
+    """Same shape as the storefront's products query, minus inline images once variants exist"""
+    from app.graphql.queries import _images_from_model
+    from app.graphql.types import ProductCategory, ProductSize
+
+    images = _images_from_model(p)
+    return {
+        "id": p.id,
+        "title": p.title,
+        "description": p.description,
+        "price": p.price,
+        "category": ProductCategory[p.category.name].name,
+        "gradient": p.gradient,
+        "size": ProductSize(p.size.value).name if p.size else None,
+        "stock": p.stock,
+        "imageUrl": None if images else p.image_url,
+        "images": {
+            "webp": images.srcset("webp"),
+            "jpeg": images.srcset("jpeg"),
+            "card": images.url("card", "jpeg"),
+            "thumb": images.url("thumb", "webp"),
+        } if images else None,
+    }
+
+
+def _write(path: str, body: bytes, brotli) -> str:
+    """Write `body` plus its compressed copies; returns the ETag"""
+    with open(path, "wb") as f:
+        f.write(body)
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(body, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(body, quality=11))
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def _current_build() -> Optional[str]:
+    try:
+        with open(os.path.join(snapshot_dir(), "current")) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def current_version() -> Optional[int]:
+    """Catalog version of the live build"""
+    build = _current_build()
+    try:
+        return int(build[1:].split("-")[0]) if build else None
+    except ValueError:
+        return None
+
+
+def build_catalog_snapshots(force: bool = False) -> Optional[int]:
+    """
+    Render the active catalog for the current catalog version. Skipped when
+    that version is already live, unless `force` (refreshes stock counts).
+    Returns the version built, or None when skipped.
+    """
+    from app.database import SessionLocal
+    from app.models import Product
+    from app.utils.catalog_changes import catalog_changes_since
+
+    if os.getenv("VERCEL") and not settings.CATALOG_SNAPSHOT_DIR:
+        print("SNAPSHOTS: Skipped; set CATALOG_SNAPSHOT_DIR to shared writable storage to build on Vercel")
+        return None
+
+    db = SessionLocal()
+    try:
+        # Read the version first: changes committed after it just trigger another build
+        version, _ = catalog_changes_since(db, None)
+        if not force and current_version() == version:
+            return None
+        products = (
+            db.query(Product)
+            .filter(Product.is_active == 1)
+            .order_by(Product.id)
+            .all()
+        )
+        items = [(p.category.name.lower(), _product_json(p)) for p in products]
+    finally:
+        db.close()
+
+    root = snapshot_dir()
+    os.makedirs(root, exist_ok=True)
+    build = os.path.join(root, f".build-{version}-{os.getpid()}")
+    shutil.rmtree(build, ignore_errors=True)
+    brotli = _brotli()
+    page_size = settings.CATALOG_SNAPSHOT_PAGE_SIZE
+
+    groups: Dict[str, List[Dict]] = {ALL: [item for _, item in items]}
+    for category, item in items:
+        groups.setdefault(category, []).append(item)
+
+    generated_at = datetime.now(timezone.utc).isoformat()
+    manifest = {"version": version, "generated_at": generated_at, "page_size": page_size, "categories": {}}
+    etags: Dict[str, str] = {}
+    for group, group_items in groups.items():
+        os.makedirs(os.path.join(build, group))
+        pages = max(1, -(-len(group_items) // page_size))
+        for page in range(1, pages + 1):
+            body = json.dumps({
+                "version": version,
+                "category": group,
+                "page": page,
+                "pages": pages,
+                "total": len(group_items),
+                "products": group_items[(page - 1) * page_size:page * page_size],
+            }, separators=(",", ":")).encode()
+            name = f"{group}/page-{page}.json"
+            etags[name] = _write(os.path.join(build, name), body, brotli)
+        manifest["categories"][group] = {"total": len(group_items), "pages": pages}
+
+    etags["manifest.json"] = _write(
+        os.path.join(build, "manifest.json"), json.dumps(manifest, separators=(",", ":")).encode(), brotli
+    )
+    with open(os.path.join(build, "etags.json"), "w") as f:
+        json.dump(etags, f)
+
+    # Swap the new build in, then drop all but the previous one (it may still be read)
+    name = f"v{version}-{int(time.time() * 1000)}"
+    os.replace(build, os.path.join(root, name))
+    pointer = os.path.join(root, f".current-{os.getpid()}")
+    with open(pointer, "w") as f:
+        f.write(name)
+    previous = _current_build()
+    os.replace(pointer, os.path.join(root, "current"))
+    for entry in os.listdir(root):
+        if entry.startswith("v") and entry not in (name, previous):
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+
+    if brotli is None:
+        print("SNAPSHOTS: brotli not installed, wrote gzip copies only")
+    return version
+
+
+def snapshot_file(path: str, accept_encoding: str) -> Optional[Tuple[str, str, Optional[str]]]:
+    """
+    (file path, ETag, Content-Encoding) of a snapshot file in the live build,
+    picking the best encoding the client accepts; None if it doesn't exist.
+    The ETag is specific to the encoding chosen.
+    """
+    current = _current_build()
+    if current is None:
+        return None
+    build = os.path.join(snapshot_dir(), current)
+    try:
+        with open(os.path.join(build, "etags.json")) as f:
+            etag = json.load(f).get(path)
+    except (OSError, ValueError):
+        return None
+    if etag is None:
+        return None
+
+    accepted = {part.split(";")[0].strip() for part in accept_encoding.split(",")}
+    for encoding, suffix in ENCODINGS.items():
+        candidate = os.path.join(build, path + suffix)
+        if encoding in accepted and os.path.exists(candidate):
+            return candidate, f'{etag[:-1]}-{encoding}"', encoding
+    return os.path.join(build, path), etag, None
+
+
+def enqueue_catalog_snapshots(version: int, db=None):
+    """Queue a rebuild for `version`, shortly delayed so bursts of edits share one build"""
+    from app.utils.jobs import enqueue
+    enqueue(
+        "build_catalog_snapshots", {},
+        delay_seconds=settings.CATALOG_SNAPSHOT_DELAY_SECONDS,
+        dedupe_key=f"catalog_snapshots@{version}",
+        db=db
+    )
@@ -0,0 +1,98 @@
+"""
+Planning time saved by server-side prepared statements.
+
+Runs the hottest read statements (product by id, products by category,
+user by email, orders by user) against the configured Postgres database:
+
+1. `EXPLAIN (ANALYZE, SUMMARY)` reports the planning time Postgres spends on
+   each statement; a prepared statement on its cached plan skips it.
+2. Each statement is timed over many executions on one connection with
+   psycopg 3 prepares off and on (prepare from the first execution).
+
+    cd backend && DATABASE_URL=postgresql+psycopg://... python -m app.utils.statement_bench [executions]
+
+Needs psycopg 3 and a database with some catalog, users and orders (`python -m app.seed`).
+"""
+import json
+import statistics
+import sys
+import time
+from typing import Dict, List
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.pool import NullPool
+from app.database import engine
+from app.models import Product, User, Order
+
+
+def hot_statements() -> Dict[str, object]:
+    """The hot queries, with parameters taken from existing rows"""
+    with engine.connect() as connection:
+        product = connection.execute(select(Product.id, Product.category).limit(1)).first()
+        user = connection.execute(
+            select(User.id, User.email).join(Order, Order.user_id == User.id).limit(1)
+        ).first()
+    if product is None or user is None:
+        raise SystemExit("BENCH: needs at least one product and one user with an order")
+
+    return {
+        "product by id": select(Product).where(Product.id == product.id),
+        "products by category": (
+            select(Product)
+            .where(Product.is_active == 1, Product.category == product.category)
+            .order_by(Product.created_at.desc())
+            .limit(100)
+        ),
+        "user by email": select(User).where(User.email == user.email),
+        "orders by user": select(Order).where(Order.user_id == user.id).order_by(Order.created_at.desc()),
+    }
+
+
+def planning_ms(statement, samples: int = 20) -> float:
+    """Median planning time Postgres reports for `statement`"""
+    sql = str(statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    times: List[float] = []
+    with engine.connect() as connection:
+        for _ in range(samples):
+            plan = connection.execute(text(f"EXPLAIN (ANALYZE, SUMMARY, FORMAT JSON) {sql}")).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            times.append(plan[0]["Planning Time"])
+    return statistics.median(times)
+
+
+def execution_us(prepare_threshold, statement, executions: int) -> float:
+    """Mean wall-clock microseconds per execution on one connection"""
+    bench_engine = create_engine(
+        engine.url, poolclass=NullPool, connect_args={"prepare_threshold": prepare_threshold}
+    )
+    try:
+        with bench_engine.connect() as connection:
+            connection.execute(statement).all()  # warm the connection and the compiled cache
+            start = time.perf_counter()
+            for _ in range(executions):
+                connection.execute(statement).all()
+            return (time.perf_counter() - start) / executions * 1e6
+    finally:
+        bench_engine.dispose()
+
+
+def main():
+    if engine.dialect.name != "postgresql" or engine.dialect.driver != "psycopg":
+        raise SystemExit(f"BENCH: needs Postgres through psycopg 3 (got {engine.dialect.name}+{engine.dialect.driver})")
+    executions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    total_saved = 0.0
+    for name, statement in hot_statements().items():
+        planning = planning_ms(statement)
+        unprepared = execution_us(None, statement, executions)
+        prepared = execution_us(0, statement, executions)
+        total_saved += unprepared - prepared
+        print(
+            f"BENCH: {name:<22} planning {planning * 1000:7.1f}us | "
+            f"unprepared {unprepared:7.1f}us  prepared {prepared:7.1f}us  saved {unprepared - prepared:7.1f}us/exec"
+        )
+    print(f"BENCH: {executions} executions each; {total_saved:.1f}us saved per round of all statements")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Inventory velocity and low-stock forecasting.
+
+A periodic job loads per-product daily unit sales for the last
+STOCK_FORECAST_WINDOW_DAYS complete days (one grouped query), lays them out as
+a products x days NumPy matrix and computes, for the whole catalog at once:
+
+    velocity = max(average over the window, average over the last STOCK_FORECAST_RECENT_DAYS)
+    days_until_stockout = available stock / velocity
+
+Taking the higher average keeps a sudden run on a product from being smoothed
+away by a quiet month. Results are rewritten into `stock_forecasts`, which
+`lowStockProducts` and `Product.stockForecast` read.
+"""
+from datetime import date, datetime, time, timedelta, timezone
+from sqlalchemy import select, delete, func
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Order, OrderItem, Product, StockForecast
+from app.models.order import OrderStatus
+from app.utils.reservations import held_quantities
+
+_WRITE_CHUNK = 1000  # rows per multi-row INSERT (SQLite caps bound parameters)
+
+
+def _as_date(value) -> date:
+    """SQLite's date() returns text, Postgres a date"""
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def _utc_day(db, column):
+    """Calendar day of a timestamp in UTC; Postgres' date() would use the session time zone"""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date(func.timezone("UTC", column))
+    return func.date(column)  # SQLite stores UTC timestamps
+
+
+def forecast_stockouts(daily, available, recent_days: int):
+    """
+    Vectorized forecast. `daily` is a products x days matrix of units sold
+    (oldest day first), `available` the current stock per product. Returns
+    (velocity, daily average, recent average, days until stockout); days are
+    NaN where nothing sold and 0 where nothing is available.
+    """
+    import numpy as np
+
+    window = daily.shape[1]
+    recent_days = min(recent_days, window)
+    daily_average = daily.sum(axis=1) / window
+    recent_average = daily[:, window - recent_days:].sum(axis=1) / recent_days
+    velocity = np.maximum(daily_average, recent_average)
+
+    available = np.maximum(available, 0).astype(np.float64)
+    days = np.full(len(available), np.nan)
+    selling = velocity > 0
+    days[selling] = available[selling] / velocity[selling]
+    days[available == 0] = 0.0
+    return velocity, daily_average, recent_average, days
+
+
+def refresh_stock_forecasts() -> int:
+    """Recompute the forecasts of all active products; returns how many were written"""
+    import numpy as np
+
+    window = settings.STOCK_FORECAST_WINDOW_DAYS
+    today = datetime.now(timezone.utc).date()
+    first_day = today - timedelta(days=window)
+    start = datetime.combine(first_day, time.min, tzinfo=timezone.utc)
+    end = datetime.combine(today, time.min, tzinfo=timezone.utc)  # today is incomplete, leave it out
+
+    db = SessionLocal()
+    try:
+        products = db.execute(
+            select(Product.id, Product.stock).where(Product.is_active == 1).order_by(Product.id)
+        ).all()
+        product_ids = np.array([p.id for p in products], dtype=np.int64)
+        held = held_quantities(db, product_ids.tolist())
+        available = np.array([p.stock - held.get(p.id, 0) for p in products], dtype=np.int64)
+
+        # created_at bounds prune order partitions on Postgres
+        day = _utc_day(db, Order.created_at)
+        sales = db.execute(
+            select(OrderItem.product_id, day, func.sum(OrderItem.quantity))
+            .join(Order, Order.id == OrderItem.order_id)
+            .where(
+                Order.created_at >= start,
+                Order.created_at < end,
+                Order.status != OrderStatus.CANCELLED,
+                OrderItem.product_id.isnot(None)
+            )
+            .group_by(OrderItem.product_id, day)
+        ).all()
+
+        daily = np.zeros((len(product_ids), window))
+        if sales and len(product_ids):
+            sold_ids = np.array([s[0] for s in sales], dtype=np.int64)
+            offsets = np.array([(_as_date(s[1]) - first_day).days for s in sales], dtype=np.int64)
+            units = np.array([s[2] for s in sales], dtype=np.float64)
+            rows = np.minimum(np.searchsorted(product_ids, sold_ids), len(product_ids) - 1)
+            # Inactive/deleted products and dates outside the window (timezone edges) are dropped
+            keep = (product_ids[rows] == sold_ids) & (offsets >= 0) & (offsets < window)
+            np.add.at(daily, (rows[keep], offsets[keep]), units[keep])
+
+        velocity, daily_average, recent_average, days = forecast_stockouts(
+            daily, available, settings.STOCK_FORECAST_RECENT_DAYS
+        )
+
+        now = datetime.now(timezone.utc)
+        values = [
+            {
+                "product_id": int(product_ids[i]),
+                "velocity": float(velocity[i]),
+                "daily_average": float(daily_average[i]),
+                "recent_average": float(recent_average[i]),
+                "available_stock": int(available[i]),
+                "days_until_stockout": None if np.isnan(days[i]) else float(days[i]),
+                "computed_at": now,
+            }
+            for i in range(len(product_ids))
+        ]
+        # Swapped in one transaction: readers see the old set or the new one
+        db.execute(delete(StockForecast), execution_options={"synchronize_session": False})
+        for i in range(0, len(values), _WRITE_CHUNK):
+            db.execute(StockForecast.__table__.insert(), values[i:i + _WRITE_CHUNK])
+        db.commit()
+        return len(values)
+    finally:
+        db.close()
@@ -0,0 +1,121 @@
+"""
+Trending and best-selling products.
+
+A periodic job folds orders placed since its last run into `trending_scores`,
+so `trendingProducts` / `bestSellers` read one indexed table instead of
+aggregating order_items per request.
+
+Trending scores decay exponentially with age (time constant TRENDING_DECAY_HOURS).
+They are kept forward-decayed: a sale adds quantity * exp((sold_at - landmark) / tau)
+and is never rescaled afterwards, because the common factor exp(-(now - landmark) / tau)
+doesn't change the ranking. Once that weight would grow too large the job
+rebases every row onto a new landmark, in the same transaction.
+"""
+import math
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Order, OrderItem, TrendingScore
+from app.models.order import OrderStatus
+from app.utils.customer_stats import _upsert
+from app.utils.invalidation import lock_version
+
+# cache_versions rows: highest order id folded in, and the decay landmark (unix seconds)
+WATERMARK = "trending_order_watermark"
+LANDMARK = "trending_landmark"
+
+# Rebase once weights reach e^40 (~2e17): well inside float64, still exact enough for ranking
+_MAX_EXPONENT = 40.0
+_WRITE_CHUNK = 1000  # rows per multi-row INSERT (SQLite caps bound parameters)
+
+
+def _epoch(value: datetime) -> float:
+    """Unix seconds; SQLite hands back naive datetimes, which are UTC here"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _fold_orders(db: Session, order_ids, landmark: float, tau: float):
+    """Add these orders' lines to the scores"""
+    import numpy as np
+
+    rows = db.execute(
+        select(OrderItem.product_id, OrderItem.quantity, Order.created_at)
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(OrderItem.order_id.in_(order_ids), OrderItem.product_id.isnot(None))
+    ).all()
+    if not rows:
+        return
+
+    product_ids, product_idx = np.unique(np.array([r[0] for r in rows], dtype=np.int64), return_inverse=True)
+    quantity = np.array([r[1] for r in rows], dtype=np.float64)
+    sold_at = np.array([_epoch(r[2]) for r in rows], dtype=np.float64)
+
+    weight = quantity * np.exp((sold_at - landmark) / tau)
+    scores = np.bincount(product_idx, weights=weight, minlength=len(product_ids))
+    units = np.bincount(product_idx, weights=quantity, minlength=len(product_ids))
+
+    insert = _upsert()
+    statement = insert(TrendingScore)
+    statement = statement.on_conflict_do_update(
+        index_elements=[TrendingScore.product_id],
+        set_={
+            "score": TrendingScore.score + statement.excluded.score,
+            "units_sold": TrendingScore.units_sold + statement.excluded.units_sold,
+            "updated_at": statement.excluded.updated_at,
+        }
+    )
+    now = datetime.now(timezone.utc)
+    values = [
+        {"product_id": int(p), "score": float(s), "units_sold": int(u), "updated_at": now}
+        for p, s, u in zip(product_ids, scores, units)
+    ]
+    for i in range(0, len(values), _WRITE_CHUNK):
+        db.execute(statement, values[i:i + _WRITE_CHUNK])
+
+
+def refresh_trending() -> int:
+    """Fold orders placed since the last run into the scores; returns how many orders were folded"""
+    tau = settings.TRENDING_DECAY_HOURS * 3600.0
+    now = datetime.now(timezone.utc)
+    # Leave the newest orders for the next run: a transaction still in flight could commit a lower id
+    cutoff = now - timedelta(seconds=settings.TRENDING_ORDER_LAG_SECONDS)
+
+    db = SessionLocal()
+    try:
+        # Locked until commit: runs never fold the same orders twice
+        watermark = lock_version(db, WATERMARK)
+        landmark = lock_version(db, LANDMARK)
+        if landmark.version == 0:
+            landmark.version = int(now.timestamp())
+        elif (now.timestamp() - landmark.version) / tau > _MAX_EXPONENT:
+            factor = math.exp((landmark.version - now.timestamp()) / tau)
+            db.execute(
+                update(TrendingScore).values(score=TrendingScore.score * factor),
+                execution_options={"synchronize_session": False}
+            )
+            landmark.version = int(now.timestamp())
+
+        last_id = watermark.version
+        folded = 0
+        while True:
+            order_ids = db.execute(
+                select(Order.id)
+                .where(Order.id > last_id, Order.created_at < cutoff, Order.status != OrderStatus.CANCELLED)
+                .order_by(Order.id)
+                .limit(settings.TRENDING_BATCH_ORDERS)
+            ).scalars().all()
+            if not order_ids:
+                break
+            _fold_orders(db, order_ids, float(landmark.version), tau)
+            last_id = order_ids[-1]
+            folded += len(order_ids)
+
+        watermark.version = last_id
+        db.commit()
+        return folded
+    finally:
+        db.close()
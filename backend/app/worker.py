@@ -0,0 +1,26 @@
+"""
+Standalone job worker:
+
+    cd backend && python -m app.worker
+
+Any number of workers (and API processes with JOBS_RUN_IN_PROCESS) can run
+against the same database.
+"""
+import asyncio
+from app.database import engine, Base
+from app.models import Job  # noqa: F401  ensures the jobs table is created
+from app.utils.jobs import Worker
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    worker = Worker()
+    print(f"JOBS: Worker {worker.worker_id} started (concurrency={worker.concurrency})")
+    try:
+        asyncio.run(worker.run())
+    except KeyboardInterrupt:
+        print("JOBS: Worker stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+"""
+The tests write data: they run against TEST_DATABASE_URL, or a fresh SQLite
+file, never the configured DATABASE_URL. Set before `app` is imported.
+"""
+import os
+import tempfile
+
+os.environ.pop("POSTGRES_URL", None)
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL") or (
+    "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="shop-tests-"), "test.sqlite")
+)
+
+pytest_plugins = ["tests.query_budgets"]
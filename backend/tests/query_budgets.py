@@ -0,0 +1,401 @@
+"""
+SQL query budgets for every Query and Mutation field.
+
+`record_queries()` captures every statement (and the rows fetched) issued
+while it is active, including from worker threads and DataLoader tasks
+started inside it. `query_budget()` fails when a block goes over a declared
+statement/row count, and `BUDGETS` declares one for every Query and
+Mutation field so N+1 regressions show up as failing tests. This module is a
+pytest plugin (tests/conftest.py loads it) providing the `budget_fixtures`
+and `sql_budget` fixtures:
+
+    def test_products(sql_budget):
+        sql_budget("{ products { id } }", statements=2, rows=100)
+
+It also runs standalone:
+
+    cd backend && DATABASE_URL=sqlite:////tmp/budget.db python -m tests.query_budgets
+
+Run against a scratch database: the mutation budgets write data.
+"""
+import asyncio
+import contextvars
+import sys
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import pytest
+from sqlalchemy import event
+
+
+@dataclass
+class QueryStats:
+    statements: List[str] = field(default_factory=list)
+    parameters: List[Any] = field(default_factory=list)
+    rows: int = 0
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+_recorder: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar("query_recorder", default=None)
+_installed = set()
+
+
+class _CountingCursor:
+    """DBAPI cursor proxy counting fetched rows into a QueryStats"""
+
+    def __init__(self, cursor, stats: QueryStats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._stats.rows += 1
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def _install(engine):
+    if id(engine) in _installed:
+        return
+    _installed.add(id(engine))
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        stats = _recorder.get()
+        if stats is None:
+            return
+        stats.statements.append(statement)
+        stats.parameters.append(parameters)
+        # Result rows are fetched after this hook through context.cursor
+        if context is not None and cursor.description is not None:
+            context.cursor = _CountingCursor(cursor, stats)
+
+
+@contextmanager
+def record_queries(engine=None) -> Iterator[QueryStats]:
+    """Collect the SQL issued inside the block"""
+    if engine is None:
+        from app.database import engine
+    _install(engine)
+    stats = QueryStats()
+    token = _recorder.set(stats)
+    try:
+        yield stats
+    finally:
+        _recorder.reset(token)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(statements: int, rows: Optional[int] = None, label: str = "block") -> Iterator[QueryStats]:
+    """Fail if the block issues more than `statements` statements or fetches more than `rows` rows"""
+    with record_queries() as stats:
+        yield stats
+    problems = []
+    if stats.count > statements:
+        problems.append(f"{stats.count} statements (budget {statements})")
+    if rows is not None and stats.rows > rows:
+        problems.append(f"{stats.rows} rows fetched (budget {rows})")
+    if problems:
+        listing = "\n".join(f"  {i + 1}. {' '.join(s.split())[:200]}" for i, s in enumerate(stats.statements))
+        raise QueryBudgetExceeded(f"{label}: {', '.join(problems)}\n{listing}")
+
+
+def execute_with_budget(
+    operation: str,
+    variables: Optional[Dict[str, Any]] = None,
+    statements: int = 1,
+    rows: Optional[int] = None,
+    label: Optional[str] = None,
+):
+    """Run a GraphQL operation against `schema` within a budget; GraphQL errors fail too"""
+    from app.graphql.schema import schema
+    from app.utils.cache import invalidate_tag
+
+    invalidate_tag("catalog")  # measure cold reads, not cache hits
+    with query_budget(statements, rows, label or operation.split("{")[0].strip() or "operation"):
+        result = asyncio.run(schema.execute(operation, variable_values=variables, context_value={}))
+    if result.errors:
+        raise AssertionError(f"{label or operation}: {result.errors}")
+    return result
+
+
+@dataclass
+class Budget:
+    operation: str
+    statements: int
+    rows: Optional[int] = None
+    # Builds the variables (and any rows the operation needs) outside the measured block
+    setup: Callable[[Dict[str, Any]], Dict[str, Any]] = lambda fx: {}
+
+
+def _gql(operation: str, variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Unmeasured helper for fixture setup"""
+    from app.graphql.schema import schema
+    result = asyncio.run(schema.execute(operation, variable_values=variables, context_value={}))
+    if result.errors:
+        raise RuntimeError(result.errors)
+    return result.data
+
+
+def _new_user(fx: Dict[str, Any]) -> Dict[str, Any]:
+    suffix = uuid.uuid4().hex[:8]
+    data = _gql(
+        "mutation($i: UserInput!) { register(input: $i) { user { id email } } }",
+        {"i": {"email": f"budget-{suffix}@example.com", "username": f"budget-{suffix}", "password": "budget-pass"}},
+    )
+    return data["register"]["user"]
+
+
+def _new_product(fx: Dict[str, Any]) -> int:
+    data = _gql(
+        "mutation($i: ProductInput!) { createProduct(input: $i) { id } }",
+        {"i": {"title": f"Budget {uuid.uuid4().hex[:6]}", "price": 10, "category": "CLOTHES", "stock": 100}},
+    )
+    return data["createProduct"]["id"]
+
+
+def _new_order(fx: Dict[str, Any]) -> int:
+    data = _gql(
+        "mutation($u: Int!, $i: OrderInput!) { createOrder(userId: $u, input: $i) { id } }",
+        {"u": fx["user_id"], "i": {"shippingAddress": "Budget St 1", "items": [{"productId": fx["product_ids"][0], "quantity": 1}]}},
+    )
+    return data["createOrder"]["id"]
+
+
+def _verification_token(user_id: int) -> str:
+    """Issue a fresh token (only hashes are stored, so the one from register can't be read back)"""
+    from app.database import SessionLocal
+    from app.utils.email_tokens import issue_verification_token
+    db = SessionLocal()
+    try:
+        token = issue_verification_token(db, user_id)
+        db.commit()
+        return token
+    finally:
+        db.close()
+
+
+def _product_input(fx) -> Dict[str, Any]:
+    return {"title": "Budget Product", "price": 42.0, "category": "SHOES", "size": "LARGE", "stock": 5}
+
+
+ORDER_FIELDS = "id status totalAmount itemCount items { id title quantity price }"
+
+# Statement / row budgets per root field. Rows assume the fixture data from
+# prepare_fixtures() (seeded catalog, a handful of users and orders).
+BUDGETS: Dict[str, Budget] = {
+    # Query
+    "products": Budget("{ products(limit: 50) { id title price availableStock images { srcset } } }", 2, 60),
+    "product": Budget(
+        "query($id: Int!) { product(id: $id) { id title availableStock } }", 2, 2,
+        lambda fx: {"id": fx["product_ids"][0]},
+    ),
+    "recommendedProducts": Budget(
+        "query($id: Int!) { recommendedProducts(productId: $id, first: 8) { id title availableStock } }", 2, 8,
+        lambda fx: {"id": fx["product_ids"][0]},
+    ),
+    "trendingProducts": Budget(
+        "{ trendingProducts(first: 8) { id title availableStock } }", 2, 8,
+    ),
+    "bestSellers": Budget(
+        "{ bestSellers(category: SHOES, first: 8) { id title availableStock } }", 2, 8,
+    ),
+    "lowStockProducts": Budget(
+        "{ lowStockProducts(thresholdDays: 30) { id title stock stockForecast { velocity daysUntilStockout } } }", 2, 50,
+    ),
+    "productFacets": Budget(
+        "{ productFacets { total inStock categories { category count } sizes { size count } priceBuckets { count } } }", 2, 41,
+    ),
+    "user": Budget("query($id: Int!) { user(id: $id) { id email } }", 1, 1, lambda fx: {"id": fx["user_id"]}),
+    "myOrders": Budget(
+        f"query($u: Int!) {{ myOrders(userId: $u) {{ {ORDER_FIELDS} }} }}", 2, 50,
+        lambda fx: {"u": fx["user_id"]},
+    ),
+    "myOrdersDelta": Budget(
+        f"query($u: Int!) {{ myOrdersDelta(userId: $u) {{ watermark cancelledOrderIds orders {{ {ORDER_FIELDS} }} }} }}", 2, 50,
+        lambda fx: {"u": fx["user_id"]},
+    ),
+    "allOrders": Budget(f"{{ allOrders {{ {ORDER_FIELDS} }} }}", 2, 200),
+    "allUsers": Budget("{ allUsers { id email } }", 1, 100),
+    "customers": Budget("{ customers(limit: 20) { total items { id orderCount totalSpent } } }", 2, 21),
+    "catalogChanges": Budget("{ catalogChanges { version fullResync products { id title } deletedIds } }", 3, 62),
+    "catalogVersion": Budget("{ catalogVersion }", 1, 10),
+    "slowQueries": Budget("{ slowQueries(limit: 5) { statement } }", 0, 0),
+    # Mutation
+    "register": Budget(
+        "mutation($i: UserInput!) { register(input: $i) { accessToken user { id } } }", 8, 4,
+        lambda fx: {"i": {"email": f"reg-{uuid.uuid4().hex[:8]}@example.com", "username": f"reg-{uuid.uuid4().hex[:8]}", "password": "budget-pass"}},
+    ),
+    "login": Budget(
+        "mutation($i: LoginInput!) { login(input: $i) { accessToken } }", 1, 1,
+        lambda fx: {"i": {"email": fx["user_email"], "password": "budget-pass"}},
+    ),
+    "createProduct": Budget(
+        "mutation($i: ProductInput!) { createProduct(input: $i) { id } }", 7, 4,
+        lambda fx: {"i": _product_input(fx)},
+    ),
+    "updateProduct": Budget(
+        "mutation($id: Int!, $i: ProductInput!) { updateProduct(productId: $id, input: $i) { id } }", 8, 4,
+        lambda fx: {"id": _new_product(fx), "i": _product_input(fx)},
+    ),
+    "deleteProduct": Budget(
+        "mutation($id: Int!) { deleteProduct(productId: $id) }", 7, 3,
+        lambda fx: {"id": _new_product(fx)},
+    ),
+    "reserveItems": Budget(
+        "mutation($u: Int!, $items: [OrderItemInput!]!) { reserveItems(userId: $u, items: $items) { token } }", 5, 5,
+        lambda fx: {"u": fx["user_id"], "items": [{"productId": pid, "quantity": 1} for pid in fx["product_ids"][:3]]},
+    ),
+    "releaseReservation": Budget(
+        "mutation($t: String!) { releaseReservation(token: $t) }", 1, 0,
+        lambda fx: {"t": _gql(
+            "mutation($u: Int!, $items: [OrderItemInput!]!) { reserveItems(userId: $u, items: $items) { token } }",
+            {"u": fx["user_id"], "items": [{"productId": fx["product_ids"][0], "quantity": 1}]},
+        )["reserveItems"]["token"]},
+    ),
+    "createOrder": Budget(
+        f"mutation($u: Int!, $i: OrderInput!) {{ createOrder(userId: $u, input: $i) {{ {ORDER_FIELDS} }} }}", 11, 10,
+        lambda fx: {"u": fx["user_id"], "i": {
+            "shippingAddress": "Budget St 1",
+            "items": [{"productId": pid, "quantity": 1} for pid in fx["product_ids"][:3]],
+        }},
+    ),
+    "updateOrderStatus": Budget(
+        f"mutation($id: Int!) {{ updateOrderStatus(orderId: $id, status: \"shipped\") {{ {ORDER_FIELDS} }} }}", 3, 4,
+        lambda fx: {"id": _new_order(fx)},
+    ),
+    "updateUser": Budget(
+        "mutation($id: Int!) { updateUser(userId: $id, fullName: \"Budget User\") { id } }", 3, 2,
+        lambda fx: {"id": fx["user_id"]},
+    ),
+    "toggleUserStatus": Budget(
+        "mutation($id: Int!) { toggleUserStatus(userId: $id) { id isActive } }", 3, 2,
+        lambda fx: {"id": _new_user(fx)["id"]},
+    ),
+    "updateOrderStatuses": Budget(
+        f"mutation($ids: [Int!]!) {{ updateOrderStatuses(ids: $ids, status: \"processing\") {{ {ORDER_FIELDS} }} }}", 1, 6,
+        lambda fx: {"ids": [_new_order(fx) for _ in range(3)]},
+    ),
+    "setProductsActive": Budget(
+        "mutation($ids: [Int!]!) { setProductsActive(ids: $ids, active: true) { id } }", 6, 6,
+        lambda fx: {"ids": fx["product_ids"][:3]},
+    ),
+    "deleteProducts": Budget(
+        "mutation($ids: [Int!]!) { deleteProducts(ids: $ids) }", 6, 6,
+        lambda fx: {"ids": [_new_product(fx) for _ in range(3)]},
+    ),
+    "setUsersActive": Budget(
+        "mutation($ids: [Int!]!) { setUsersActive(ids: $ids, active: true) { id } }", 1, 5,
+        lambda fx: {"ids": [_new_user(fx)["id"] for _ in range(3)]},
+    ),
+    "verifyEmail": Budget(
+        "mutation($t: String!) { verifyEmail(token: $t) { id emailVerified } }", 7, 3,
+        lambda fx: {"t": _verification_token(_new_user(fx)["id"])},
+    ),
+}
+
+
+def root_fields() -> List[str]:
+    """Every Query and Mutation field name in the schema"""
+    from app.graphql.schema import schema
+    graphql_schema = schema._schema
+    return [
+        name
+        for root in (graphql_schema.query_type, graphql_schema.mutation_type)
+        if root is not None
+        for name in root.fields
+    ]
+
+
+def missing_budgets() -> List[str]:
+    return [name for name in root_fields() if name not in BUDGETS]
+
+
+def prepare_fixtures() -> Dict[str, Any]:
+    """Seed the catalog and create a customer with a couple of orders"""
+    from app.database import engine, Base, SessionLocal
+    from app.models import Product
+    from app.seed import seed_products
+    from app.utils.invalidation import bump_version
+
+    Base.metadata.create_all(bind=engine)
+    seed_products()
+    bump_version("catalog")  # budgets measure the steady state, where the version row exists
+    db = SessionLocal()
+    try:
+        product_ids = [p.id for p in db.query(Product).filter(Product.is_active == 1).order_by(Product.id).limit(5)]
+    finally:
+        db.close()
+
+    fx: Dict[str, Any] = {"product_ids": product_ids}
+    user = _new_user(fx)
+    fx.update(user_id=user["id"], user_email=user["email"])
+    for _ in range(2):
+        _new_order(fx)
+    return fx
+
+
+def check_budgets(fields: Optional[List[str]] = None) -> List[str]:
+    """Run the budgets (all, or `fields`) and return the failures"""
+    failures = [f"{name}: no query budget declared" for name in missing_budgets()]
+    fx = prepare_fixtures()
+    for name in fields or BUDGETS:
+        budget = BUDGETS[name]
+        try:
+            variables = budget.setup(fx)
+            execute_with_budget(budget.operation, variables, budget.statements, budget.rows, label=name)
+        except AssertionError as e:
+            failures.append(str(e))
+        except Exception as e:
+            failures.append(f"{name}: setup failed: {e}")
+    return failures
+
+
+@pytest.fixture(scope="session")
+def budget_fixtures() -> Dict[str, Any]:
+    """Seeded catalog plus a customer with orders, shared by the whole session"""
+    return prepare_fixtures()
+
+
+@pytest.fixture
+def sql_budget():
+    """Callable running a GraphQL operation under a statement/row budget"""
+    return execute_with_budget
+
+
+def main():
+    failures = check_budgets(sys.argv[1:] or None)
+    for failure in failures:
+        print(f"BUDGET: {failure}")
+    print(f"BUDGET: {len(BUDGETS)} budgets checked, {len(failures)} failures")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
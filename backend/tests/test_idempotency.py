@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+import json
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from app.database import SessionLocal
+from app.graphql.schema import schema
+from app.graphql.types import OrderInput, OrderItemInput
+from app.models import Order, IdempotencyKey
+from app.models.idempotency import IdempotencyStatus
+from app.utils.idempotency import request_fingerprint
+
+CREATE_ORDER = """
+mutation($u: Int!, $i: OrderInput!, $k: String) {
+    createOrder(userId: $u, input: $i, idempotencyKey: $k) { id totalAmount }
+}
+"""
+
+
+def _create_order(fx, key, quantity=1):
+    result = asyncio.run(schema.execute(CREATE_ORDER, variable_values={
+        "u": fx["user_id"],
+        "k": key,
+        "i": {"shippingAddress": "Idem St 1", "items": [{"productId": fx["product_ids"][0], "quantity": quantity}]},
+    }, context_value={}))
+    return result
+
+
+def _order_count(user_id):
+    db = SessionLocal()
+    try:
+        return db.query(Order).filter(Order.user_id == user_id).count()
+    finally:
+        db.close()
+
+
+def test_replay_returns_the_first_order(budget_fixtures):
+    key = uuid.uuid4().hex
+    before = _order_count(budget_fixtures["user_id"])
+    first = _create_order(budget_fixtures, key)
+    second = _create_order(budget_fixtures, key)
+    assert first.errors is None and second.errors is None
+    assert second.data == first.data
+    assert _order_count(budget_fixtures["user_id"]) == before + 1
+
+
+def test_concurrent_duplicates_create_one_order(budget_fixtures):
+    key = uuid.uuid4().hex
+    before = _order_count(budget_fixtures["user_id"])
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(_create_order(budget_fixtures, key))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(r.errors is None for r in results), [r.errors for r in results]
+    assert len({r.data["createOrder"]["id"] for r in results}) == 1
+    assert _order_count(budget_fixtures["user_id"]) == before + 1
+
+
+def test_key_reuse_with_different_arguments_is_rejected(budget_fixtures):
+    key = uuid.uuid4().hex
+    assert _create_order(budget_fixtures, key).errors is None
+    reused = _create_order(budget_fixtures, key, quantity=2)
+    assert "different request" in str(reused.errors)
+
+
+def test_abandoned_attempt_is_taken_over(budget_fixtures):
+    """A process that died before committing leaves an IN_PROGRESS row; a retry runs once its lease ends"""
+    key = uuid.uuid4().hex
+    before = _order_count(budget_fixtures["user_id"])
+    # Same fingerprint as the retry below, so only the lease decides
+    payload = {
+        "input": OrderInput(
+            shipping_address="Idem St 1",
+            items=[OrderItemInput(product_id=budget_fixtures["product_ids"][0], quantity=1)],
+        ),
+        "user_id": budget_fixtures["user_id"],
+        "reservation_token": None,
+    }
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+    try:
+        db.add(IdempotencyKey(
+            key=key,
+            operation="createOrder",
+            request_hash=request_fingerprint("createOrder", payload),
+            status=IdempotencyStatus.IN_PROGRESS,
+            locked_until=now - timedelta(seconds=1),
+            expires_at=now + timedelta(hours=1),
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+    result = _create_order(budget_fixtures, key)
+    assert result.errors is None
+    assert _order_count(budget_fixtures["user_id"]) == before + 1
+
+
+def test_fingerprint_is_keyed():
+    """Arguments can include a password: nothing crackable may be stored"""
+    plain = hashlib.sha256(json.dumps({"operation": "register", "payload": {"password": "pw"}}, sort_keys=True).encode()).hexdigest()
+    assert request_fingerprint("register", {"password": "pw"}) != plain
@@ -0,0 +1,12 @@
+import pytest
+from tests.query_budgets import BUDGETS, missing_budgets
+
+
+def test_every_root_field_has_a_budget():
+    assert missing_budgets() == []
+
+
+@pytest.mark.parametrize("name", list(BUDGETS))
+def test_query_budget(name, budget_fixtures, sql_budget):
+    budget = BUDGETS[name]
+    sql_budget(budget.operation, budget.setup(budget_fixtures), budget.statements, budget.rows, label=name)
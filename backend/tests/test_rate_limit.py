@@ -0,0 +1,31 @@
+import json
+import pytest
+from app.utils.rate_limit import graphql_operations
+
+
+def _body(query, operation_name=None):
+    return json.dumps({"query": query, "operationName": operation_name}).encode()
+
+
+@pytest.mark.parametrize("query, operation_name, expected", [
+    ("mutation { login(input: {}) { accessToken } }", None, ["login"]),
+    ("mutation { ... on Mutation { login(input: {}) { accessToken } } }", None, ["login"]),
+    ("mutation M { ...F } fragment F on Mutation { login(input: {}) { accessToken } }", "M", ["M", "login"]),
+    ("mutation { ...F } fragment F on Mutation { ... on Mutation { login(input: {}) { accessToken } } }", None, ["login"]),
+    # Each aliased attempt is charged
+    ("mutation { a: login(input: {}) { accessToken } b: login(input: {}) { accessToken } }", None, ["login", "login"]),
+    # An operation named like its field is charged once
+    ("mutation login { login(input: {}) { accessToken } }", "login", ["login"]),
+    # Self-referencing fragments are invalid, but must not hang the limiter
+    ("query { ...F } fragment F on Query { ...F products { id } }", None, ["products"]),
+])
+def test_root_fields_behind_fragments_are_charged(query, operation_name, expected):
+    assert graphql_operations(_body(query, operation_name)) == expected
+
+
+def test_batches_are_charged_per_operation():
+    body = json.dumps([
+        {"query": "mutation login { login(input: {}) { accessToken } }", "operationName": "login"},
+        {"query": "mutation { login(input: {}) { accessToken } }"},
+    ]).encode()
+    assert graphql_operations(body) == ["login", "login"]
@@ -1,12 +1,15 @@
 'use client';
 
 import { motion, useScroll, useTransform } from 'framer-motion';
-import { useRef, useEffect } from 'react';
+import { useRef, useEffect, useState } from 'react';
 import { cn } from '@/lib/utils';
 import { useCartStore } from '@/store/cartStore';
 import { useLanguage } from '@/contexts/LanguageContext';
 import { useProductStore, Product } from '@/store/productStore';
 
+// Bento cells: one column on mobile, up to two of three columns on desktop
+const CARD_SIZES = '(min-width: 1024px) 66vw, (min-width: 768px) 50vw, 100vw';
+
 function ProductCard({ product, index }: { product: Product; index: number }) {
     const { t } = useLanguage();
     const addItem = useCartStore((state) => state.addItem);
@@ -33,7 +36,7 @@ function ProductCard({ product, index }: { product: Product; index: number }) {
             title: product.title,
             price: product.price,
             category: product.category,
-            image: product.image,
+            image: product.thumb || product.image,
         });
     };
 
@@ -54,7 +57,19 @@ function ProductCard({ product, index }: { product: Product; index: number }) {
             {product.image ? (
                 <div className="absolute inset-0 z-0 opacity-50 group-hover:opacity-80 transition-opacity duration-500 overflow-hidden">
                     <div className="absolute inset-0 bg-gradient-to-t from-[var(--obsidian)] via-transparent to-transparent z-10" />
-                    <img src={product.image} alt={product.title} className="w-full h-full object-cover scale-110 group-hover:scale-100 transition-transform duration-1000" />
+                    <picture>
+                        {product.webpSrcSet && (
+                            <source type="image/webp" srcSet={product.webpSrcSet} sizes={CARD_SIZES} />
+                        )}
+                        <img
+                            src={product.image}
+                            srcSet={product.srcSet}
+                            sizes={product.srcSet ? CARD_SIZES : undefined}
+                            alt={product.title}
+                            loading="lazy"
+                            className="w-full h-full object-cover scale-110 group-hover:scale-100 transition-transform duration-1000"
+                        />
+                    </picture>
                 </div>
             ) : (
                 <div className={cn(
@@ -117,24 +132,120 @@ function ProductCard({ product, index }: { product: Product; index: number }) {
     );
 }
 
+interface CatalogSyncState {
+    version: number;
+    products: Product[];
+}
+
+const CATALOG_SYNC_KEY = 'catalog-sync';
+
 export default function ProductsSection() {
     const { t } = useLanguage();
-    const { products, setProducts } = useProductStore();
+    const { products, setProducts, applyCatalogChanges } = useProductStore();
+    const [trendingIds, setTrendingIds] = useState<number[]>([]);
+
+    useEffect(() => {
+        // Ranked ids only (precomputed server-side); the products themselves come from the synced catalog
+        const fetchTrending = async () => {
+            try {
+                const url = process.env.NEXT_PUBLIC_GRAPHQL_URL || '/api/graphql';
+                const response = await fetch(url, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ query: '{ trendingProducts(first: 4) { id } }' }),
+                });
+                const result = await response.json();
+                setTrendingIds((result.data?.trendingProducts || []).map((p: { id: number }) => p.id));
+            } catch (error) {
+                console.error('Failed to fetch trending products:', error);
+            }
+        };
+
+        fetchTrending();
+    }, []);
 
     useEffect(() => {
+        // The full catalog is downloaded once and kept with its version; later loads only fetch the delta
+        const saveCatalog = (state: CatalogSyncState) => {
+            try {
+                localStorage.setItem(CATALOG_SYNC_KEY, JSON.stringify(state));
+            } catch {
+                // Quota exceeded (inline Base64 images): next load does a full sync
+                localStorage.removeItem(CATALOG_SYNC_KEY);
+            }
+        };
+        let cached: CatalogSyncState | null = null;
+        try {
+            cached = JSON.parse(localStorage.getItem(CATALOG_SYNC_KEY) || 'null');
+        } catch {
+            cached = null;
+        }
+        if (cached) {
+            setProducts(cached.products);
+        }
+
+        // The static manifest says whether anything changed; only then is GraphQL asked for the delta
+        const base = process.env.NEXT_PUBLIC_CATALOG_URL || '/api/catalog';
+        const loadManifest = async (): Promise<any | null> => {
+            try {
+                const response = await fetch(`${base}/manifest.json`);
+                return response.ok ? await response.json() : null;
+            } catch {
+                return null;
+            }
+        };
+
+        // First visit: start from the pre-rendered static pages instead of a full GraphQL sync
+        const loadSnapshot = async (manifest: any): Promise<CatalogSyncState | null> => {
+            try {
+                const pages = await Promise.all(
+                    Array.from({ length: manifest.categories.all.pages }, (_, i) =>
+                        fetch(`${base}/all/page-${i + 1}.json`).then((r) => r.json())
+                    )
+                );
+                const snapshotProducts = pages.flatMap((page) => page.products).map(mapProduct);
+                setProducts(snapshotProducts);
+                return { version: manifest.version, products: snapshotProducts };
+            } catch {
+                return null;
+            }
+        };
+
         const fetchProducts = async () => {
+            const manifest = await loadManifest();
+            if (manifest && !cached) {
+                cached = await loadSnapshot(manifest);
+                if (cached) {
+                    saveCatalog(cached);
+                }
+            }
+            if (manifest && cached && cached.version === manifest.version) {
+                return;
+            }
+
             const query = `
-                query GetProducts {
-                    products {
-                        id
-                        title
-                        description
-                        price
-                        category
-                        gradient
-                        size
-                        stock
-                        imageUrl
+                query CatalogChanges($since: Int) {
+                    catalogChanges(since: $since) {
+                        version
+                        fullResync
+                        deletedIds
+                        products {
+                            id
+                            title
+                            description
+                            price
+                            category
+                            gradient
+                            size
+                            stock
+                            imageUrl
+                            images {
+                                webp: srcset(format: "webp")
+                                jpeg: srcset(format: "jpeg")
+                                card: url(name: "card", format: "jpeg")
+                                thumb: url(name: "thumb", format: "webp")
+                            }
+                        }
                     }
                 }
             `;
@@ -144,17 +255,19 @@ export default function ProductsSection() {
                 const response = await fetch(url, {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ query }),
+                    body: JSON.stringify({ query, variables: { since: cached?.version ?? null } }),
                 });
 
                 const result = await response.json();
-                if (result.data?.products) {
-                    const mappedProducts = result.data.products.map((p: any) => ({
-                        ...p,
-                        image: p.imageUrl,
-                        category: capitalizeFirstLetter(p.category)
-                    }));
-                    setProducts(mappedProducts);
+                const changes = result.data?.catalogChanges;
+                if (changes) {
+                    const mappedProducts = changes.products.map(mapProduct);
+                    if (changes.fullResync) {
+                        setProducts(mappedProducts);
+                    } else {
+                        applyCatalogChanges(mappedProducts, changes.deletedIds);
+                    }
+                    saveCatalog({ version: changes.version, products: useProductStore.getState().products });
                 }
             } catch (error) {
                 console.error('Failed to fetch products:', error);
@@ -162,13 +275,27 @@ export default function ProductsSection() {
         };
 
         fetchProducts();
-    }, [setProducts]);
+    }, [setProducts, applyCatalogChanges]);
 
     const capitalizeFirstLetter = (string: string) => {
         if (!string) return '';
         return string.charAt(0).toUpperCase() + string.slice(1).toLowerCase();
     };
 
+    // Same shape from catalogChanges and from the static snapshots
+    const mapProduct = (p: any): Product => ({
+        ...p,
+        image: p.images?.card || p.imageUrl,
+        srcSet: p.images?.jpeg || undefined,
+        webpSrcSet: p.images?.webp || undefined,
+        thumb: p.images?.thumb || undefined,
+        category: capitalizeFirstLetter(p.category)
+    });
+
+    const trending = trendingIds
+        .map((id) => products.find((p) => p.id === id))
+        .filter((p): p is Product => p !== undefined);
+
     return (
         <div id="products" className="relative">
             <div className="relative z-10">
@@ -196,6 +323,31 @@ export default function ProductsSection() {
                     </motion.p>
                 </motion.div>
 
+                {/* Trending */}
+                {trending.length > 0 && (
+                    <div className="mb-12 md:mb-16">
+                        <h3 className="text-xl md:text-2xl font-bold text-gradient mb-6">{t.trending.title}</h3>
+                        <div className="grid grid-cols-2 lg:grid-cols-4 gap-4 md:gap-6">
+                            {trending.map((product) => (
+                                <div key={product.id} className="glass rounded-[1.5rem] p-4 border border-white/5 flex items-center gap-4">
+                                    {(product.thumb || product.image) && (
+                                        <img
+                                            src={product.thumb || product.image}
+                                            alt={product.title}
+                                            loading="lazy"
+                                            className="w-14 h-14 rounded-xl object-cover flex-shrink-0"
+                                        />
+                                    )}
+                                    <div className="min-w-0">
+                                        <p className="text-sm font-semibold truncate">{product.title}</p>
+                                        <p className="text-xs text-gradient-yellow">{t.common.currency} {product.price}</p>
+                                    </div>
+                                </div>
+                            ))}
+                        </div>
+                    </div>
+                )}
+
                 {/* Bento Grid */}
                 <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-8 md:auto-rows-[350px]">
                     {products.map((product, index) => (
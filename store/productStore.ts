@@ -11,6 +11,13 @@ export interface Product {
     size: 'small' | 'medium' | 'large';
     stock: number;
     image?: string;
+    // Generated variants (GraphQL `images`), absent until the backend has built them
+    srcSet?: string;
+    webpSrcSet?: string;
+    thumb?: string;
+    // Inventory forecast (admin `stockForecast`): units/day and days until sold out, null when nothing sold recently
+    velocity?: number;
+    daysUntilStockout?: number | null;
 }
 
 interface ProductStore {
@@ -20,6 +27,8 @@ interface ProductStore {
     deleteProduct: (id: number) => void;
     setStock: (id: number, stock: number) => void;
     setProducts: (products: Product[]) => void;
+    // Merge a `catalogChanges` delta: upsert `changed`, drop `deletedIds`
+    applyCatalogChanges: (changed: Product[], deletedIds: number[]) => void;
 }
 
 const initialProducts: Product[] = [
@@ -106,4 +115,10 @@ export const useProductStore = create<ProductStore>((set) => ({
         products: state.products.map((p) => p.id === id ? { ...p, stock } : p)
     })),
     setProducts: (products) => set({ products }),
+    applyCatalogChanges: (changed, deletedIds) => set((state) => {
+        const byId = new Map(state.products.map((p) => [p.id, p]));
+        deletedIds.forEach((id) => byId.delete(id));
+        changed.forEach((p) => byId.set(p.id, p));
+        return { products: Array.from(byId.values()).sort((a, b) => a.id - b.id) };
+    }),
 }));